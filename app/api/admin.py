@@ -0,0 +1,61 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.core.config import ADMIN_TOKEN
+from app.services import catalog_state
+
+router = APIRouter(prefix="/admin")
+logger = logging.getLogger(__name__)
+
+def check_admin_token(token: Optional[str]):
+    # Closed unless ADMIN_TOKEN is configured
+    if not ADMIN_TOKEN or not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@router.post("/reload")
+async def reload_catalog(x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    try:
+        # Build the new snapshot off the event loop; live requests keep going
+        report = await asyncio.to_thread(catalog_state.reload_catalog, "admin endpoint")
+    except Exception as e:
+        logger.exception("Catalog reload failed")
+        raise HTTPException(status_code=500, detail=f"Reload failed, serving previous catalog: {str(e)}")
+    return report
+
+@router.get("/catalog")
+async def catalog_status(x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    snapshot = await catalog_state.acurrent_snapshot()
+    return {
+        "products": len(snapshot.catalog),
+        "vectors": snapshot.faiss_index.index.ntotal,
+        "loaded_at": snapshot.loaded_at,
+        "rss_mb": round(catalog_state.current_rss_mb(), 1),
+        "last_reload": catalog_state.last_reload_report,
+    }
+
+@router.get("/stats")
+async def pipeline_stats(x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+    from app.core.config import get_hf_embeddings
+    from app.services.chat_services import fast_path_stats, response_cache
+    from app.services.groq_scheduler import chat_scheduler, small_chat_scheduler, transcription_scheduler
+    from app.api.telegram import webhook_stats
+    embeddings = get_hf_embeddings()
+    return {
+        "fast_path": fast_path_stats(),
+        "response_cache": response_cache.stats(),
+        # Batcher/LRU counters, from the shared embedding process in multi-worker mode
+        "query_embeddings": await asyncio.to_thread(embeddings.stats) if hasattr(embeddings, "stats") else None,
+        "groq": {
+            "chat": chat_scheduler.stats(),
+            "chat_small": small_chat_scheduler.stats(),
+            "transcription": transcription_scheduler.stats(),
+        },
+        "telegram_webhook": webhook_stats(),
+    }
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
-from groq import Groq
+from fastapi.responses import StreamingResponse
 from app.models.chat_model import ChatRequest, ChatResponse
-from app.services.chat_services import get_answer_for_session
+from app.services.chat_services import aget_answer_for_session, astream_answer_for_session
+from app.services.audio_services import StageTimings, TranscriptionTimeout, transcription_service
+from app.services.tracing import trace
+import json
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -10,7 +13,7 @@ router = APIRouter()
 
 load_dotenv()
 router = APIRouter()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+logger = logging.getLogger(__name__)
 
 # @router.post("/chat/", response_model=ChatResponse)
 # def chat_endpoint(req: ChatRequest):
@@ -29,47 +32,82 @@ async def chat_with_audio_or_text(
     text: str = Form(None),
     audio: UploadFile = None
 ):
+    timings = StageTimings()
     try:
-        if audio:
-            contents = await audio.read()
-            transcription = client.audio.transcriptions.create(
-                file=(audio.filename, contents),
-                model="whisper-large-v3-turbo",
-                response_format="verbose_json",
-            )
-            question = transcription.text
+        # One trace for the whole request: download, transcription and answer
+        with trace("api_audio" if audio else "api_text", session_id=session_id):
+            if audio:
+                with timings.stage("download"):
+                    contents = await audio.read()
+                with timings.stage("transcription"):
+                    question = await transcription_service.transcribe(contents, audio.filename or "audio.ogg")
 
-            # # Translate to English if not already
-            # response = client.chat.completions.create(
-            #     model="llama-3.3-70b-versatile",
-            #     messages=[
-            #         {
-            #             "role": "system",
-            #             "content": (
-            #                 "You are a translator. Translate the input to fluent English. "
-            #                 "If it's already in English, return it as-is. Do not add comments."
-            #             ),
-            #         },
-            #         {"role": "user", "content": question}
-            #     ],
-            #     temperature=0.3
-            # )
-            # question = response.choices[0].message.content.strip()
+            elif text:
+                question = text
+            else:
+                raise HTTPException(status_code=400, detail="Provide either text or audio input.")
 
-        elif text:
-            question = text
-        else:
-            raise HTTPException(status_code=400, detail="Provide either text or audio input.")
-
-        # Send to LangChain-powered Q&A
-        answer = get_answer_for_session(session_id=session_id, question=question)
+            # Send to LangChain-powered Q&A
+            with timings.stage("answer"):
+                answer = await aget_answer_for_session(session_id=session_id, question=question)
         return {
             "session_id": session_id,
             "question": question,
-            "answer": answer
+            "answer": answer,
+            "timings_ms": timings.as_ms()
         }
 
+    except HTTPException:
+        raise
+    except TranscriptionTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
\ No newline at end of file
+        logger.exception("Chat request failed")
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+def sse_event(data: dict, event: str = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(
+    session_id: str = Form(...),
+    text: str = Form(None),
+    audio: UploadFile = None
+):
+    # Server-Sent Events: one "data" event per token chunk, then a "done"
+    # event carrying the full answer
+    if audio:
+        contents = await audio.read()
+        try:
+            question = await transcription_service.transcribe(contents, audio.filename or "audio.ogg")
+        except TranscriptionTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+    elif text:
+        question = text
+    else:
+        raise HTTPException(status_code=400, detail="Provide either text or audio input.")
+
+    async def events():
+        yield sse_event({"session_id": session_id, "question": question}, event="question")
+        chunks = []
+        try:
+            async for chunk in astream_answer_for_session(session_id=session_id, question=question, kind="sse"):
+                chunks.append(chunk)
+                yield sse_event({"token": chunk})
+        except Exception as e:
+            logger.exception("Streaming answer failed")
+            yield sse_event({"detail": f"Server error: {str(e)}"}, event="error")
+            return
+        yield sse_event({"session_id": session_id, "question": question, "answer": "".join(chunks)}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
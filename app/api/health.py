@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services import warmup
+
+router = APIRouter()
+
+@router.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and serving HTTP
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    # Readiness: models, index and clients are loaded
+    body = {
+        "ready": warmup.state["ready"],
+        "warming_up": warmup.state["warming_up"],
+        "error": warmup.state["error"],
+        "report": warmup.state["report"],
+    }
+    return JSONResponse(body, status_code=200 if warmup.state["ready"] else 503)
@@ -0,0 +1,97 @@
+import hmac
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from app.core.config import (
+    TELEGRAM_MAX_BACKLOG,
+    TELEGRAM_MAX_CHAT_BACKLOG,
+    TELEGRAM_MAX_CONCURRENT_UPDATES,
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_URL,
+)
+from app.services.metrics import TELEGRAM_UPDATES
+from app.services.update_dispatcher import ACCEPTED, BACKLOG_FULL, PerChatDispatcher
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Set by start_webhook while webhook mode is running in this process
+application = None
+dispatcher: Optional[PerChatDispatcher] = None
+
+async def start_webhook():
+    # Builds the bot with telegram_bot's handlers and registers the webhook. Runs
+    # in main.py's lifespan, so bot and API share one process; across uvicorn
+    # workers only the session lock orders a chat's updates
+    global application, dispatcher
+    if not TELEGRAM_WEBHOOK_SECRET:
+        # Without it anyone who finds the URL can forge updates for any chat
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET must be set when TELEGRAM_WEBHOOK_URL is")
+    from telegram_bot import build_application
+
+    application = build_application(webhook=True)
+    await application.initialize()
+    await application.start()
+    dispatcher = PerChatDispatcher(
+        application.process_update,
+        max_backlog=TELEGRAM_MAX_BACKLOG,
+        max_per_chat=TELEGRAM_MAX_CHAT_BACKLOG,
+        max_concurrency=TELEGRAM_MAX_CONCURRENT_UPDATES,
+    )
+    url = TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH
+    try:
+        await application.bot.set_webhook(
+            url,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=["message"],
+        )
+        logger.info("Telegram webhook set to %s", url)
+    except Exception:
+        # Keep serving: a webhook registered earlier still delivers here
+        logger.exception("Setting the Telegram webhook failed")
+
+async def stop_webhook():
+    # The webhook stays registered so Telegram holds updates until restart
+    global application, dispatcher
+    if dispatcher is not None:
+        await dispatcher.shutdown()
+    if application is not None:
+        await application.stop()
+        await application.shutdown()
+    application, dispatcher = None, None
+
+def webhook_stats():
+    return dispatcher.stats() if dispatcher is not None else None
+
+@router.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(None)):
+    if dispatcher is None:
+        raise HTTPException(status_code=404, detail="Telegram webhook mode is off.")
+    if not TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(
+        (x_telegram_bot_api_secret_token or "").encode(), TELEGRAM_WEBHOOK_SECRET.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid secret token.")
+    from telegram import Update
+
+    try:
+        update = Update.de_json(await request.json(), application.bot)
+    except (json.JSONDecodeError, TypeError, KeyError, ValueError):
+        TELEGRAM_UPDATES.inc(result="invalid")
+        raise HTTPException(status_code=400, detail="Invalid update.")
+    # Updates without a chat are independent of each other
+    chat = update.effective_chat
+    result = dispatcher.submit(chat.id if chat else f"update:{update.update_id}", update)
+    if result == BACKLOG_FULL:
+        # Telegram keeps the update and redelivers it with backoff
+        raise HTTPException(status_code=503, detail="Backlog full.", headers={"Retry-After": "5"})
+    if result != ACCEPTED:
+        # One chat flooding the bot: drop its extra updates, don't make
+        # Telegram retry them
+        logger.warning("Dropped update %s for chat %s: %s", update.update_id, chat.id if chat else None, result)
+    return {"ok": True}
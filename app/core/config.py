@@ -1,19 +1,190 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import logging
+import logging.handlers
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Catalog sources, hot-reloaded by app.services.catalog_state
+PRODUCTS_PATH = os.getenv("PRODUCTS_PATH", "app/db/grocery_products_50.json")
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "app/db/faiss_grocery_index_hf")
+# "hybrid" (BM25 + FAISS with filters), "dense" (FAISS only) or "lexical" (BM25 only)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")
+# Override the IVF nprobe / HNSW efSearch recorded by the index builder
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "0")) or None
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "0")) or None
+CATALOG_WATCH = os.getenv("CATALOG_WATCH", "false").lower() == "true"
+CATALOG_WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "5"))
+# Required for /admin routes; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Upper bound on answer pipelines running at once in one process
+MAX_CONCURRENT_ANSWERS = int(os.getenv("MAX_CONCURRENT_ANSWERS", "16"))
+
+# Semantic response cache in front of the LLM chain
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64"))
+
+# Templated answers for structured lookups (price, stock, cheapest, ...)
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+# Telegram: stream answers by editing the reply as chunks arrive
+TELEGRAM_STREAMING = os.getenv("TELEGRAM_STREAMING", "true").lower() == "true"
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "1.0"))
+
+# Telegram webhook mode: with TELEGRAM_WEBHOOK_URL set (the public HTTPS base
+# URL of this app), main.py receives updates on TELEGRAM_WEBHOOK_PATH instead
+# of running telegram_bot.py's polling loop. The backlog counts queued plus
+# running updates; past it the route answers 503 and Telegram redelivers.
+# TELEGRAM_WEBHOOK_SECRET is required (1-256 of A-Z, a-z, 0-9, _ and -).
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+TELEGRAM_MAX_BACKLOG = int(os.getenv("TELEGRAM_MAX_BACKLOG", "1000"))
+TELEGRAM_MAX_CHAT_BACKLOG = int(os.getenv("TELEGRAM_MAX_CHAT_BACKLOG", "20"))
+TELEGRAM_MAX_CONCURRENT_UPDATES = int(os.getenv("TELEGRAM_MAX_CONCURRENT_UPDATES", "64"))
+
+# Voice transcription (app.services.audio_services)
+TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "whisper-large-v3-turbo")
+TRANSCRIPTION_MAX_WORKERS = int(os.getenv("TRANSCRIPTION_MAX_WORKERS", "4"))
+TRANSCRIPTION_TIMEOUT_SECONDS = float(os.getenv("TRANSCRIPTION_TIMEOUT_SECONDS", "30"))
+TRANSCRIPTION_CACHE_SIZE = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", "256"))
+
+# Outbound Groq scheduler (app.services.groq_scheduler). Limits are per
+# process and per model; 0 disables a bucket. Defaults are the free tier's.
+GROQ_CHAT_RPM = float(os.getenv("GROQ_CHAT_RPM", "30"))
+GROQ_CHAT_TPM = float(os.getenv("GROQ_CHAT_TPM", "12000"))
+GROQ_TRANSCRIPTION_RPM = float(os.getenv("GROQ_TRANSCRIPTION_RPM", "20"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_MAX_BACKOFF_SECONDS = float(os.getenv("GROQ_MAX_BACKOFF_SECONDS", "30"))
+# Reserved per chat call on top of the prompt, until the real usage is known
+GROQ_EXPECTED_OUTPUT_TOKENS = int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS", "300"))
+GROQ_SMALL_CHAT_RPM = float(os.getenv("GROQ_SMALL_CHAT_RPM", "30"))
+GROQ_SMALL_CHAT_TPM = float(os.getenv("GROQ_SMALL_CHAT_TPM", "6000"))
+
+# Chat models. With LLM_CASCADE simple questions go to the small model and
+# the large one only gets LLM_LATENCY_BUDGET_SECONDS to start answering
+# (app.services.model_cascade)
+LARGE_CHAT_MODEL = os.getenv("LARGE_CHAT_MODEL", "llama-3.3-70b-versatile")
+SMALL_CHAT_MODEL = os.getenv("SMALL_CHAT_MODEL", "llama-3.1-8b-instant")
+LLM_CASCADE = os.getenv("LLM_CASCADE", "false").lower() == "true"
+LLM_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_LATENCY_BUDGET_SECONDS", "4"))
+CASCADE_MIN_CONTEXT_OVERLAP = float(os.getenv("CASCADE_MIN_CONTEXT_OVERLAP", "0.5"))
+
+# Intent router (app.services.intent_router). Count questions ("how many
+# ... products") can name any catalog category or sub-category, plus these
+# extra keywords. INTENT_GREETINGS_PATH is a JSON {phrase: reply} file
+# replacing the built-in greetings; a greeting only gets the canned reply
+# with at most GREETING_MAX_EXTRA_WORDS other words in the message.
+COUNT_KEYWORDS = [
+    keyword.strip()
+    for keyword in os.getenv("COUNT_KEYWORDS", "snacks,baby,rice,biscuits,popcorn,vegetables,fruits").split(",")
+    if keyword.strip()
+]
+INTENT_GREETINGS_PATH = os.getenv("INTENT_GREETINGS_PATH")
+GREETING_MAX_EXTRA_WORDS = int(os.getenv("GREETING_MAX_EXTRA_WORDS", "2"))
+
+# LLM prompt size (app.services.context_builder): compact per-product
+# snippets with only the fields the question needs, at most
+# CONTEXT_TOKEN_BUDGET tokens, and history trimmed so context plus history
+# stay within PROMPT_TOKEN_BUDGET. CONTEXT_COMPACTION=false sends the full
+# product text as before.
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "500"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1000"))
+CONTEXT_MAX_REVIEWS = int(os.getenv("CONTEXT_MAX_REVIEWS", "3"))
+
+# Session store: "memory" (per process) or "sqlite" (survives restarts, shared by workers)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "app/db/sessions.sqlite3")
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_MB = int(os.getenv("SESSION_MAX_MB", "64"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "150"))
+
+# Multi-worker mode (serve.py): open the FAISS index memory-mapped and
+# read-only so its pages are shared, and embed queries in one shared process
+FAISS_MMAP = os.getenv("FAISS_MMAP", "false").lower() == "true"
+# Index directories without the compact docstore are refused unless this
+# opts in to unpickling their index.pkl (python -m app.db.compact_docstore converts them)
+FAISS_ALLOW_PICKLE = os.getenv("FAISS_ALLOW_PICKLE", "false").lower() == "true"
+EMBEDDING_SERVER_ADDRESS = os.getenv("EMBEDDING_SERVER_ADDRESS")
+# Shared secret for the embedding server's pickled IPC; serve.py generates a
+# random one per run. Required whenever EMBEDDING_SERVER_ADDRESS is set
+EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY")
+
+# Query embedding micro-batching and LRU (app.services.embedding_batcher)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+
+# Logging, tracing and profiling (app.services.tracing, GET /metrics)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+_log_listener = None
+
+def configure_logging(level: str = LOG_LEVEL):
+    # Records go through a queue to a background thread, so a slow stdout
+    # never blocks a request
+    global _log_listener
+    if _log_listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _log_listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _log_listener.start()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+
 
 # Initialize HuggingFace embeddings as you provided
 model_name = "sentence-transformers/all-mpnet-base-v2"
 model_kwargs = {'device': 'cpu'}
 encode_kwargs = {'normalize_embeddings': False}
 
-hf_embeddings = HuggingFaceEmbeddings(
-    model_name=model_name,
-    model_kwargs=model_kwargs,
-    encode_kwargs=encode_kwargs
-)
\ No newline at end of file
+# Loaded on first use (or by app.services.warmup) so importing the app stays fast
+_hf_embeddings = None
+_hf_embeddings_lock = threading.Lock()
+
+def load_hf_embeddings():
+    # Always loads the model in this process, behind the query micro-batcher
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from app.services.embedding_batcher import BatchingEmbeddings
+    return BatchingEmbeddings(
+        HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs
+        ),
+        batch_window=EMBEDDING_BATCH_WINDOW_MS / 1000,
+        max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+        cache_size=QUERY_EMBEDDING_CACHE_SIZE,
+    )
+
+def get_hf_embeddings():
+    # With EMBEDDING_SERVER_ADDRESS set, a client for the shared embedding
+    # process (app.services.embedding_server) instead of a local model; the
+    # server batches and caches across all workers
+    global _hf_embeddings
+    if _hf_embeddings is None:
+        with _hf_embeddings_lock:
+            if _hf_embeddings is None:
+                if EMBEDDING_SERVER_ADDRESS:
+                    from app.services.embedding_server import RemoteEmbeddings
+                    _hf_embeddings = RemoteEmbeddings(EMBEDDING_SERVER_ADDRESS, EMBEDDING_SERVER_AUTHKEY)
+                else:
+                    _hf_embeddings = load_hf_embeddings()
+    return _hf_embeddings
@@ -0,0 +1,136 @@
+# FAISS index types for the product vectors: flat (exact), ivf, hnsw (no
+# deletes), pq and ivfpq. The type and its parameters are saved in
+# index_meta.json next to the index and reapplied on load
+
+import json
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "pq", "ivfpq")
+INDEX_META_FILE = "index_meta.json"
+# Builds live in index_dir/builds/<version>; CURRENT names the live one
+CURRENT_FILE = "CURRENT"
+BUILDS_DIR = "builds"
+
+# k-means wants ~39 points per centroid; PQ trains 256 centroids per sub-quantizer
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+
+def default_nlist(n: int) -> int:
+    # ~4 * sqrt(n) cells, but never more than the training data supports
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+def default_pq_m(dim: int) -> int:
+    # ~16 dimensions per sub-quantizer: 768-dim vectors become 48-byte codes
+    target = max(1, dim // 16)
+    return max(m for m in range(1, target + 1) if dim % m == 0)
+
+def index_config(index_type: str, dim: int, n: int, params: dict = None) -> dict:
+    # Type plus overrides (nlist, nprobe, hnsw_m, ef_construction, ef_search,
+    # pq_m, train_sample) -> concrete config; types that cannot be trained on n
+    # vectors fall back to flat, with the reason kept under "fallback"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+
+    fallback = None
+    if index_type in ("pq", "ivfpq") and n < PQ_CENTROIDS:
+        fallback = f"{n} vectors are too few to train {index_type} codebooks"
+        logger.warning("%s; using a flat index", fallback)
+        index_type = "flat"
+
+    config = {"index_type": index_type, "dim": dim, "train_sample": params.get("train_sample", 100_000)}
+    if fallback:
+        config["fallback"] = fallback
+    if index_type == "flat":
+        config["factory"] = "Flat"
+    elif index_type == "hnsw":
+        config["hnsw_m"] = params.get("hnsw_m", 32)
+        config["ef_construction"] = params.get("ef_construction", 80)
+        config["ef_search"] = params.get("ef_search", 64)
+        config["factory"] = f"HNSW{config['hnsw_m']}"
+    elif index_type == "pq":
+        config["pq_m"] = params.get("pq_m", default_pq_m(dim))
+        config["factory"] = f"PQ{config['pq_m']}x8"
+    else:
+        config["nlist"] = params.get("nlist", default_nlist(min(n, config["train_sample"])))
+        config["nprobe"] = params.get("nprobe", math.ceil(math.sqrt(config["nlist"])))
+        if index_type == "ivf":
+            config["factory"] = f"IVF{config['nlist']},Flat"
+        else:
+            config["pq_m"] = params.get("pq_m", default_pq_m(dim))
+            config["factory"] = f"IVF{config['nlist']},PQ{config['pq_m']}x8"
+
+    if "pq_m" in config and dim % config["pq_m"]:
+        raise ValueError(f"pq_m={config['pq_m']} must divide the vector dimension {dim}")
+    return config
+
+def train_sample(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size=size, replace=False)
+    return vectors[np.sort(rows)]
+
+def build_faiss_index(config: dict, vectors: np.ndarray):
+    # An empty index for config, trained on a sample of vectors
+    index = faiss.index_factory(config["dim"], config["factory"], faiss.METRIC_L2)
+    if config["index_type"] == "hnsw":
+        index.hnsw.efConstruction = config["ef_construction"]
+    if not index.is_trained:
+        index.train(train_sample(np.ascontiguousarray(vectors, dtype=np.float32), config["train_sample"]))
+    apply_search_params(index, config)
+    return index
+
+def supports_removal(index_type: str) -> bool:
+    # Only flat indexes compact their ids on remove_ids the way LangChain's
+    # FAISS.delete renumbers index_to_docstore_id; IVF keeps the old ids
+    return index_type == "flat"
+
+def apply_search_params(index, config: dict, nprobe: int = None, ef_search: int = None):
+    # Explicit arguments (e.g. FAISS_NPROBE) win over the values recorded at build time
+    nprobe = nprobe or config.get("nprobe")
+    ef_search = ef_search or config.get("ef_search")
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = int(nprobe)
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = int(ef_search)
+
+def search_parameters(index, selector):
+    # Parameters restricting index to selector. IVF and HNSW need their own
+    # classes, which also carry nprobe/efSearch; bare SearchParameters would reset them
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def resolve_index_dir(index_dir: str) -> str:
+    # The directory holding the live build's files. Resolve once per load: a
+    # build published meanwhile swaps CURRENT, never the files under it.
+    # Directories from before the pointer hold their files directly
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            current = f.read().strip()
+    except FileNotFoundError:
+        return index_dir
+    return os.path.join(index_dir, *current.split("/"))
+
+def load_index_meta(index_dir: str) -> dict:
+    # Indexes built before index types existed are flat
+    path = os.path.join(index_dir, INDEX_META_FILE)
+    if not os.path.exists(path):
+        return {"index_type": "flat", "factory": "Flat"}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_index_meta(index_dir: str, meta: dict):
+    with open(os.path.join(index_dir, INDEX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
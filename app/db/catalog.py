@@ -0,0 +1,251 @@
+import bisect
+import heapq
+import json
+import re
+from collections import defaultdict
+
+# Lowercase word tokens, keeping hyphenated words and product IDs ("p-012") whole
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+# Function words with nothing to match on, shared by lexical retrieval, the
+# fast path's product resolution and the cascade's context-overlap check.
+# tokenize keeps apostrophes, so contractions are listed whole
+FUNCTION_WORDS = frozenset(
+    "a an the is are was were be do does did of for to in on at by with and or any some about from "
+    "what whats which who how much many there your you we our us i me my it its this that "
+    "these those please can could would will tell show give list find get have has "
+    "what's that's there's it's here's who's how's where's i'm i'd i'll i've you're we're they're "
+    "don't doesn't didn't isn't aren't can't won't haven't hasn't".split()
+)
+
+# Fields whose words are searchable through the term index
+TERM_FIELDS = ("product_name", "category", "sub_category", "brand", "description")
+
+def load_products(path: str) -> list:
+    # The catalog file is a list of sections, each with a "content" product list
+    with open(path, "r", encoding="utf-8") as f:
+        json_data = json.load(f)
+    products = []
+    for section in json_data:
+        products.extend(section.get("content", []))
+    return products
+
+def render_product_text(record: dict, include_reviews: bool = True) -> str:
+    # Text that gets embedded and stored as the document's page_content
+    content = f"""Product ID: {record.get('product_id', '')}
+Product Name: {record.get('product_name', '')}
+Category: {record.get('category', '')}
+Sub Category: {record.get('sub_category', '')}
+Description: {record.get('description', '')}
+Price: {record.get('price', 0)} {record.get('currency', '')}
+Discount: {record.get('discount', 0)}%
+Stock Status: {record.get('stock_status', '')}
+Unit: {record.get('unit', '')}
+Brand: {record.get('brand', '')}
+Origin: {record.get('origin', '')}
+Tags: {', '.join(record.get('tags', []))}
+Rating: {record.get('rating', 0)}
+"""
+    if include_reviews:
+        content += "Reviews:\n"
+        for review in record.get('reviews', []):
+            content += f"  - User: {review.get('user', '')}, Comment: {review.get('comment', '')}, Rating: {review.get('rating', 0)}\n"
+
+    content += f"Recommended For: {', '.join(record.get('recommended_for', []))}"
+    return content
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(str(text).lower())
+
+def keyword_variants(token: str) -> set:
+    # Cheap singular/plural folding so "snacks" finds "snack" and vice versa
+    variants = {token}
+    if token.endswith("ies") and len(token) > 4:
+        variants.add(token[:-3] + "y")
+    elif token.endswith("es") and len(token) > 3:
+        variants.update({token[:-2], token[:-1]})
+    elif token.endswith("s") and len(token) > 2:
+        variants.add(token[:-1])
+    else:
+        variants.update({token + "s", token + "es"})
+        if token.endswith("y"):
+            variants.add(token[:-1] + "ies")
+    return variants
+
+def normalize(value) -> str:
+    return str(value or "").strip().lower()
+
+# ID -> product map, inverted indexes (category, sub_category, brand, tags,
+# stock status), a term index and sorted price/rating columns, built once per
+# catalog load
+class CatalogIndex:
+    def __init__(self, products):
+        self.order = []
+        self.products = {}
+        self.by_category = defaultdict(set)
+        self.by_sub_category = defaultdict(set)
+        self.by_brand = defaultdict(set)
+        self.by_tag = defaultdict(set)
+        self.by_stock_status = defaultdict(set)
+        self.terms = defaultdict(set)
+        self.name_terms = defaultdict(set)
+        self._count_cache = {}
+
+        prices = []
+        ratings = []
+        for product in products:
+            product_id = normalize(product.get("product_id")).upper()
+            if not product_id or product_id in self.products:
+                continue
+            self.order.append(product_id)
+            self.products[product_id] = product
+
+            self.by_category[normalize(product.get("category"))].add(product_id)
+            self.by_sub_category[normalize(product.get("sub_category"))].add(product_id)
+            self.by_brand[normalize(product.get("brand"))].add(product_id)
+            self.by_stock_status[normalize(product.get("stock_status"))].add(product_id)
+            for tag in product.get("tags", []):
+                self.by_tag[normalize(tag)].add(product_id)
+                for token in tokenize(tag):
+                    self.terms[token].add(product_id)
+            for token in tokenize(product.get("product_name", "")):
+                self.name_terms[token].add(product_id)
+            for field in TERM_FIELDS:
+                for token in tokenize(product.get(field, "")):
+                    self.terms[token].add(product_id)
+            self.terms[product_id.lower()].add(product_id)
+
+            prices.append((float(product.get("price", 0) or 0), product_id))
+            ratings.append((float(product.get("rating", 0) or 0), product_id))
+
+        # Sorted columns: parallel key/id lists so bisect works on plain floats
+        prices.sort()
+        ratings.sort()
+        self.price_keys = [price for price, _ in prices]
+        self.price_ids = [product_id for _, product_id in prices]
+        self.rating_keys = [rating for rating, _ in ratings]
+        self.rating_ids = [product_id for _, product_id in ratings]
+        # Position of each ID in each ordering, to sort a small filtered set
+        # without walking the whole column
+        self.order_rank = {product_id: rank for rank, product_id in enumerate(self.order)}
+        self.price_rank = {product_id: rank for rank, product_id in enumerate(self.price_ids)}
+        self.rating_rank = {product_id: rank for rank, product_id in enumerate(self.rating_ids)}
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, product_id):
+        return normalize(product_id).upper() in self.products
+
+    def get(self, product_id: str):
+        return self.products.get(normalize(product_id).upper())
+
+    def categories(self) -> list:
+        return sorted(key for key in self.by_category if key)
+
+    def sub_categories(self) -> list:
+        return sorted(key for key in self.by_sub_category if key)
+
+    def brands(self) -> list:
+        return sorted(key for key in self.by_brand if key)
+
+    def ids_matching_term(self, keyword: str) -> set:
+        # Products containing every word of the keyword (with plural folding)
+        result = None
+        for token in tokenize(keyword):
+            postings = set()
+            for variant in keyword_variants(token):
+                postings |= self.terms.get(variant, set())
+            result = postings if result is None else result & postings
+            if not result:
+                return set()
+        return result or set()
+
+    def count_matching(self, keyword: str) -> int:
+        keyword = normalize(keyword)
+        if keyword not in self._count_cache:
+            # A category/sub-category name wins; otherwise fall back to words
+            ids = set()
+            for variant in keyword_variants(keyword):
+                ids |= self.by_category.get(variant, set())
+                ids |= self.by_sub_category.get(variant, set())
+            if not ids:
+                ids = self.ids_matching_term(keyword)
+            self._count_cache[keyword] = len(ids)
+        return self._count_cache[keyword]
+
+    def ids_in_price_range(self, min_price=None, max_price=None) -> list:
+        return self._range(self.price_keys, self.price_ids, min_price, max_price)
+
+    def ids_in_rating_range(self, min_rating=None, max_rating=None) -> list:
+        return self._range(self.rating_keys, self.rating_ids, min_rating, max_rating)
+
+    @staticmethod
+    def _range(keys, ids, low, high) -> list:
+        start = 0 if low is None else bisect.bisect_left(keys, float(low))
+        end = len(keys) if high is None else bisect.bisect_right(keys, float(high))
+        return ids[start:end]
+
+    def filter(
+        self,
+        category=None,
+        sub_category=None,
+        brand=None,
+        tag=None,
+        stock_status=None,
+        min_price=None,
+        max_price=None,
+        min_rating=None,
+        max_rating=None,
+        sort_by=None,
+        limit=None,
+    ) -> list:
+        # Products matching every filter: exact matches through the inverted indexes,
+        # price/rating bounds by bisecting the sorted columns. sort_by is "price",
+        # "-price", "rating" or "-rating"; otherwise catalog order is kept
+        candidates = []
+        for index, value in (
+            (self.by_category, category),
+            (self.by_sub_category, sub_category),
+            (self.by_brand, brand),
+            (self.by_tag, tag),
+            (self.by_stock_status, stock_status),
+        ):
+            if value is not None:
+                candidates.append(index.get(normalize(value), set()))
+
+        if min_price is not None or max_price is not None:
+            candidates.append(set(self.ids_in_price_range(min_price, max_price)))
+        if min_rating is not None or max_rating is not None:
+            candidates.append(set(self.ids_in_rating_range(min_rating, max_rating)))
+
+        allowed = None
+        for ids in sorted(candidates, key=len):
+            allowed = set(ids) if allowed is None else allowed & ids
+            if not allowed:
+                return []
+
+        if sort_by in ("price", "-price"):
+            ordered, rank = self.price_ids, self.price_rank
+        elif sort_by in ("rating", "-rating"):
+            ordered, rank = self.rating_ids, self.rating_rank
+        else:
+            ordered, rank = self.order, self.order_rank
+        descending = bool(sort_by) and sort_by.startswith("-")
+
+        if allowed is not None and len(allowed) < len(ordered):
+            # Sort only the matches, so a narrow filter stays cheap on a large catalog
+            key = (lambda product_id: -rank[product_id]) if descending else rank.__getitem__
+            if limit is not None:
+                ids = heapq.nsmallest(limit, allowed, key=key)
+            else:
+                ids = sorted(allowed, key=key)
+            return [self.products[product_id] for product_id in ids]
+
+        result = []
+        for product_id in (reversed(ordered) if descending else ordered):
+            if allowed is None or product_id in allowed:
+                result.append(self.products[product_id])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
@@ -0,0 +1,132 @@
+# Read-only, memory-mapped docstore for the FAISS index, no pickle:
+#   docstore.json   ids in FAISS position order (row i = vector i)
+#   records.bin     product records without reviews, JSON (records_offsets.npy)
+#   reviews.bin     each product's reviews, JSON (reviews_offsets.npy)
+# Records are decoded only when a document is requested. Convert an index
+# directory that only has index.pkl with:
+#   python -m app.db.compact_docstore app/db/faiss_grocery_index_hf
+
+import json
+import mmap
+import os
+import sys
+from typing import Dict, List, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.db.catalog import render_product_text
+
+DOCSTORE_FILE = "docstore.json"
+RECORDS_FILE = "records.bin"
+RECORD_OFFSETS_FILE = "records_offsets.npy"
+REVIEWS_FILE = "reviews.bin"
+REVIEW_OFFSETS_FILE = "reviews_offsets.npy"
+
+def has_compact_docstore(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, DOCSTORE_FILE))
+
+def _write_blobs(path: str, offsets_path: str, blobs: List[bytes]):
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    with open(path, "wb") as f:
+        for row, blob in enumerate(blobs):
+            f.write(blob)
+            offsets[row + 1] = offsets[row] + len(blob)
+    np.save(offsets_path, offsets)
+
+def write_compact_docstore(index_dir: str, ids: List[str], records: List[dict]):
+    # Write records so that row i (FAISS position i) has docstore id ids[i]
+    bodies = []
+    reviews = []
+    for record in records:
+        body = {key: value for key, value in record.items() if key != "reviews"}
+        bodies.append(json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        reviews.append(json.dumps(record.get("reviews", []), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    _write_blobs(os.path.join(index_dir, RECORDS_FILE), os.path.join(index_dir, RECORD_OFFSETS_FILE), bodies)
+    _write_blobs(os.path.join(index_dir, REVIEWS_FILE), os.path.join(index_dir, REVIEW_OFFSETS_FILE), reviews)
+    with open(os.path.join(index_dir, DOCSTORE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"format": 1, "ids": list(ids)}, f)
+
+def write_from_vectorstore(index_dir: str, faiss_index):
+    # Rows in FAISS position order, records taken from the document metadata
+    ids = [faiss_index.index_to_docstore_id[position] for position in range(len(faiss_index.index_to_docstore_id))]
+    records = [faiss_index.docstore.search(doc_id).metadata for doc_id in ids]
+    write_compact_docstore(index_dir, ids, records)
+
+class _Blobs:
+    def __init__(self, path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def get(self, row: int):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._data[start:end])
+
+# Read-only docstore over write_compact_docstore's files; implements search
+# like LangChain's docstores so it can back a FAISS vector store
+class CompactDocstore:
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, DOCSTORE_FILE), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)["ids"]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._records = _Blobs(os.path.join(index_dir, RECORDS_FILE), os.path.join(index_dir, RECORD_OFFSETS_FILE))
+        self._reviews = _Blobs(os.path.join(index_dir, REVIEWS_FILE), os.path.join(index_dir, REVIEW_OFFSETS_FILE))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_to_docstore_id(self) -> Dict[int, str]:
+        return dict(enumerate(self.ids))
+
+    def record(self, doc_id: str, reviews: bool = False):
+        row = self.rows.get(doc_id)
+        if row is None:
+            return None
+        record = self._records.get(row)
+        if reviews:
+            record["reviews"] = self._reviews.get(row)
+        return record
+
+    def document(self, doc_id: str, reviews: bool = False):
+        record = self.record(doc_id, reviews)
+        if record is None:
+            return None
+        return Document(
+            page_content=render_product_text(record, include_reviews=reviews),
+            metadata=record,
+            id=doc_id,
+        )
+
+    def search(self, search: str) -> Union[str, Document]:
+        document = self.document(search)
+        return document if document is not None else f"ID {search} not found."
+
+    # FAISS.add_texts/delete reach these; the live index is replaced by a rebuild instead
+    def add(self, texts):
+        raise RuntimeError("read-only docstore: rebuild the index with app.db.embededding")
+
+    def delete(self, ids):
+        raise RuntimeError("read-only docstore: rebuild the index with app.db.embededding")
+
+def to_memory_docstore(docstore: CompactDocstore):
+    # Fully materialized copy for the index builder, which mutates it
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    return InMemoryDocstore({doc_id: docstore.document(doc_id, reviews=True) for doc_id in docstore.ids})
+
+def main():
+    # Convert a pickled docstore in place: python -m app.db.compact_docstore INDEX_DIR
+    import pickle
+
+    index_dir = sys.argv[1] if len(sys.argv) > 1 else "app/db/faiss_grocery_index_hf"
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    ids = [index_to_docstore_id[position] for position in range(len(index_to_docstore_id))]
+    write_compact_docstore(index_dir, ids, [docstore.search(doc_id).metadata for doc_id in ids])
+    print(f"Wrote a compact docstore for {len(ids)} documents to {index_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,300 @@
+# Incremental FAISS index builder: only new or changed products are
+# re-embedded, removed ones are deleted, and embeddings are cached by (model,
+# text hash). --index-type picks flat, ivf, hnsw, pq or ivfpq (app.db.ann_index);
+# changing it, or deleting from a type that cannot, forces a full rebuild.
+#   python -m app.db.embededding [--full] [--batch-size 64] [--index-type ivf --nlist 1024]
+
+import argparse
+import hashlib
 import json
-from langchain_core.documents import Document
-from langchain.vectorstores import FAISS
-from app.core.config import hf_embeddings
-
-# Load your JSON file manually
-file_path = "app/db/grocery_products_50.json"
-
-with open(file_path, 'r', encoding='utf-8') as f:
-    raw_json = json.load(f)
-
-# Assume the main content is in raw_json[0]['content']
-records = raw_json[0]['content']
-
-documents = []
-for record in records:
-    # Create formatted string for page_content (similar to your jq schema)
-    content = f"""Product ID: {record.get('product_id', '')}
-Product Name: {record.get('product_name', '')}
-Category: {record.get('category', '')}
-Sub Category: {record.get('sub_category', '')}
-Description: {record.get('description', '')}
-Price: {record.get('price', 0)} {record.get('currency', '')}
-Discount: {record.get('discount', 0)}%
-Stock Status: {record.get('stock_status', '')}
-Unit: {record.get('unit', '')}
-Brand: {record.get('brand', '')}
-Origin: {record.get('origin', '')}
-Tags: {', '.join(record.get('tags', []))}
-Rating: {record.get('rating', 0)}
-Reviews:
-"""
-    for review in record.get('reviews', []):
-        content += f"  - User: {review.get('user', '')}, Comment: {review.get('comment', '')}, Rating: {review.get('rating', 0)}\n"
-
-    content += f"Recommended For: {', '.join(record.get('recommended_for', []))}"
-
-    # Store the original JSON record as metadata
-    metadata = record
-
-    documents.append(Document(page_content=content, metadata=metadata))
-
-# Now documents have formatted content and full metadata
-for doc in documents:
-    print("Page Content:")
-    print(doc.page_content)
-    print("\nMetadata:")
-    print(doc.metadata)
-    print("="*50)
-
-faiss_index = FAISS.from_documents(documents, hf_embeddings)
-
-# Optionally save to disk
-faiss_index.save_local("app/db/faiss_grocery_index_hf")
-print("FAISS index created and saved successfully.")
\ No newline at end of file
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from app.db.ann_index import (
+    BUILDS_DIR,
+    CURRENT_FILE,
+    INDEX_TYPES,
+    PQ_CENTROIDS,
+    build_faiss_index,
+    index_config,
+    load_index_meta,
+    resolve_index_dir,
+    supports_removal,
+    write_index_meta,
+)
+from app.db.catalog import load_products, render_product_text
+from app.db.compact_docstore import (
+    CompactDocstore,
+    has_compact_docstore,
+    to_memory_docstore,
+    write_from_vectorstore,
+)
+from app.db.embedding_cache import EmbeddingCache, text_hash
+
+DEFAULT_SOURCE = "app/db/grocery_products_50.json"
+DEFAULT_INDEX_DIR = "app/db/faiss_grocery_index_hf"
+DEFAULT_CACHE_PATH = "app/db/embedding_cache.sqlite3"
+MANIFEST_FILE = "manifest.json"
+
+def record_hash(record: dict) -> str:
+    # Metadata changes without a text change still need the docstore updated
+    return hashlib.sha256(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+@contextmanager
+def build_lock(index_dir: str):
+    # One build per index directory at a time, across processes: the CLI and
+    # every worker's catalog reload may build the same index. Without fcntl
+    # (Windows) builds are not serialized
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+    lock_path = os.path.normpath(index_dir) + ".lock"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_manifest(index_dir: str):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(index_dir: str, manifest: dict):
+    with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+def save_index_atomically(faiss_index, index_dir: str, manifest: dict, index_meta: dict):
+    # Write a new build directory, then swap the CURRENT pointer with os.replace,
+    # so index_dir always names a complete build and readers never see an
+    # index.faiss from one build paired with a docstore from another. The
+    # docstore is written in the compact mmap format, not pickled.
+    previous = resolve_index_dir(index_dir)
+    version = str(time.time_ns())
+    build_dir = os.path.join(index_dir, BUILDS_DIR, version)
+    os.makedirs(build_dir)
+    faiss.write_index(faiss_index.index, os.path.join(build_dir, "index.faiss"))
+    write_from_vectorstore(build_dir, faiss_index)
+    write_manifest(build_dir, manifest)
+    write_index_meta(build_dir, index_meta)
+
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(f"{BUILDS_DIR}/{version}")
+    os.replace(pointer + ".tmp", pointer)
+    prune_builds(index_dir, keep={build_dir, previous})
+
+def prune_builds(index_dir: str, keep):
+    # The previous build stays for processes still loading it; older ones go
+    keep = {os.path.normpath(path) for path in keep}
+    builds = os.path.join(index_dir, BUILDS_DIR)
+    for name in os.listdir(builds):
+        path = os.path.join(builds, name)
+        if os.path.normpath(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+    if os.path.normpath(index_dir) not in keep:
+        # Files of a directory from before the pointer, now two builds old
+        for name in os.listdir(index_dir):
+            path = os.path.join(index_dir, name)
+            if name not in (CURRENT_FILE, BUILDS_DIR) and os.path.isfile(path):
+                os.remove(path)
+
+def load_for_update(index_dir: str, embeddings):
+    # A mutable copy of the live index; older directories only have index.pkl
+    if not has_compact_docstore(index_dir):
+        from app.core.config import FAISS_ALLOW_PICKLE
+        if not FAISS_ALLOW_PICKLE:
+            raise RuntimeError(f"{index_dir} has no compact docstore; convert it or set FAISS_ALLOW_PICKLE=true")
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    compact = CompactDocstore(index_dir)
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    return FAISS(embeddings, index, to_memory_docstore(compact), compact.index_to_docstore_id())
+
+def embed_missing(embeddings, cache, model_name, texts_by_hash, batch_size, report):
+    vectors = cache.get_many(model_name, texts_by_hash)
+    report["cache_hits"] = len(vectors)
+    missing = [digest for digest in texts_by_hash if digest not in vectors]
+    total = len(missing)
+    started = time.perf_counter()
+    for start in range(0, total, batch_size):
+        batch = missing[start:start + batch_size]
+        batch_vectors = embeddings.embed_documents([texts_by_hash[d] for d in batch])
+        cache.put_many(model_name, zip(batch, batch_vectors))
+        vectors.update(cache.get_many(model_name, batch))
+
+        done = start + len(batch)
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0.0
+        print(f"  embedded {done}/{total} ({rate:.1f} docs/s)", flush=True)
+    report["embedded"] = total
+    report["embed_seconds"] = time.perf_counter() - started
+    return vectors
+
+def build_index(
+    embeddings,
+    model_name: str,
+    source: str = DEFAULT_SOURCE,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    batch_size: int = 64,
+    full: bool = False,
+    index_type: str = "flat",
+    index_params: dict = None,
+) -> dict:
+    # A build that waited on the lock starts from the manifest the other one
+    # wrote, so it only does what is still left (often nothing)
+    with build_lock(index_dir):
+        return _build_index(
+            embeddings, model_name, source, index_dir, cache_path, batch_size, full, index_type, index_params
+        )
+
+def _build_index(embeddings, model_name, source, index_dir, cache_path, batch_size, full, index_type, index_params):
+    started = time.perf_counter()
+    products = {}
+    for record in load_products(source):
+        product_id = str(record.get("product_id", "")).strip().upper()
+        if product_id:
+            products[product_id] = record
+
+    texts = {pid: render_product_text(record) for pid, record in products.items()}
+    hashes = {pid: record_hash(record) for pid, record in products.items()}
+
+    live_dir = resolve_index_dir(index_dir)
+    manifest = None if full else load_manifest(live_dir)
+    if manifest is not None and manifest.get("model") != model_name:
+        print(f"Embedding model changed ({manifest.get('model')} -> {model_name}), rebuilding.")
+        manifest = None
+    index_meta = load_index_meta(live_dir)
+    # Compare with the type asked for last time: a pq request built as flat
+    # (too few vectors) is not a type change
+    requested = manifest.get("index_type", index_meta.get("index_type")) if manifest else None
+    if manifest is not None and requested != index_type:
+        print(f"Index type changed ({requested} -> {index_type}), rebuilding.")
+        manifest = None
+    if manifest is not None and index_meta.get("fallback") and len(products) >= PQ_CENTROIDS:
+        print(f"Enough products to train the requested {index_type} index now, rebuilding.")
+        manifest = None
+
+    previous = manifest["products"] if manifest else {}
+    removed = sorted(set(previous) - set(products))
+    changed = sorted(pid for pid in products if pid in previous and previous[pid] != hashes[pid])
+    added = sorted(pid for pid in products if pid not in previous)
+    if manifest is not None and (removed or changed) and not supports_removal(index_meta.get("index_type")):
+        print(f"A {index_meta.get('index_type')} index cannot delete vectors in place, rebuilding.")
+        manifest = None
+    to_write = products.keys() if manifest is None else changed + added
+
+    report = {
+        "mode": "full" if manifest is None else "incremental",
+        "products": len(products),
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "unchanged": len(products) - len(added) - len(changed),
+    }
+
+    cache = EmbeddingCache(cache_path)
+    texts_by_hash = {}
+    for pid in to_write:
+        texts_by_hash[text_hash(texts[pid])] = texts[pid]
+    vectors = embed_missing(embeddings, cache, model_name, texts_by_hash, batch_size, report)
+    cache.close()
+
+    pids = list(to_write)
+    text_embeddings = [(texts[pid], vectors[text_hash(texts[pid])]) for pid in pids]
+    metadatas = [products[pid] for pid in pids]
+
+    if manifest is None:
+        if not pids:
+            raise ValueError(f"No products found in {source}")
+        matrix = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        index_meta = index_config(index_type, matrix.shape[1], len(pids), index_params)
+        train_started = time.perf_counter()
+        faiss_index = FAISS(embeddings, build_faiss_index(index_meta, matrix), InMemoryDocstore(), {})
+        report["train_seconds"] = time.perf_counter() - train_started
+        faiss_index.add_embeddings(text_embeddings, metadatas=metadatas, ids=pids)
+    else:
+        faiss_index = load_for_update(live_dir, embeddings)
+        stale = removed + changed
+        if stale:
+            faiss_index.delete(ids=stale)
+        if pids:
+            faiss_index.add_embeddings(text_embeddings, metadatas=metadatas, ids=pids)
+
+    if manifest is None or pids or removed:
+        save_index_atomically(faiss_index, index_dir, {
+            "model": model_name,
+            "index_type": index_type,
+            "built_at": time.time(),
+            "products": hashes,
+        }, dict(index_meta, ntotal=faiss_index.index.ntotal))
+    report["index_type"] = index_meta["index_type"]
+
+    report["seconds"] = time.perf_counter() - started
+    report["docs_per_second"] = len(pids) / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the product FAISS index.")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="product catalog JSON")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="FAISS index directory")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="embedding cache SQLite file")
+    parser.add_argument("--batch-size", type=int, default=64, help="documents per embed_documents call")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild everything")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index type")
+    parser.add_argument("--nlist", type=int, help="IVF cells (default ~4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, help="IVF cells visited per query")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW neighbours per node")
+    parser.add_argument("--ef-search", type=int, help="HNSW search breadth")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers (bytes per vector)")
+    parser.add_argument("--train-sample", type=int, help="vectors used for training")
+    args = parser.parse_args()
+
+    from app.core.config import get_hf_embeddings, model_name
+
+    report = build_index(
+        get_hf_embeddings(),
+        model_name,
+        source=args.source,
+        index_dir=args.index_dir,
+        cache_path=args.cache,
+        batch_size=args.batch_size,
+        full=args.full,
+        index_type=args.index_type,
+        index_params={
+            "nlist": args.nlist,
+            "nprobe": args.nprobe,
+            "hnsw_m": args.hnsw_m,
+            "ef_search": args.ef_search,
+            "pq_m": args.pq_m,
+            "train_sample": args.train_sample,
+        },
+    )
+    print(
+        f"{report['mode'].title()} {report['index_type']} build: {report['products']} products "
+        f"(+{report['added']} ~{report['changed']} -{report['removed']}, {report['unchanged']} unchanged)"
+    )
+    print(
+        f"Embedded {report['embedded']} texts ({report['cache_hits']} from cache) "
+        f"in {report['embed_seconds']:.2f}s; total {report['seconds']:.2f}s, "
+        f"{report['docs_per_second']:.1f} docs/s written"
+    )
+
+if __name__ == "__main__":
+    main()
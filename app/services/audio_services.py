@@ -1,37 +1,140 @@
+import asyncio
+import hashlib
 import os
-from groq import Groq
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from groq import AsyncGroq
 from dotenv import load_dotenv
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-# Step 1: Transcribe audio
-filename = "app/db/audio/generated_f7297a70-524f-4829-a52b-bfbe1d44ac7f.wav"
-with open(filename, "rb") as file:
-    transcription = client.audio.transcriptions.create(
-        file=(filename, file.read()),
-        model="whisper-large-v3-turbo",
-        response_format="verbose_json",
-    )
-    captured_text = transcription.text
-    print("Transcribed Text:", captured_text)
-
-# Step 2: Translate using LLM
-response = client.chat.completions.create(
-    model="llama-3.3-70b-versatile",
-    messages=[
-        {
-            "role": "system",
-            "content": (
-                "You are a translator. Translate the input text into clear English. "
-                "If it's already in English, return it as-is. Do not explain anything. Just return the result."
-            ),
-        },
-        {"role": "user", "content": captured_text},
-    ],
-    temperature=0.3,
+from app.core.config import (
+    TRANSCRIPTION_MODEL,
+    TRANSCRIPTION_MAX_WORKERS,
+    TRANSCRIPTION_TIMEOUT_SECONDS,
+    TRANSCRIPTION_CACHE_SIZE,
 )
+from app.services.groq_scheduler import transcription_scheduler
+from app.services.metrics import TRANSCRIPTIONS
+from app.services.tracing import record_span
+
+load_dotenv()
+
+class TranscriptionTimeout(Exception):
+    pass
+
+# Wall-clock time per pipeline stage (download/transcription/answer), each
+# also recorded as a tracing span
+class StageTimings:
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            record_span(name, elapsed)
+
+    def as_ms(self) -> dict:
+        return {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+
+    def __str__(self):
+        return ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.stages.items())
+
+# Speech-to-text shared by the bot and the API: in-memory audio goes to Groq
+# through the transcription scheduler, at most max_workers at once, each
+# bounded by timeout. Identical audio is transcribed once (in-flight dedup
+# plus a small LRU)
+class TranscriptionService:
+    def __init__(
+        self,
+        client=None,
+        model: str = TRANSCRIPTION_MODEL,
+        max_workers: int = TRANSCRIPTION_MAX_WORKERS,
+        timeout: float = TRANSCRIPTION_TIMEOUT_SECONDS,
+        cache_size: int = TRANSCRIPTION_CACHE_SIZE,
+    ):
+        self._client = client
+        self.model = model
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self.calls = 0
+        self.dedup_hits = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Retries happen in the shared scheduler, which honours retry-after
+            self._client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+        return self._client
+
+    async def transcribe(self, audio: bytes, filename: str = "voice.ogg") -> str:
+        digest = hashlib.sha256(audio).hexdigest()
+
+        text = self._cache.get(digest)
+        if text is not None:
+            self._cache.move_to_end(digest)
+            self.dedup_hits += 1
+            TRANSCRIPTIONS.inc(result="cache_hit")
+            return text
+
+        task = self._inflight.get(digest)
+        if task is not None:
+            self.dedup_hits += 1
+            TRANSCRIPTIONS.inc(result="dedup")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._transcribe(audio, filename))
+        self._inflight[digest] = task
+        try:
+            text = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(digest, None)
+
+        self._cache[digest] = text
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return text
+
+    async def _transcribe(self, audio: bytes, filename: str) -> str:
+        try:
+            # The timeout covers queueing for a slot and for rate-limit budget too
+            transcription = await asyncio.wait_for(self._call(audio, filename), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            TRANSCRIPTIONS.inc(result="timeout")
+            raise TranscriptionTimeout(f"Transcription took longer than {self.timeout:g} seconds")
+        return transcription.text
+
+    async def _call(self, audio: bytes, filename: str):
+        async with self._semaphore:
+            self.calls += 1
+            TRANSCRIPTIONS.inc(result="call")
+            return await transcription_scheduler.acall(
+                lambda: self.client.audio.transcriptions.create(
+                    file=(filename, audio),
+                    model=self.model,
+                    response_format="verbose_json",
+                    # No language param: auto-detect mixed Bangla/English
+                )
+            )
+
+transcription_service = TranscriptionService()
 
-# Final result
-translated_text = response.choices[0].message.content.strip()
-print("Translated English Text:", translated_text)
\ No newline at end of file
+if __name__ == "__main__":
+    # Manual check: python -m app.services.audio_services path/to/audio.wav
+    path = sys.argv[1] if len(sys.argv) > 1 else "app/db/audio/generated_f7297a70-524f-4829-a52b-bfbe1d44ac7f.wav"
+    with open(path, "rb") as f:
+        data = f.read()
+    timings = StageTimings()
+    with timings.stage("transcription"):
+        text = asyncio.run(transcription_service.transcribe(data, os.path.basename(path)))
+    print("Transcribed Text:", text)
+    print("Timings:", timings)
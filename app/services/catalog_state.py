@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import os
+import pickle
+import threading
+import time
+
+from app.core.config import (
+    get_hf_embeddings,
+    PRODUCTS_PATH,
+    FAISS_INDEX_DIR,
+    RETRIEVER_MODE,
+    FAISS_MMAP,
+    FAISS_ALLOW_PICKLE,
+    FAISS_NPROBE,
+    FAISS_EF_SEARCH,
+    CONTEXT_MAX_REVIEWS,
+    COUNT_KEYWORDS,
+    INTENT_GREETINGS_PATH,
+    GREETING_MAX_EXTRA_WORDS,
+)
+from app.db.catalog import CatalogIndex, load_products
+
+logger = logging.getLogger(__name__)
+
+def current_rss_mb() -> float:
+    # Resident set size of this process; /proc on Linux, peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Everything derived from one version of the catalog files. A request uses
+# one snapshot throughout, so a reload never mixes old and new data
+class CatalogSnapshot:
+    def __init__(self, products, catalog, faiss_index, retriever, version, context_builder=None, intent_router=None):
+        self.products = products
+        self.catalog = catalog
+        self.faiss_index = faiss_index
+        self.retriever = retriever
+        self.context_builder = context_builder
+        self.intent_router = intent_router
+        self.version = version
+        self.loaded_at = time.time()
+
+def source_fingerprint(products_path=PRODUCTS_PATH, index_dir=FAISS_INDEX_DIR):
+    # mtimes and sizes of the catalog JSON, the build pointer and every file
+    # of the live build
+    from app.db.ann_index import CURRENT_FILE, resolve_index_dir
+
+    paths = [products_path, os.path.join(index_dir, CURRENT_FILE)]
+    live_dir = resolve_index_dir(index_dir)
+    if os.path.isdir(live_dir):
+        paths.extend(
+            os.path.join(live_dir, name) for name in sorted(os.listdir(live_dir))
+            if os.path.isfile(os.path.join(live_dir, name))
+        )
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+def read_faiss_index(index_dir, meta, mmap=FAISS_MMAP):
+    import faiss
+    from app.db.ann_index import apply_search_params
+
+    flags = 0
+    if mmap:
+        # Memory-mapped and read-only: every worker on the host shares the
+        # same page-cache pages instead of holding a private copy of the
+        # vectors. The index builder writes each build to a new directory
+        # rather than rewriting files, so a live mapping never sees a
+        # half-written index.
+        if meta.get("index_type") in ("ivf", "ivfpq"):
+            flags = faiss.IO_FLAG_MMAP  # maps the inverted lists
+        else:
+            # Flat/PQ codes are only mapped zero-copy with IO_FLAG_MMAP_IFC (faiss >= 1.11)
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        flags |= faiss.IO_FLAG_READ_ONLY
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"), flags)
+    apply_search_params(index, meta, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+    return index
+
+def load_faiss_index(index_dir, embeddings, mmap=FAISS_MMAP):
+    # Whatever index type the builder chose (index_meta.json), with its
+    # search-time parameters applied, and the compact docstore (pickled
+    # index.pkl only with FAISS_ALLOW_PICKLE)
+    from langchain_community.vectorstores import FAISS
+    from app.db.ann_index import load_index_meta
+    from app.db.compact_docstore import CompactDocstore, has_compact_docstore
+
+    index = read_faiss_index(index_dir, load_index_meta(index_dir), mmap)
+    if has_compact_docstore(index_dir):
+        docstore = CompactDocstore(index_dir)
+        return FAISS(embeddings, index, docstore, docstore.index_to_docstore_id())
+    if not FAISS_ALLOW_PICKLE:
+        raise RuntimeError(
+            f"{index_dir} has no compact docstore; convert it with "
+            f"'python -m app.db.compact_docstore {index_dir}' or set FAISS_ALLOW_PICKLE=true"
+        )
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def load_snapshot(products_path=PRODUCTS_PATH, index_dir=FAISS_INDEX_DIR) -> CatalogSnapshot:
+    # FAISS/langchain imports are deferred so importing the app stays cheap
+    from app.services.context_builder import ContextBuilder
+    from app.services.hybrid_retriever import HybridRetriever
+    from app.services.intent_router import IntentRouter, load_greetings
+
+    from app.db.ann_index import resolve_index_dir
+
+    version = source_fingerprint(products_path, index_dir)
+    products = load_products(products_path)
+    catalog = CatalogIndex(products)
+    faiss_index = load_faiss_index(resolve_index_dir(index_dir), get_hf_embeddings())
+    retriever = HybridRetriever.from_faiss(faiss_index, catalog, mode=RETRIEVER_MODE, k=3)
+    context_builder = ContextBuilder(catalog, max_reviews=CONTEXT_MAX_REVIEWS)
+    intent_router = IntentRouter.from_catalog(
+        catalog, COUNT_KEYWORDS, load_greetings(INTENT_GREETINGS_PATH), GREETING_MAX_EXTRA_WORDS
+    )
+    return CatalogSnapshot(products, catalog, faiss_index, retriever, version, context_builder, intent_router)
+
+def products_file_changed(version, products_path=PRODUCTS_PATH) -> bool:
+    # Whether the catalog JSON differs from the one a snapshot was loaded from
+    def products_entry(fingerprint):
+        return next((entry for entry in fingerprint if entry[0] == products_path), None)
+    return products_entry(version) != products_entry(source_fingerprint(products_path))
+
+def reindex_catalog(products_path=PRODUCTS_PATH, index_dir=FAISS_INDEX_DIR) -> dict:
+    # Incremental index build for the current catalog JSON with the live
+    # index's type and parameters: only new or edited products are embedded
+    # (through the embedding cache), so dense and BM25 search match the JSON
+    from app.core.config import model_name
+    from app.db.ann_index import load_index_meta, resolve_index_dir
+    from app.db.embededding import build_index, load_manifest
+
+    live_dir = resolve_index_dir(index_dir)
+    meta = load_index_meta(live_dir)
+    manifest = load_manifest(live_dir) or {}
+    params = {
+        name: meta.get(name)
+        for name in ("nlist", "nprobe", "hnsw_m", "ef_construction", "ef_search", "pq_m", "train_sample")
+    }
+    return build_index(
+        get_hf_embeddings(),
+        model_name,
+        source=products_path,
+        index_dir=index_dir,
+        index_type=manifest.get("index_type", meta["index_type"]),
+        index_params=params,
+    )
+
+def changed_product_ids(old: CatalogSnapshot, new: CatalogSnapshot) -> set:
+    changed = set(old.catalog.products) ^ set(new.catalog.products)
+    for product_id, product in new.catalog.products.items():
+        previous = old.catalog.products.get(product_id)
+        if previous is not None and previous != product:
+            changed.add(product_id)
+    return changed
+
+_snapshot = None
+_reload_lock = threading.Lock()
+_reload_listeners = []
+last_reload_report = None
+
+def is_loaded() -> bool:
+    return _snapshot is not None
+
+def current_snapshot() -> CatalogSnapshot:
+    global _snapshot
+    if _snapshot is None:
+        with _reload_lock:
+            if _snapshot is None:
+                _snapshot = load_snapshot()
+    return _snapshot
+
+async def acurrent_snapshot() -> CatalogSnapshot:
+    # For async routes: a published snapshot is a plain read, but the first
+    # load (or waiting on warmup's) runs in a worker thread, not on the loop
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+    return await asyncio.to_thread(current_snapshot)
+
+def add_reload_listener(listener):
+    # listener(old_snapshot, new_snapshot, changed_product_ids) runs after each swap
+    _reload_listeners.append(listener)
+
+def reload_catalog(reason: str = "manual") -> dict:
+    # Builds a new snapshot aside and swaps it in atomically; running requests
+    # keep theirs. Concurrent reloads are serialized. When the catalog JSON
+    # changed, the index is brought up to date first (a no-op if it already
+    # was), so retrieval never runs on vectors and texts of the old products
+    global _snapshot, last_reload_report
+    with _reload_lock:
+        started = time.perf_counter()
+        rss_before = current_rss_mb()
+        old = _snapshot
+        reindex = None
+        if old is not None and products_file_changed(old.version):
+            build = reindex_catalog()
+            reindex = {key: build[key] for key in ("mode", "added", "changed", "removed", "embedded", "seconds")}
+        new = load_snapshot()
+        _snapshot = new  # single reference assignment: the atomic swap
+
+        changed = changed_product_ids(old, new) if old is not None else set()
+        for listener in _reload_listeners:
+            try:
+                listener(old, new, changed)
+            except Exception:
+                logger.exception("Catalog reload listener failed")
+
+        report = {
+            "reason": reason,
+            "products": len(new.catalog),
+            "vectors": new.faiss_index.index.ntotal,
+            "changed_products": len(changed),
+            "reindex": reindex,
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "rss_mb_before": round(rss_before, 1),
+            "rss_mb_after": round(current_rss_mb(), 1),
+            "loaded_at": new.loaded_at,
+        }
+        last_reload_report = report
+    logger.info(
+        "Catalog reloaded (%s) in %.2f seconds: %d products, %d changed, RSS %.0f -> %.0f MB",
+        reason, report["duration_seconds"], report["products"], report["changed_products"],
+        report["rss_mb_before"], report["rss_mb_after"],
+    )
+    return report
+
+# Polls the catalog JSON and index directory and reloads once a change has
+# been stable for one extra poll, so half-written files are not picked up
+class CatalogWatcher(threading.Thread):
+    def __init__(self, interval: float = 5.0):
+        super().__init__(name="catalog-watcher", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        seen = source_fingerprint()
+        pending = None
+        while not self._stop_event.wait(self.interval):
+            fingerprint = source_fingerprint()
+            if fingerprint == seen:
+                pending = None
+                continue
+            if fingerprint != pending:
+                pending = fingerprint
+                continue
+            try:
+                reload_catalog(reason="file change")
+                # What was loaded, including a build the reload itself wrote
+                seen = _snapshot.version
+            except Exception:
+                logger.exception("Catalog reload failed, keeping current snapshot")
+                seen = fingerprint
+            pending = None
+
+    def stop(self):
+        self._stop_event.set()
@@ -1,37 +1,73 @@
 import time
-import re
-import json
-
-from langchain_core.caches import InMemoryCache
-from langchain_core.globals import set_llm_cache
-from langchain_community.vectorstores import FAISS
-from langchain_groq import ChatGroq
-from langchain_core.runnables import RunnableSequence
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.chat_history import InMemoryChatMessageHistory
-
-from app.core.config import hf_embeddings
-
-# Load your JSON products data once
-with open("app/db/grocery_products_50.json", "r") as f:
-    json_data = json.load(f)
-    all_products = []
-    for section in json_data:
-        all_products.extend(section.get("content", []))
-
-# Enable caching
-set_llm_cache(InMemoryCache())
-
-# Load vectorstore
-faiss_index = FAISS.load_local(
-    'app/db/faiss_grocery_index_hf',
-    hf_embeddings,
-    allow_dangerous_deserialization=True
+
+from app.core.config import (
+    get_hf_embeddings,
+    MAX_CONCURRENT_ANSWERS,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_MB,
+    SESSION_BACKEND,
+    SESSION_SQLITE_PATH,
+    SESSION_MAX_SESSIONS,
+    SESSION_MAX_MB,
+    SESSION_TTL_SECONDS,
+    HISTORY_TOKEN_BUDGET,
+    SUMMARY_TOKEN_BUDGET,
+    FAST_PATH_ENABLED,
+    GROQ_EXPECTED_OUTPUT_TOKENS,
+    LARGE_CHAT_MODEL,
+    SMALL_CHAT_MODEL,
+    LLM_CASCADE,
+    LLM_LATENCY_BUDGET_SECONDS,
+    CASCADE_MIN_CONTEXT_OVERLAP,
+    CONTEXT_COMPACTION,
+    CONTEXT_TOKEN_BUDGET,
+    PROMPT_TOKEN_BUDGET,
 )
+from app.services.catalog_state import acurrent_snapshot, current_snapshot, add_reload_listener
+from app.services.response_cache import SemanticResponseCache
+from app.services.session_store import create_session_store, estimate_tokens, format_messages
+from app.services.context_builder import fit_history
+from app.services.intent_router import resolve_pronouns
+from app.services.fast_path import FastPathEngine
+from app.services.groq_scheduler import ScheduledChatModel, chat_scheduler, small_chat_scheduler
+from app.services.model_cascade import ModelCascade, llm_cost_usd
+from app.services.metrics import (
+    ANSWERS_IN_PROGRESS,
+    FAST_PATH_ATTEMPTS,
+    LLM_COST_USD,
+    LLM_ERRORS,
+    LLM_TOKENS,
+    RESPONSE_CACHE_LOOKUPS,
+)
+from app.services.tracing import current_trace, record_span, span, trace
+
+logger = logging.getLogger(__name__)
 
-retriever = faiss_index.as_retriever(search_kwargs={"k": 3}, search_type='similarity')
+# Products, catalog index, FAISS index and retriever live in a snapshot that
+# reload_catalog() swaps atomically. It, the embedding model and the Groq
+# client are all loaded on first use or by app.services.warmup.warmup().
+
+# Deterministic answers for structured lookups, ahead of RAG and the LLM
+fast_path = FastPathEngine()
+
+# Answer cache in front of the LLM, keyed on grounding products + question
+response_cache = SemanticResponseCache(
+    lambda text: get_hf_embeddings().embed_query(text),
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+)
 
 POLITE_FALLBACK_MSG = (
     "I'm here to help with questions about our grocery store and products. "
@@ -53,12 +89,6 @@ system_message = (
     "Always keep your responses accurate, helpful, and focused on the customer's needs."
 )
 
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.7,
-    max_retries=2,
-)
-
 prompt = ChatPromptTemplate.from_template(
     """{system_message}
 
@@ -71,206 +101,421 @@ User: {question}
 Assistant:"""
 ).partial(system_message=system_message)
 
-message_histories = {}
-
-def get_history(session_id: str):
-    if session_id not in message_histories:
-        message_histories[session_id] = InMemoryChatMessageHistory()
-    return message_histories[session_id]
-
-# Store last product ID referenced per session
-last_product_ids = {}
+class LLMMetricsCallback(BaseCallbackHandler):
+    # Token usage, cost and errors for every chat model call, streamed or not
+    run_inline = True
+
+    def __init__(self, model: str = LARGE_CHAT_MODEL):
+        self.model = model
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), model=self.model, direction="in")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), model=self.model, direction="out")
+                    LLM_COST_USD.inc(llm_cost_usd(self.model, usage), model=self.model)
+
+    def on_llm_error(self, error, **kwargs):
+        LLM_ERRORS.inc(model=self.model, error=type(error).__name__)
+
+_llm = None
+_small_llm = None
+_chain = None
+_cascade = None
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        from langchain_groq import ChatGroq
+        # No SDK retries: the shared scheduler paces, retries and coalesces
+        _llm = ScheduledChatModel(
+            llm=ChatGroq(model=LARGE_CHAT_MODEL, temperature=0.7, max_retries=0),
+            scheduler=chat_scheduler,
+            expected_output_tokens=GROQ_EXPECTED_OUTPUT_TOKENS,
+            callbacks=[LLMMetricsCallback(LARGE_CHAT_MODEL)],
+        )
+    return _llm
+
+def get_small_llm():
+    global _small_llm
+    if _small_llm is None:
+        from langchain_groq import ChatGroq
+        # Lower temperature: the small model mostly restates catalog facts
+        _small_llm = ScheduledChatModel(
+            llm=ChatGroq(model=SMALL_CHAT_MODEL, temperature=0.3, max_retries=0),
+            scheduler=small_chat_scheduler,
+            expected_output_tokens=GROQ_EXPECTED_OUTPUT_TOKENS,
+            callbacks=[LLMMetricsCallback(SMALL_CHAT_MODEL)],
+        )
+    return _small_llm
+
+def set_llm(llm, small_llm=None):
+    # Swap the chat models, e.g. for local stand-ins in benchmarks
+    global _llm, _small_llm, _chain, _cascade
+    _llm = llm
+    if small_llm is not None:
+        _small_llm = small_llm
+    _chain = None
+    _cascade = None
+
+def get_chain():
+    global _chain
+    if _chain is None:
+        _chain = prompt | get_llm() | StrOutputParser()
+    return _chain
+
+def get_cascade():
+    global _cascade
+    if _cascade is None:
+        _cascade = ModelCascade(
+            small=(SMALL_CHAT_MODEL, prompt | get_small_llm()),
+            large=(LARGE_CHAT_MODEL, prompt | get_llm()),
+            latency_budget=LLM_LATENCY_BUDGET_SECONDS,
+            min_context_overlap=CASCADE_MIN_CONTEXT_OVERLAP,
+            large_scheduler=chat_scheduler,
+        )
+    return _cascade
+
+# Chat history, last referenced product and summary per session, with
+# TTL/LRU eviction and a token-budgeted history window
+session_store = create_session_store(
+    backend=SESSION_BACKEND,
+    sqlite_path=SESSION_SQLITE_PATH,
+    max_sessions=SESSION_MAX_SESSIONS,
+    max_mb=SESSION_MAX_MB,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    history_token_budget=HISTORY_TOKEN_BUDGET,
+    summary_token_budget=SUMMARY_TOKEN_BUDGET,
+)
 
 def save_last_product_id(session_id: str, product_id: str):
-    last_product_ids[session_id] = product_id
+    session_store.save_last_product_id(session_id, product_id)
 
 def get_last_product_id(session_id: str):
-    return last_product_ids.get(session_id)
-
-chat_sessions = {}
-
-def get_qa_chain_for_session(session_id: str):
-    if session_id not in chat_sessions:
-        chain = RunnableSequence(prompt | llm | StrOutputParser())
-        chain_with_history = RunnableWithMessageHistory(
-            runnable=chain,
-            get_session_history=get_history,
-            input_messages_key="question",
-            history_messages_key="chat_history"
-        )
-        chat_sessions[session_id] = {
-            "chain": chain_with_history,
-        }
-    return chat_sessions[session_id]
-
-def format_chat_history(history_messages):
-    formatted = []
-    for msg in history_messages:
-        if msg.type == "human":
-            formatted.append(f"User: {msg.content}")
-        elif msg.type == "ai":
-            formatted.append(f"Assistant: {msg.content}")
-    return "\n".join(formatted)
-
-def count_products_by_keyword(keyword: str) -> int:
-    all_docs = faiss_index.docstore._dict.values()
-    keyword = keyword.lower()
-    count = 0
-    for doc in all_docs:
-        metadata = doc.metadata
-        if (
-            keyword in metadata.get("category", "").lower() or
-            keyword in metadata.get("sub_category", "").lower() or
-            keyword in doc.page_content.lower()
-        ):
-            count += 1
-    return count
+    return session_store.get_last_product_id(session_id)
+
+def get_chat_history(session_id: str) -> str:
+    return session_store.history_text(session_id)
+
+def invalidate_cached_answers(product_ids) -> int:
+    # Call when product data changes so stale prices/stock are not served
+    return sum(response_cache.invalidate_product(pid) for pid in product_ids)
+
+def lookup_cached_answer(product_ids, question: str):
+    if not RESPONSE_CACHE_ENABLED:
+        return None, None
+    with span("cache_lookup"):
+        answer, embedding = response_cache.lookup(product_ids, question)
+    RESPONSE_CACHE_LOOKUPS.inc(result="miss" if answer is None else "hit")
+    return answer, embedding
+
+def store_cached_answer(product_ids, question: str, answer: str, embedding=None):
+    if RESPONSE_CACHE_ENABLED:
+        response_cache.store(product_ids, question, answer, embedding)
+
+# Answers grounded on products whose data changed in a reload are stale
+add_reload_listener(lambda old, new, changed: invalidate_cached_answers(changed))
+
+def fast_path_answer(snapshot, question: str, product=None):
+    if not FAST_PATH_ENABLED:
+        return None
+    with span("fast_path"):
+        answer = fast_path.answer(snapshot.catalog, question, product)
+    FAST_PATH_ATTEMPTS.inc(result="fallback" if answer is None else "hit")
+    return answer
+
+def fast_path_stats() -> dict:
+    return fast_path.stats()
+
+def count_products_by_keyword(keyword: str, snapshot=None) -> int:
+    snapshot = snapshot or current_snapshot()
+    return snapshot.catalog.count_matching(keyword)
+
+def find_products(snapshot=None, **filters) -> list:
+    # Range/attribute filter over the catalog, see CatalogIndex.filter
+    snapshot = snapshot or current_snapshot()
+    return snapshot.catalog.filter(**filters)
 
 def get_retriever_query(session_id: str, question: str) -> str:
-    history = get_history(session_id).messages[-4:]  # last 4 messages
-    formatted_history = format_chat_history(history)
+    history = session_store.recent_messages(session_id, 4)  # last 4 messages
+    formatted_history = format_messages(history)
     return f"{formatted_history}\nUser: {question}"
 
-def get_answer_for_session(session_id: str, question: str) -> str:
-    start_time = time.time()
-    lower_q = question.lower()
+def record_turn(session_id: str, question: str, answer: str):
+    session_store.append_turn(session_id, question, answer)
+
+def build_product_context(product: dict) -> str:
+    context_lines = []
+    for key, value in product.items():
+        if isinstance(value, list):
+            if len(value) > 0 and isinstance(value[0], dict):
+                # Pass only review ratings and comments without usernames
+                value = ", ".join(
+                    f"Rating: {v['rating']}, Comment: {v['comment']}"
+                    for v in value
+                )
+            else:
+                value = ", ".join(str(v) for v in value)
+        context_lines.append(f"{key.replace('_', ' ').title()}: {value}")
+    return "\n".join(context_lines)
+
+def build_docs_context(docs) -> str:
+    return "\n\n".join([doc.page_content.strip() for doc in docs if doc.page_content.strip()])
+
+def build_context(snapshot, question: str, product=None, docs=()) -> str:
+    # Compact snippets with the fields the question needs (context_builder);
+    # the full product text with CONTEXT_COMPACTION off
+    builder = snapshot.context_builder
+    if product is not None:
+        product_ids = [str(product.get("product_id", "")).upper()]
+    else:
+        product_ids = [str(doc.metadata.get("product_id", "")).upper() for doc in docs]
+    if not CONTEXT_COMPACTION or builder is None or not all(pid in builder for pid in product_ids):
+        # Also when the index has products the catalog doesn't
+        return build_product_context(product) if product is not None else build_docs_context(docs)
+    return builder.build(product_ids, question, CONTEXT_TOKEN_BUDGET)
+
+def build_chat_history(session_id: str, context: str) -> str:
+    # History gets whatever the context leaves of the prompt budget
+    history = get_chat_history(session_id)
+    if not CONTEXT_COMPACTION:
+        return history
+    return fit_history(history, max(0, PROMPT_TOKEN_BUDGET - estimate_tokens(context)))
+
+def set_route(route: str):
+    # Labels the current request's trace and answer metrics
+    current = current_trace()
+    if current is not None:
+        current.set_route(route)
+
+# Runs the cheap, non-LLM steps shared by the sync and async pipelines.
+# Returns (question, answer, product): a set answer means the question is
+# fully handled, otherwise product is the product the question is about,
+# or None when RAG retrieval is still needed.
+def route_question(snapshot, session_id: str, question: str):
+    # One scan finds product IDs, pronouns, count questions and greetings
+    intent = snapshot.intent_router.classify(question)
 
     # 1. Detect product ID queries first
-    match = re.search(r'\bP-\d{3}\b', question, re.IGNORECASE)
-    if match:
-        product_id = match.group().upper()
-        product = next((p for p in all_products if p.get("product_id", "").upper() == product_id), None)
+    if intent.product_id:
+        product_id = intent.product_id
+        product = snapshot.catalog.get(product_id)
         if product:
             save_last_product_id(session_id, product_id)
-            context_lines = []
-            for key, value in product.items():
-                if isinstance(value, list):
-                    if len(value) > 0 and isinstance(value[0], dict):
-                        # Pass only review ratings and comments without usernames
-                        value = ", ".join(
-                            f"Rating: {v['rating']}, Comment: {v['comment']}"
-                            for v in value
-                        )
-                    else:
-                        value = ", ".join(str(v) for v in value)
-                context_lines.append(f"{key.replace('_', ' ').title()}: {value}")
-            context = "\n".join(context_lines)
-
-            print(f"[DEBUG] Context for product ID {product_id}:\n{context}\n")
-
-            session = get_qa_chain_for_session(session_id)
-            chain = session["chain"]
-            history = get_history(session_id)
-
-            inputs = {
-                "context": context,
-                "question": question,
-                "chat_history": format_chat_history(history.messages)
-            }
-            answer = chain.invoke(inputs, config={"configurable": {"session_id": session_id}})
-
-            # Append messages to history here!
-            history.add_user_message(question)
-            history.add_ai_message(answer)
-
-            duration = time.time() - start_time
-            print(f"[DEBUG] Answer generated in {duration:.2f} seconds: {answer}\n")
-            return answer
+            answer = fast_path_answer(snapshot, question, product)
+            if answer is not None:
+                set_route("product_id_fast_path")
+                record_turn(session_id, question, answer)
+                return question, answer, None
+            set_route("product_id")
+            return question, None, product
         else:
-            duration = time.time() - start_time
-            print(f"[DEBUG] Product ID {product_id} not found. Responded in {duration:.2f} seconds.")
-            return f"❌ Sorry, we couldn't find any product with ID **{product_id}**."
+            set_route("product_not_found")
+            return question, f"❌ Sorry, we couldn't find any product with ID **{product_id}**.", None
 
     # 2. Coreference / pronoun resolution: rewrite pronouns using last product ID
-    pronouns = ["its", "their", "they", "them", "it"]
-    if any(p in lower_q for p in pronouns):
-        last_pid = get_last_product_id(session_id)
-        if last_pid:
-            question = re.sub(r'\bits\b', f'the product {last_pid}', question, flags=re.IGNORECASE)
-            question = re.sub(r'\btheir\b', f'the product {last_pid}', question, flags=re.IGNORECASE)
-            question = re.sub(r'\bthey\b', f'the product {last_pid}', question, flags=re.IGNORECASE)
-            question = re.sub(r'\bthem\b', f'the product {last_pid}', question, flags=re.IGNORECASE)
-            question = re.sub(r'\bit\b', f'the product {last_pid}', question, flags=re.IGNORECASE)
-            lower_q = question.lower()
-            print(f"[DEBUG] Question rewritten for coreference: {question}")
-
-    # 3. Product count queries
-    if "how many" in lower_q and "product" in lower_q:
-        possible_keywords = ["snacks", "baby", "rice", "biscuits", "popcorn", "vegetables", "fruits"]
-        for keyword in possible_keywords:
-            if keyword in lower_q:
-                count = count_products_by_keyword(keyword)
-                duration = time.time() - start_time
-                print(f"[DEBUG] Product count query responded in {duration:.2f} seconds.")
-                # Append to history before returning
-                history = get_history(session_id)
-                history.add_user_message(question)
-                history.add_ai_message(f"We currently have {count} {keyword} products in our grocery shop.")
-                return f"We currently have {count} {keyword} products in our grocery shop."
-        total_products = len(faiss_index.index_to_docstore_id)
-        duration = time.time() - start_time
-        print(f"[DEBUG] Total product count query responded in {duration:.2f} seconds.")
-        history = get_history(session_id)
-        history.add_user_message(question)
-        history.add_ai_message(f"We currently have {total_products} products in our grocery shop.")
-        return f"We currently have {total_products} products in our grocery shop."
-
-    # 4. Casual greetings
-    casual_inputs = {
-        "hi": "Hello! 👋 How can I assist you with your grocery shopping today?",
-        "hello": "Hi there! 😊 Looking for something specific in our grocery shop?",
-        "hey": "Hey! 👋 I'm here to help you find grocery items.",
-        "are you available": "Yes, I'm always here to help with your grocery-related queries.",
-        "how are you": "I'm great, thank you! How can I assist with your grocery needs?",
-        "what is your name": "I'm your grocery assistant, here to help you with shopping!"
-    }
-    for key in casual_inputs:
-        if key in lower_q:
-            duration = time.time() - start_time
-            print(f"[DEBUG] Casual response generated in {duration:.2f} seconds")
-            history = get_history(session_id)
-            history.add_user_message(question)
-            history.add_ai_message(casual_inputs[key])
-            return casual_inputs[key]
-
-    # 5. RAG retrieval query with history-enhanced input
-    session = get_qa_chain_for_session(session_id)
-    chain = session["chain"]
-
-    retriever_query = get_retriever_query(session_id, question)
-    docs = retriever.invoke(retriever_query)
-
-    if not docs:
-        print(f"[DEBUG] No documents retrieved for question: {question}")
-        history = get_history(session_id)
-        history.add_user_message(question)
-        history.add_ai_message(POLITE_FALLBACK_MSG)
-        return POLITE_FALLBACK_MSG
-
-    context = "\n\n".join([doc.page_content.strip() for doc in docs if doc.page_content.strip()])
-    if not context:
-        print(f"[DEBUG] Retrieved docs, but context is empty for question: {question}")
-        history = get_history(session_id)
-        history.add_user_message(question)
-        history.add_ai_message(POLITE_FALLBACK_MSG)
-        return POLITE_FALLBACK_MSG
-
-    print(f"[DEBUG] Context for question '{question}':\n{context[:800]}...\n")
-
-    inputs = {
-        "context": context,
-        "question": question,
-        "chat_history": format_chat_history(get_history(session_id).messages)
-    }
-
-    answer = chain.invoke(inputs, config={"configurable": {"session_id": session_id}})
-
-    # Append user and assistant messages
-    history = get_history(session_id)
-    history.add_user_message(question)
-    history.add_ai_message(answer)
+    if intent.has_pronoun:
+        with span("coreference"):
+            last_pid = get_last_product_id(session_id)
+            if last_pid:
+                question = resolve_pronouns(question, last_pid)
+                logger.debug("Question rewritten for coreference: %s", question)
+
+    # 3. Product count queries, by catalog category or keyword
+    if intent.is_count:
+        set_route("count")
+        if intent.count_keyword:
+            count = count_products_by_keyword(intent.count_keyword, snapshot)
+            # "baby products" -> "We currently have 5 baby products"
+            label = intent.count_keyword.removesuffix(" products").removesuffix(" product")
+            answer = f"We currently have {count} {label} products in our grocery shop."
+        else:
+            answer = f"We currently have {len(snapshot.catalog)} products in our grocery shop."
+        record_turn(session_id, question, answer)
+        return question, answer, None
+
+    # 4. Casual greetings, only when the message is little more than one
+    if intent.greeting is not None:
+        set_route("greeting")
+        record_turn(session_id, question, intent.greeting)
+        return question, intent.greeting, None
+
+    # 5. Structured lookups answered straight from the catalog
+    answer = fast_path_answer(snapshot, question)
+    if answer is not None:
+        set_route("fast_path")
+        record_turn(session_id, question, answer)
+        return question, answer, None
+
+    # 6. Needs RAG retrieval
+    set_route("rag")
+    return question, None, None
+
+def log_context(question: str, product_ids, context: str):
+    # Only sizes and IDs: full contexts would flood the log on every request
+    logger.debug("Context for %r: products=%s, %d chars", question, product_ids, len(context))
 
-    end_time = time.time()
-    print(f"[DEBUG] Answer generated in {end_time - start_time:.2f} seconds: {answer}")
+def get_answer_for_session(session_id: str, question: str) -> str:
+    with trace("sync", session_id=session_id):
+        ANSWERS_IN_PROGRESS.inc()
+        try:
+            return _answer_for_session(session_id, question)
+        finally:
+            ANSWERS_IN_PROGRESS.dec()
+
+def _answer_for_session(session_id: str, question: str) -> str:
+    snapshot = current_snapshot()
+
+    with span("intent"):
+        question, answer, product = route_question(snapshot, session_id, question)
+    if answer is not None:
+        return answer
+
+    if product is not None:
+        with span("prompt_build"):
+            context = build_context(snapshot, question, product=product)
+        product_ids = [product["product_id"]]
+    else:
+        # RAG retrieval query with history-enhanced input
+        with span("retrieval"):
+            retriever_query = get_retriever_query(session_id, question)
+            docs = snapshot.retriever.invoke(retriever_query, question=question)
+        with span("prompt_build"):
+            context = build_context(snapshot, question, docs=docs)
+        if not context:
+            set_route("no_context")
+            record_turn(session_id, question, POLITE_FALLBACK_MSG)
+            return POLITE_FALLBACK_MSG
+        product_ids = [doc.metadata.get("product_id") for doc in docs]
+    log_context(question, product_ids, context)
+
+    answer, question_embedding = lookup_cached_answer(product_ids, question)
+    if answer is not None:
+        set_route("cached")
+        record_turn(session_id, question, answer)
+        return answer
+
+    with span("prompt_build"):
+        inputs = {
+            "context": context,
+            "question": question,
+            "chat_history": build_chat_history(session_id, context)
+        }
+    with span("llm_total"):
+        if LLM_CASCADE:
+            answer = get_cascade().invoke(inputs, question, context, single_product=product is not None)
+        else:
+            answer = get_chain().invoke(inputs)
+    store_cached_answer(product_ids, question, answer, question_embedding)
 
-    return answer
\ No newline at end of file
+    # Append user and assistant messages
+    record_turn(session_id, question, answer)
+    return answer
+
+# Async pipeline: one lock per session keeps a user's messages answered in
+# order, while the global semaphore caps concurrent LLM pipelines per process.
+session_locks = {}
+answer_semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANSWERS)
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    entry = session_locks.get(session_id)
+    if entry is None:
+        entry = session_locks[session_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            session_locks.pop(session_id, None)
+
+async def astream_answer_for_session(session_id: str, question: str, kind: str = "stream"):
+    # Yields answer chunks as the LLM produces them; non-LLM answers come as a
+    # single chunk. History and the response cache are written once the
+    # stream completes.
+    async with session_lock(session_id):
+        async with answer_semaphore:
+            with trace(kind, session_id=session_id):
+                ANSWERS_IN_PROGRESS.inc()
+                try:
+                    async for chunk in _astream_answer(session_id, question):
+                        yield chunk
+                finally:
+                    ANSWERS_IN_PROGRESS.dec()
+
+async def _astream_answer(session_id: str, question: str):
+    snapshot = await acurrent_snapshot()
+
+    # Session reads and writes go through worker threads: with the SQLite
+    # backend another worker can hold the write lock for a while, and that
+    # must not stall this event loop
+    with span("intent"):
+        question, answer, product = await asyncio.to_thread(route_question, snapshot, session_id, question)
+    if answer is not None:
+        yield answer
+        return
+
+    if product is not None:
+        with span("prompt_build"):
+            context = build_context(snapshot, question, product=product)
+        product_ids = [product["product_id"]]
+    else:
+        with span("retrieval"):
+            retriever_query = await asyncio.to_thread(get_retriever_query, session_id, question)
+            docs = await snapshot.retriever.ainvoke(retriever_query, question=question)
+        with span("prompt_build"):
+            context = build_context(snapshot, question, docs=docs)
+        if not context:
+            set_route("no_context")
+            await asyncio.to_thread(record_turn, session_id, question, POLITE_FALLBACK_MSG)
+            yield POLITE_FALLBACK_MSG
+            return
+        product_ids = [doc.metadata.get("product_id") for doc in docs]
+    log_context(question, product_ids, context)
+
+    # The similarity lookup may embed the question, keep it off the loop
+    answer, question_embedding = await asyncio.to_thread(
+        lookup_cached_answer, product_ids, question
+    )
+    if answer is not None:
+        set_route("cached")
+        await asyncio.to_thread(record_turn, session_id, question, answer)
+        yield answer
+        return
+
+    with span("prompt_build"):
+        inputs = {
+            "context": context,
+            "question": question,
+            "chat_history": await asyncio.to_thread(build_chat_history, session_id, context)
+        }
+    if LLM_CASCADE:
+        stream = get_cascade().astream(inputs, question, context, single_product=product is not None)
+    else:
+        stream = get_chain().astream(inputs)
+    chunks = []
+    with span("llm_total"):
+        llm_started = time.perf_counter()
+        async for chunk in stream:
+            if not chunk:
+                continue
+            if not chunks:
+                record_span("llm_first_token", time.perf_counter() - llm_started)
+            chunks.append(chunk)
+            yield chunk
+    answer = "".join(chunks)
+
+    await asyncio.to_thread(
+        store_cached_answer, product_ids, question, answer, question_embedding
+    )
+    await asyncio.to_thread(record_turn, session_id, question, answer)
+
+async def aget_answer_for_session(session_id: str, question: str, kind: str = "async") -> str:
+    chunks = []
+    async for chunk in astream_answer_for_session(session_id, question, kind=kind):
+        chunks.append(chunk)
+    return "".join(chunks)
@@ -0,0 +1,149 @@
+# Compact, intent-aware LLM context: each product is rendered once per
+# catalog load into short field lines, and a question gets the header plus
+# only the lines its intent needs, within the context token budget
+
+import re
+
+from app.services.session_store import estimate_tokens
+
+# Questions that need customer reviews in the context; the hybrid retriever
+# also leaves reviews out of compact-docstore documents otherwise
+REVIEW_RE = re.compile(r"\b(reviews?|reviewed|feedback|comments?|opinions?|complain\w*|customers? say|people say)\b")
+
+INTENT_PATTERNS = {
+    "price": re.compile(
+        r"\b(price|prices|cost|costs|how much|cheap\w*|expensive|afford\w*|discount\w*|offers?|deals?|"
+        r"on sale|budget|taka|tk|bdt)\b"
+    ),
+    "stock": re.compile(r"\b(stock|available|availability|sold out|buy|order)\b"),
+    "reviews": REVIEW_RE,
+    "rating": re.compile(r"\b(ratings?|rated|stars?|best|top|popular|good|quality)\b"),
+    "details": re.compile(
+        r"\b(describe|description|what is|tell me about|details?|brand|origin|made|ingredients?|tags?|vegan|"
+        r"organic|gluten[- ]free|healthy|fresh|suitable|good for|kids|family|families|athletes|recommend\w*|"
+        r"suggest\w*|size|unit|weight|similar|alternatives?)\b"
+    ),
+}
+
+# Lines each intent needs after the header, most important first
+INTENT_FIELDS = {
+    "price": ("price", "stock"),
+    "stock": ("stock", "price"),
+    "reviews": ("rating", "reviews"),
+    "rating": ("rating",),
+    "details": ("details", "price", "stock", "rating"),
+}
+# No recognizable intent: everything but the review comments
+GENERAL_FIELDS = ("price", "stock", "rating", "details")
+
+def question_intents(question: str) -> tuple:
+    lower_q = question.lower()
+    return tuple(intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(lower_q))
+
+def intent_fields(intents) -> tuple:
+    if not intents:
+        return GENERAL_FIELDS
+    fields = []
+    for intent in intents:
+        for field in INTENT_FIELDS[intent]:
+            if field not in fields:
+                fields.append(field)
+    return tuple(fields)
+
+def _join(values) -> str:
+    return ", ".join(str(value) for value in values if value)
+
+def product_snippet(product: dict, max_reviews: int = 3) -> dict:
+    # Field name -> one context line for a product
+    header = " | ".join(part for part in (
+        f"{product.get('product_id', '')} {product.get('product_name', '')}".strip(),
+        " > ".join(part for part in (product.get("category"), product.get("sub_category")) if part),
+        product.get("brand"),
+        product.get("unit"),
+    ) if part)
+    price = f"Price: {product.get('price', 0)} {product.get('currency', '')}".rstrip()
+    if product.get("discount"):
+        price += f", {product['discount']}% off"
+    reviews = product.get("reviews") or []
+    rating = f"Rating: {product.get('rating', 0)}/5 ({len(reviews)} reviews)"
+    snippet = {
+        "header": header,
+        "price": price,
+        "stock": f"Stock: {product.get('stock_status', 'unknown')}",
+        "rating": rating,
+        "reviews": "",
+        "details": "; ".join(part for part in (
+            product.get("description", ""),
+            f"Origin: {product['origin']}" if product.get("origin") else "",
+            f"Tags: {_join(product.get('tags', []))}" if product.get("tags") else "",
+            f"For: {_join(product.get('recommended_for', []))}" if product.get("recommended_for") else "",
+        ) if part),
+    }
+    if reviews:
+        average = sum(review.get("rating", 0) for review in reviews) / len(reviews)
+        comments = []
+        for review in reviews:
+            comment = str(review.get("comment", "")).strip()
+            if comment and comment not in comments:
+                comments.append(comment)
+        snippet["reviews"] = f"Reviews (avg {average:.1f}/5): " + " ".join(comments[:max_reviews])
+    return snippet
+
+# Per-product snippets for one catalog, built once at load time
+class ContextBuilder:
+    def __init__(self, catalog, max_reviews: int = 3):
+        self.snippets = {
+            product_id: product_snippet(product, max_reviews)
+            for product_id, product in catalog.products.items()
+        }
+
+    def __contains__(self, product_id):
+        return product_id in self.snippets
+
+    def product_lines(self, product_id: str, fields) -> list:
+        snippet = self.snippets[product_id]
+        return [snippet["header"]] + [snippet[field] for field in fields if snippet[field]]
+
+    def build(self, product_ids, question: str, token_budget: int) -> str:
+        # Products in order within token_budget; one that does not fit whole gets
+        # the lines that do, and the first always gets its header
+        fields = intent_fields(question_intents(question))
+        blocks = []
+        used = 0
+        for product_id in dict.fromkeys(product_ids):
+            if product_id not in self.snippets:
+                continue
+            product_lines = self.product_lines(product_id, fields)
+            lines = []
+            for line in product_lines:
+                cost = estimate_tokens(line)
+                if used + cost > token_budget and (blocks or lines):
+                    break
+                lines.append(line)
+                used += cost
+            if not lines:
+                break
+            blocks.append("\n".join(lines))
+            if len(lines) < len(product_lines):
+                break
+        return "\n\n".join(blocks)
+
+# Start of each message in SessionStore.history_text
+MESSAGE_START_RE = re.compile(r"^(?=User: |Assistant: |Summary of earlier conversation: )", re.MULTILINE)
+
+def fit_history(history: str, token_budget: int) -> str:
+    # Whole messages, newest first; the summary only stays if everything after it fits
+    if estimate_tokens(history) <= token_budget:
+        return history
+    kept = []
+    used = 0
+    for message in reversed([m for m in MESSAGE_START_RE.split(history) if m.strip()]):
+        message = message.rstrip("\n")
+        cost = estimate_tokens(message)
+        if used + cost > token_budget:
+            break
+        kept.append(message)
+        used += cost
+    if kept and kept[-1].startswith("Assistant: "):
+        kept.pop()  # an answer without its question only confuses the model
+    return "\n".join(reversed(kept))
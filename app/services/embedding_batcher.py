@@ -0,0 +1,122 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+def normalize_query(text: str) -> str:
+    # Whitespace-only differences should not miss the cache
+    return " ".join(text.split())
+
+# Micro-batches concurrent embed_query calls: one worker thread collects
+# queries for up to batch_window seconds (or max_batch_size texts) and embeds
+# them in one forward pass. Results sit in an LRU keyed by the normalized
+# text; embed_documents passes straight through
+class BatchingEmbeddings(Embeddings):
+    def __init__(self, embeddings, batch_window: float = 0.005, max_batch_size: int = 32, cache_size: int = 2048):
+        self.embeddings = embeddings
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._model_lock = threading.Lock()  # one forward pass at a time
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.max_seen_batch = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._model_lock:
+            return self.embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def submit(self, text: str) -> Future:
+        key = normalize_query(text)
+        future = Future()
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                future.set_result(vector)
+                return future
+            self.cache_misses += 1
+        self._ensure_worker()
+        self._queue.put((key, future))
+        return future
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "cache_entries": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "batches": self.batches,
+                "batched_queries": self.batched_queries,
+                "mean_batch_size": self.batched_queries / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_seen_batch,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        # Identical texts inside one window share a slot in the batch
+        waiters = OrderedDict()
+        for key, future in batch:
+            waiters.setdefault(key, []).append(future)
+        texts = list(waiters)
+        try:
+            with self._model_lock:
+                vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:
+            for futures in waiters.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        with self._cache_lock:
+            self.batches += 1
+            self.batched_queries += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            for key, vector in zip(texts, vectors):
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for key, vector in zip(texts, vectors):
+            for future in waiters[key]:
+                future.set_result(vector)
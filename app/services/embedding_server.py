@@ -0,0 +1,147 @@
+# One embedding model per host, shared by the workers over local IPC; with
+# EMBEDDING_SERVER_ADDRESS set, get_hf_embeddings() returns a RemoteEmbeddings
+# client. Needs EMBEDDING_SERVER_AUTHKEY (serve.py generates one):
+#   python -m app.services.embedding_server --address /tmp/grocery-embeddings.sock
+
+import argparse
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def parse_address(address: str):
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+def _authkey_bytes(authkey: str) -> bytes:
+    # Connections carry pickles, so a guessable key means code execution
+    if not authkey:
+        raise RuntimeError("EMBEDDING_SERVER_AUTHKEY must be set to use the embedding server")
+    return authkey.encode("utf-8")
+
+# Client for the embedding server: one connection per thread, reconnecting
+# once if the server went away
+class RemoteEmbeddings(Embeddings):
+    def __init__(self, address: str, authkey: str):
+        self.address = parse_address(address)
+        self.authkey = _authkey_bytes(authkey)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, method: str, payload):
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((method, payload))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None
+                conn.close()
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {result}")
+        return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embed_documents", list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("embed_query", text)
+
+    def stats(self) -> dict:
+        return self._call("stats", None)
+
+# Serves embed_query/embed_documents from one local BatchingEmbeddings with a
+# thread per connection, so every worker shares its batches and LRU
+class EmbeddingServer:
+    def __init__(self, embeddings, address: str, authkey: str):
+        self.embeddings = embeddings
+        self.address = parse_address(address)
+        self.authkey = _authkey_bytes(authkey)
+        self.requests = 0
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from an earlier run
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info("Embedding server listening on %s", self.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Failed handshake (wrong authkey, port scan): keep serving
+                    logger.warning("Embedding server rejected a connection: %s", e)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def stats(self) -> dict:
+        stats = {"requests": self.requests}
+        if hasattr(self.embeddings, "stats"):
+            stats.update(self.embeddings.stats())
+        return stats
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if method == "embed_query":
+                        result = self.embeddings.embed_query(payload)
+                    elif method == "embed_documents":
+                        result = self.embeddings.embed_documents(payload)
+                    elif method == "stats":
+                        result = self.stats()
+                    else:
+                        raise ValueError(f"unknown method {method!r}")
+                    self.requests += 1
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+
+def wait_for_server(address: str, authkey: str, timeout: float = 120.0):
+    # Block until the server accepts connections (the model may take a while to load)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            Client(parse_address(address), authkey=_authkey_bytes(authkey)).close()
+            return
+        except (OSError, EOFError):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Embedding server at {address} did not start within {timeout:g} seconds")
+            time.sleep(0.2)
+
+def main():
+    from app.core.config import EMBEDDING_SERVER_AUTHKEY, configure_logging, load_hf_embeddings
+
+    parser = argparse.ArgumentParser(description="Serve the embedding model to local workers.")
+    parser.add_argument("--address", default="/tmp/grocery-embeddings.sock", help="Unix socket path or host:port")
+    args = parser.parse_args()
+    if not EMBEDDING_SERVER_AUTHKEY:
+        parser.error("EMBEDDING_SERVER_AUTHKEY must be set (serve.py generates one)")
+
+    configure_logging()
+    embeddings = load_hf_embeddings()
+    embeddings.embed_query("warmup: price of basmati rice")
+    EmbeddingServer(embeddings, args.address, EMBEDDING_SERVER_AUTHKEY).serve_forever()
+
+if __name__ == "__main__":
+    main()
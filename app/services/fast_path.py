@@ -0,0 +1,283 @@
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from app.db.catalog import FUNCTION_WORDS, keyword_variants, tokenize
+
+PRODUCT_ID_RE = re.compile(r"\bP-\d{3,}\b", re.IGNORECASE)
+
+# Attribute questions about specific products
+ATTRIBUTE_PATTERNS = {
+    "stock": re.compile(r"\b(in stock|out of stock|stock|available|availability)\b"),
+    "price": re.compile(r"\b(price|prices|cost|costs|how much)\b"),
+    "discount": re.compile(r"\b(discount|discounts|offer|offers|on sale)\b"),
+    "rating": re.compile(r"\b(rating|ratings|rated)\b"),
+}
+
+# Ranking questions over a set of products
+SUPERLATIVE_PATTERNS = {
+    "cheapest": re.compile(r"\b(cheapest|lowest price|least expensive|most affordable)\b"),
+    "most_expensive": re.compile(r"\b(most expensive|priciest|costliest|highest price)\b"),
+    "top_rated": re.compile(r"\b(best rated|top rated|highest rated|best rating|highest rating)\b"),
+}
+
+IN_STOCK_RE = re.compile(r"\b(in stock|available)\b")
+
+_NUMBER = r"(\d+(?:\.\d+)?)\s*(?:bdt|tk|taka|৳)?"
+# Two-sided ranges ("between 100 and 300", "from 100 to 300") are matched
+# before the single bounds, which would otherwise read "from 100" as a minimum only
+PRICE_RANGE_RE = re.compile(rf"\b(?:between|from)\s+{_NUMBER}\s*(?:and|to|-)\s*{_NUMBER}")
+PRICE_MAX_RE = re.compile(rf"\b(?:under|below|less than|cheaper than|within|up to|upto|max(?:imum)?|at most)\s+{_NUMBER}")
+PRICE_MIN_RE = re.compile(rf"\b(?:over|above|more than|at least|min(?:imum)?|from)\s+{_NUMBER}")
+
+# Questions that need reasoning over several facts or products: never templated
+# here, and sent straight to the large model by the cascade (model_cascade), so
+# both stages agree on what is complex. "best rated" is a ranking, not judgement
+COMPLEX_RE = re.compile(
+    r"\b(why|explain|compare|comparison|difference|better|best(?!\s+rat(?:ed|ing))|vs|versus|"
+    r"recommend\w*|suggest\w*|plan|recipe|diet|health\w*|alternatives?|instead|pros|cons|"
+    r"reviews?|customers? say|feedback|good for|suitable)\b",
+    re.IGNORECASE,
+)
+# Answerable by an LLM but not from catalog fields: prose about a product and
+# store policies. The small model handles these fine, so only the fast path skips them
+OPEN_ENDED_RE = re.compile(
+    r"\b(ingredients?|describe|tell me about|deliver|delivery|return|refund|order|policy)\b"
+)
+
+STOPWORDS = FUNCTION_WORDS | frozenset(
+    "price prices cost costs stock available availability discount discounts offer offers "
+    "sale rating ratings rated cheapest lowest least expensive most affordable priciest "
+    "costliest highest best top under below less than cheaper within up upto max maximum "
+    "over above more least min minimum from between bdt tk taka now currently today "
+    "item items product products shop store grocery all only out still right".split()
+)
+
+def parse_price_range(lower_q: str):
+    match = PRICE_RANGE_RE.search(lower_q)
+    if match:
+        low, high = sorted((float(match.group(1)), float(match.group(2))))
+        return low, high
+    min_price = max_price = None
+    match = PRICE_MAX_RE.search(lower_q)
+    if match:
+        max_price = float(match.group(1))
+    match = PRICE_MIN_RE.search(lower_q)
+    if match:
+        min_price = float(match.group(1))
+    return min_price, max_price
+
+@lru_cache(maxsize=4)
+def phrase_matchers(catalog):
+    # Multi-word brand/category names as whole-phrase regexes, longest first.
+    # Sub-categories are left to the product-name terms, which are more specific.
+    phrases = []
+    for index in (catalog.by_brand, catalog.by_category):
+        for name, ids in index.items():
+            if name:
+                phrases.append((name, ids))
+    phrases.sort(key=lambda item: -len(item[0]))
+    return [
+        (re.compile(r"\b" + re.escape(name) + r"s?\b"), ids)
+        for name, ids in phrases
+    ]
+
+def discounted_price(product: dict) -> float:
+    price = float(product.get("price", 0) or 0)
+    discount = float(product.get("discount", 0) or 0)
+    return round(price * (1 - discount / 100), 2)
+
+def format_money(amount, currency: str) -> str:
+    amount = float(amount)
+    text = f"{amount:.0f}" if amount.is_integer() else f"{amount:.2f}"
+    return f"{text} {currency}".strip()
+
+def describe_stock(product: dict) -> str:
+    status = str(product.get("stock_status", "")).strip().lower()
+    if status == "in stock":
+        return "in stock"
+    if status == "out of stock":
+        return "currently out of stock"
+    if status == "low stock":
+        return "in stock, but running low"
+    return f"marked as \"{product.get('stock_status', 'unknown')}\""
+
+def product_label(product: dict) -> str:
+    return f"{product.get('product_name', '')} by {product.get('brand', '')} ({product.get('product_id', '')})"
+
+def price_phrase(product: dict) -> str:
+    currency = product.get("currency", "")
+    phrase = f"{format_money(product.get('price', 0), currency)} per {product.get('unit', 'unit')}"
+    if float(product.get("discount", 0) or 0) > 0:
+        phrase += (
+            f" ({format_money(discounted_price(product), currency)} after its "
+            f"{product['discount']}% discount)"
+        )
+    return phrase
+
+def price_sentence(product: dict) -> str:
+    return f"{product_label(product)} costs {price_phrase(product)}."
+
+def attribute_sentence(attribute: str, product: dict) -> str:
+    if attribute == "price":
+        return price_sentence(product)
+    if attribute == "stock":
+        return f"{product_label(product)} is {describe_stock(product)}."
+    if attribute == "discount":
+        discount = float(product.get("discount", 0) or 0)
+        if discount > 0:
+            return (
+                f"{product_label(product)} has a {product['discount']}% discount, "
+                f"bringing it to {format_money(discounted_price(product), product.get('currency', ''))}."
+            )
+        return f"{product_label(product)} has no discount right now."
+    if attribute == "rating":
+        return f"{product_label(product)} is rated {product.get('rating', 0)} out of 5."
+    raise ValueError(attribute)
+
+def list_line(product: dict) -> str:
+    return (
+        f"- {product_label(product)}: {format_money(product.get('price', 0), product.get('currency', ''))}, "
+        f"{describe_stock(product)}"
+    )
+
+# Templated answers for structured lookups (price, stock, discount, rating,
+# "cheapest rice under 500 BDT") straight from the catalog; returns None
+# whenever the question is ambiguous so the LLM answers instead
+class FastPathEngine:
+    max_listed = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = Counter()
+        self.fallbacks = Counter()
+
+    def answer(self, catalog, question: str, product=None):
+        # Curly apostrophes (phone keyboards) would split "what’s" into "what" and "s"
+        lower_q = question.lower().replace("\u2019", "'")
+        intent, reason, answer = self._answer(catalog, lower_q, product)
+        with self._lock:
+            self.attempts += 1
+            if answer is None:
+                self.fallbacks[reason] += 1
+            else:
+                self.hits[intent] += 1
+        return answer
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "attempts": self.attempts,
+                "hits": hits,
+                "hit_rate": hits / self.attempts if self.attempts else 0.0,
+                "hits_by_intent": dict(self.hits),
+                "fallbacks_by_reason": dict(self.fallbacks),
+            }
+
+    def _answer(self, catalog, lower_q, product):
+        if COMPLEX_RE.search(lower_q):
+            return None, "complex", None
+        if OPEN_ENDED_RE.search(lower_q):
+            return None, "open_ended", None
+
+        attributes = [name for name, pattern in ATTRIBUTE_PATTERNS.items() if pattern.search(lower_q)]
+        superlative = next(
+            (name for name, pattern in SUPERLATIVE_PATTERNS.items() if pattern.search(lower_q)), None
+        )
+        min_price, max_price = parse_price_range(lower_q)
+        has_range = min_price is not None or max_price is not None
+
+        if product is not None:
+            products = [product]
+        else:
+            products = self._resolve_products(catalog, lower_q)
+            if products is None:
+                return None, "unknown_entity", None
+
+        # "cheapest rice under 500", "products below 200 in stock"
+        if superlative or (has_range and product is None):
+            return self._ranking(catalog, lower_q, products, superlative, min_price, max_price)
+
+        if not attributes:
+            return None, "no_attribute", None
+        if products == "all" or not products:
+            return None, "no_product", None
+        if len(products) > self.max_listed:
+            return None, "too_many_products", None
+
+        if len(products) == 1:
+            sentences = [attribute_sentence(attribute, products[0]) for attribute in attributes]
+            return "+".join(attributes), None, " ".join(sentences)
+
+        lines = [f"I found {len(products)} matching products:"]
+        for item in products:
+            lines.append("- " + " ".join(attribute_sentence(attribute, item) for attribute in attributes))
+        return "+".join(attributes), None, "\n".join(lines)
+
+    def _ranking(self, catalog, lower_q, products, superlative, min_price, max_price):
+        in_stock_only = bool(IN_STOCK_RE.search(lower_q))
+        allowed = None if products == "all" else {p["product_id"].upper() for p in products}
+        if allowed is not None and not allowed:
+            return None, "no_product", None
+
+        sort_by = {"cheapest": "price", "most_expensive": "-price", "top_rated": "-rating"}.get(superlative, "price")
+        matches = [
+            p for p in catalog.filter(min_price=min_price, max_price=max_price, sort_by=sort_by)
+            if (allowed is None or p["product_id"].upper() in allowed)
+            and (not in_stock_only or describe_stock(p) != "currently out of stock")
+        ]
+        intent = superlative or "price_range"
+        if not matches:
+            return intent, None, "Sorry, we don't have any matching products in that price range right now."
+
+        if superlative:
+            best = matches[0]
+            if superlative == "top_rated":
+                return intent, None, (
+                    f"Our top-rated match is {product_label(best)}, rated {best.get('rating', 0)} out of 5, "
+                    f"at {price_phrase(best)}. It is {describe_stock(best)}."
+                )
+            adjective = "cheapest" if superlative == "cheapest" else "most expensive"
+            return intent, None, (
+                f"The {adjective} match is {product_label(best)} at {price_phrase(best)}. "
+                f"It is {describe_stock(best)}."
+            )
+
+        shown = matches[:self.max_listed]
+        header = f"Here are {len(shown)} matching products"
+        if len(matches) > len(shown):
+            header += f" (the {len(shown)} cheapest of {len(matches)})"
+        return intent, None, header + ":\n" + "\n".join(list_line(p) for p in shown)
+
+    def _resolve_products(self, catalog, lower_q):
+        # Products the question is about, "all" when it names none, or None when a
+        # content word matches nothing in the catalog
+        product_ids = {m.group().upper() for m in PRODUCT_ID_RE.finditer(lower_q)}
+        if product_ids:
+            products = [catalog.get(pid) for pid in sorted(product_ids)]
+            return None if any(p is None for p in products) else products
+
+        candidates = None
+        remaining = lower_q
+        for pattern, ids in phrase_matchers(catalog):
+            if pattern.search(remaining):
+                candidates = set(ids) if candidates is None else candidates & ids
+                remaining = pattern.sub(" ", remaining)
+
+        for token in tokenize(PRICE_RANGE_RE.sub(" ", remaining)):
+            if token in STOPWORDS or token.replace(".", "").isdigit():
+                continue
+            token = token.removesuffix("'s")  # "rice's price"
+            postings = set()
+            for variant in keyword_variants(token):
+                postings |= catalog.name_terms.get(variant, set())
+            if not postings:
+                return None
+            candidates = postings if candidates is None else candidates & postings
+
+        if candidates is None:
+            return "all"
+        return [catalog.products[pid] for pid in catalog.order if pid in candidates]
@@ -0,0 +1,585 @@
+# Shared outbound scheduler for Groq calls, one per rate-limited model. Calls
+# wait in a priority queue until the RPM/TPM buckets can pay for them; a 429
+# pauses the whole scheduler for retry-after, 5xx and connection errors are
+# retried with backoff, and identical in-flight calls are coalesced. Buckets
+# are per process: with serve.py --workers N give each worker 1/N of the limits
+
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any
+
+from groq import APIConnectionError, APIStatusError, RateLimitError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.core.config import (
+    GROQ_CHAT_RPM,
+    GROQ_CHAT_TPM,
+    GROQ_MAX_BACKOFF_SECONDS,
+    GROQ_MAX_RETRIES,
+    GROQ_SMALL_CHAT_RPM,
+    GROQ_SMALL_CHAT_TPM,
+    GROQ_TRANSCRIPTION_RPM,
+)
+from app.services.metrics import (
+    GROQ_COALESCED,
+    GROQ_QUEUE_DEPTH,
+    GROQ_QUEUE_WAIT,
+    GROQ_REQUESTS,
+    GROQ_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_priority = contextvars.ContextVar("groq_priority", default=INTERACTIVE)
+
+WAITING, GRANTED, CANCELLED = range(3)
+
+@contextmanager
+def request_priority(priority: int):
+    # Groq calls made inside, including through asyncio.to_thread, queue at this priority
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def priority_name(priority: int) -> str:
+    return PRIORITY_NAMES.get(priority, str(priority))
+
+def retry_after_seconds(error):
+    # Groq sends retry-after in seconds on 429s; None when absent or an HTTP date
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return None
+
+# per_minute units refilled continuously, bursting to a minute's worth; 0 or
+# less is unlimited, and the level may go negative when usage beats the reservation
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.level
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.limited:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        if self.limited:
+            self._refill(now)
+            self.level -= amount
+
+    def give(self, amount: float):
+        if self.limited:
+            self.level = min(self.capacity, self.level + amount)
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "enqueued", "grant", "state")
+
+    def __init__(self, priority: int, tokens: float, grant):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.grant = grant
+        self.state = WAITING
+
+class _StreamFlight:
+    # One streamed call, replayed to every consumer that joins it
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.consumers = 0
+        self.task = None
+
+    def _pulse(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def push(self, chunk):
+        self.chunks.append(chunk)
+        self._pulse()
+
+    def finish(self):
+        self.done = True
+        self._pulse()
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class GroqScheduler:
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_retries: int = 3, max_backoff: float = 30.0):
+        self.name = name
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._depth = defaultdict(int)
+        self._paused_until = 0.0
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._flights = {}  # key -> concurrent Future, sync callers
+        self._flights_lock = threading.Lock()
+        self._aflights = {}  # (loop, key) -> asyncio Task, async callers
+        self._streams = {}  # (loop, key) -> _StreamFlight
+        self.granted = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def set_limits(self, rpm: float, tpm: float = 0):
+        with self._cond:
+            self.requests = TokenBucket(rpm)
+            self.tokens = TokenBucket(tpm)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "queued": {priority_name(p): n for p, n in sorted(self._depth.items())},
+                "granted": self.granted,
+                "coalesced": self.coalesced,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+                "paused_for_seconds": round(max(0.0, self._paused_until - now), 3),
+                "requests_available": round(self.requests.available(now), 1) if self.requests.limited else None,
+                "tokens_available": round(self.tokens.available(now)) if self.tokens.limited else None,
+            }
+
+    # Admission: the dispatcher thread grants waiters as the buckets allow
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"groq-scheduler-{self.name}", daemon=True)
+                    self._worker.start()
+
+    def _set_depth(self, priority: int, delta: int):
+        self._depth[priority] += delta
+        GROQ_QUEUE_DEPTH.set(self._depth[priority], api=self.name, priority=priority_name(priority))
+
+    def _enqueue(self, tokens: float, grant) -> _Waiter:
+        waiter = _Waiter(_priority.get(), tokens, grant)
+        self._ensure_worker()
+        with self._cond:
+            heapq.heappush(self._heap, (waiter.priority, next(self._seq), waiter))
+            self._set_depth(waiter.priority, 1)
+            self._cond.notify()
+        return waiter
+
+    def _cancel(self, waiter: _Waiter):
+        with self._cond:
+            if waiter.state == WAITING:
+                waiter.state = CANCELLED
+                self._set_depth(waiter.priority, -1)
+                self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].state == CANCELLED:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                waiter = self._heap[0][2]
+                now = time.monotonic()
+                delay = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(waiter.tokens, now),
+                )
+                if delay > 0:
+                    # Woken early by a new (maybe higher-priority) waiter or a refund
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                self.requests.take(1, now)
+                self.tokens.take(waiter.tokens, now)
+                waiter.state = GRANTED
+                self.granted += 1
+                self._set_depth(waiter.priority, -1)
+                GROQ_QUEUE_WAIT.observe(now - waiter.enqueued, api=self.name, priority=priority_name(waiter.priority))
+                waiter.grant()
+
+    def acquire(self, tokens: float = 0):
+        granted = threading.Event()
+        self._enqueue(tokens, granted.set)
+        granted.wait()
+
+    async def aacquire(self, tokens: float = 0):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # loop closed while waiting
+
+        waiter = self._enqueue(tokens, grant)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify()
+
+    def settle(self, reserved: float, used: float):
+        # Give back (or charge) the difference once a call reports its usage
+        with self._cond:
+            self.tokens.give(reserved - used)
+            self._cond.notify()
+
+    # Retries
+
+    def _after_error(self, error, attempt: int):
+        # Seconds to wait before retrying error, or None to give up
+        backoff = min(self.max_backoff, 0.5 * 2 ** attempt)
+        if isinstance(error, RateLimitError):
+            self.rate_limited += 1
+            GROQ_REQUESTS.inc(api=self.name, result="rate_limited")
+            delay = retry_after_seconds(error)
+            delay = backoff if delay is None else min(delay, self.max_backoff)
+            # Everyone waits, not just this call: the limit is shared
+            self.pause(delay)
+            logger.warning("Groq %s rate limited, pausing %.1fs", self.name, delay)
+            retry_in = 0.0
+        elif isinstance(error, APIConnectionError) or (
+            isinstance(error, APIStatusError) and error.status_code >= 500
+        ):
+            GROQ_REQUESTS.inc(api=self.name, result="error")
+            retry_in = backoff
+        else:
+            GROQ_REQUESTS.inc(api=self.name, result="error")
+            return None
+        if attempt >= self.max_retries:
+            return None
+        self.retries += 1
+        GROQ_RETRIES.inc(api=self.name)
+        return retry_in
+
+    def _call_with_retries(self, fn, tokens: float):
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._after_error(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            GROQ_REQUESTS.inc(api=self.name, result="ok")
+            return result
+
+    async def _acall_with_retries(self, fn, tokens: float):
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._after_error(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            GROQ_REQUESTS.inc(api=self.name, result="ok")
+            return result
+
+    def stream(self, fn, tokens: float = 0):
+        # Sync streaming, not coalesced; only retried until the first chunk
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            started = False
+            try:
+                for item in fn():
+                    started = True
+                    yield item
+            except Exception as e:
+                delay = None if started else self._after_error(e, attempt)
+                if delay is None:
+                    if started:
+                        GROQ_REQUESTS.inc(api=self.name, result="error")
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            GROQ_REQUESTS.inc(api=self.name, result="ok")
+            return
+
+    async def _astream_with_retries(self, fn, tokens: float):
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            started = False
+            try:
+                async for item in fn():
+                    started = True
+                    yield item
+            except Exception as e:
+                delay = None if started else self._after_error(e, attempt)
+                if delay is None:
+                    if started:
+                        GROQ_REQUESTS.inc(api=self.name, result="error")
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            GROQ_REQUESTS.inc(api=self.name, result="ok")
+            return
+
+    # Public entry points. fn makes the request; tokens is the TPM
+    # reservation; calls with the same key in flight at once share one
+    # request, and share adapts the result handed to those followers
+
+    def _count_coalesced(self):
+        self.coalesced += 1
+        GROQ_COALESCED.inc(api=self.name)
+
+    def call(self, fn, tokens: float = 0, key: str = None, share=None):
+        if key is None:
+            return self._call_with_retries(fn, tokens)
+        with self._flights_lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            self._count_coalesced()
+            result = future.result()
+            return share(result) if share else result
+        try:
+            result = self._call_with_retries(fn, tokens)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    async def acall(self, fn, tokens: float = 0, key: str = None, share=None):
+        if key is None:
+            return await self._acall_with_retries(fn, tokens)
+        # Tasks can only be awaited on their own loop
+        key = (asyncio.get_running_loop(), key)
+        task = self._aflights.get(key)
+        if task is not None:
+            self._count_coalesced()
+            result = await asyncio.shield(task)
+            return share(result) if share else result
+        # A task, so followers still get the result if the leader is cancelled
+        task = asyncio.ensure_future(self._acall_with_retries(fn, tokens))
+        self._aflights[key] = task
+
+        def forget(done):
+            self._aflights.pop(key, None)
+            if not done.cancelled():
+                done.exception()  # retrieved, so an unawaited failure is not logged
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task)
+
+    async def _produce(self, flight: _StreamFlight, fn, tokens: float):
+        try:
+            async for chunk in self._astream_with_retries(fn, tokens):
+                flight.push(chunk)
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.finish()
+
+    async def astream(self, fn, tokens: float = 0, key: str = None, share=None):
+        if key is not None:
+            key = (asyncio.get_running_loop(), key)
+        flight = self._streams.get(key) if key is not None else None
+        owner = flight is None
+        if owner:
+            flight = _StreamFlight()
+            flight.task = asyncio.ensure_future(self._produce(flight, fn, tokens))
+            if key is not None:
+                self._streams[key] = flight
+                flight.task.add_done_callback(
+                    lambda _: self._streams.pop(key, None) if self._streams.get(key) is flight else None
+                )
+        else:
+            self._count_coalesced()
+
+        flight.consumers += 1
+        try:
+            position = 0
+            while True:
+                changed = flight.changed
+                if position < len(flight.chunks):
+                    chunk = flight.chunks[position]
+                    position += 1
+                    yield chunk if owner or share is None else share(chunk)
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await changed.wait()
+        finally:
+            flight.consumers -= 1
+            if flight.consumers == 0 and not flight.done:
+                # Nobody is listening any more: stop paying for the stream
+                if key is not None and self._streams.get(key) is flight:
+                    self._streams.pop(key, None)
+                flight.task.cancel()
+
+def _without_usage(message):
+    return message.model_copy(update={"usage_metadata": None}) if getattr(message, "usage_metadata", None) else message
+
+def _shared_result(result: ChatResult) -> ChatResult:
+    # Coalesced followers did not cost tokens; keep them out of the usage metrics
+    return ChatResult(generations=[
+        ChatGeneration(message=_without_usage(g.message), generation_info=g.generation_info)
+        for g in result.generations
+    ])
+
+def _shared_chunk(chunk: ChatGenerationChunk) -> ChatGenerationChunk:
+    return ChatGenerationChunk(message=_without_usage(chunk.message), generation_info=chunk.generation_info)
+
+def _usage_tokens(message):
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+# Sends every call of the wrapped chat model through a GroqScheduler; the TPM
+# reservation is the prompt estimate plus expected_output_tokens, corrected from usage
+class ScheduledChatModel(BaseChatModel):
+    llm: BaseChatModel
+    scheduler: Any
+    expected_output_tokens: int = 300
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.llm._llm_type}"
+
+    def _request(self, messages, stop, kwargs):
+        text = "\n".join(str(message.content) for message in messages)
+        tokens = len(text) // 4 + self.expected_output_tokens
+        identity = (
+            self.llm._llm_type,
+            getattr(self.llm, "model_name", None),
+            [(message.type, str(message.content)) for message in messages],
+            stop,
+            sorted((name, repr(value)) for name, value in kwargs.items()),
+        )
+        return tokens, hashlib.sha256(repr(identity).encode("utf-8")).hexdigest()
+
+    def _settle(self, reserved: int, message):
+        used = _usage_tokens(message)
+        if used is not None:
+            self.scheduler.settle(reserved, used)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens, key = self._request(messages, stop, kwargs)
+        result = self.scheduler.call(
+            lambda: self.llm._generate(messages, stop=stop, **kwargs), tokens, key, share=_shared_result
+        )
+        self._settle(tokens, result.generations[0].message)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens, key = self._request(messages, stop, kwargs)
+        result = await self.scheduler.acall(
+            lambda: self.llm._agenerate(messages, stop=stop, **kwargs), tokens, key, share=_shared_result
+        )
+        self._settle(tokens, result.generations[0].message)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens, _ = self._request(messages, stop, kwargs)
+        for chunk in self.scheduler.stream(lambda: self.llm._stream(messages, stop=stop, **kwargs), tokens):
+            self._settle(tokens, chunk.message)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens, key = self._request(messages, stop, kwargs)
+        chunks = self.scheduler.astream(
+            lambda: self.llm._astream(messages, stop=stop, **kwargs), tokens, key, share=_shared_chunk
+        )
+        async for chunk in chunks:
+            # Usage arrives on the last chunk, and only for the call's owner
+            self._settle(tokens, chunk.message)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+chat_scheduler = GroqScheduler(
+    "chat", rpm=GROQ_CHAT_RPM, tpm=GROQ_CHAT_TPM, max_retries=GROQ_MAX_RETRIES, max_backoff=GROQ_MAX_BACKOFF_SECONDS
+)
+# The cascade's small model has its own Groq limits
+small_chat_scheduler = GroqScheduler(
+    "chat_small",
+    rpm=GROQ_SMALL_CHAT_RPM,
+    tpm=GROQ_SMALL_CHAT_TPM,
+    max_retries=GROQ_MAX_RETRIES,
+    max_backoff=GROQ_MAX_BACKOFF_SECONDS,
+)
+transcription_scheduler = GroqScheduler(
+    "transcription", rpm=GROQ_TRANSCRIPTION_RPM, max_retries=GROQ_MAX_RETRIES, max_backoff=GROQ_MAX_BACKOFF_SECONDS
+)
@@ -0,0 +1,256 @@
+import asyncio
+import math
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.db.ann_index import search_parameters
+from app.db.catalog import FUNCTION_WORDS, tokenize
+from app.services.context_builder import REVIEW_RE
+from app.services.fast_path import IN_STOCK_RE, PRODUCT_ID_RE, parse_price_range
+
+# Common Banglish grocery words, expanded at query time so transliterated
+# questions still hit English product text
+BANGLA_SYNONYMS = {
+    "chal": ["rice"], "chaal": ["rice"], "bhat": ["rice"],
+    "dim": ["eggs"], "deem": ["eggs"], "dudh": ["milk"], "doi": ["yogurt"],
+    "makhon": ["butter"], "ponir": ["cheese"], "cha": ["tea"], "chaa": ["tea"],
+    "kola": ["banana"], "aam": ["mango"], "komola": ["orange"], "angur": ["grapes"],
+    "mach": ["fish"], "maach": ["fish"], "murgi": ["chicken"], "mangsho": ["beef", "meat"],
+    "gorur": ["beef"], "gajor": ["carrot"], "palong": ["spinach"], "shak": ["spinach"],
+    "chini": ["sugar"], "dal": ["lentils"], "pauruti": ["bread"], "ruti": ["bread"],
+    "biskut": ["biscuits"], "daber": ["coconut"], "pani": ["water"], "bacha": ["baby"],
+    "baccha": ["baby"], "motorshuti": ["peas"],
+}
+
+# Chat history is prefixed with speaker labels, which match every message
+LEXICAL_STOPWORDS = FUNCTION_WORDS | frozenset({"user", "assistant"})
+
+# "available" only narrows listings ("show available shampoos"); a yes/no
+# question about one product ("is X in stock?") must still find it when it is out
+LISTING_RE = re.compile(r"\b(show|list|which|what|find|give|suggest|any|all)\b")
+YES_NO_RE = re.compile(r"^\s*(is|are|was|were|do|does|did|can|could|has|have|will)\b")
+
+def query_terms(text: str) -> list:
+    terms = []
+    for token in tokenize(text):
+        if token in LEXICAL_STOPWORDS:
+            continue
+        terms.append(token)
+        terms.extend(BANGLA_SYNONYMS.get(token, ()))
+    return terms
+
+# Okapi BM25 over the product documents; a query only touches the postings
+# of its own terms
+class BM25Index:
+    def __init__(self, doc_ids, texts, k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = list(doc_ids)
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        lengths = []
+        for index, text in enumerate(texts):
+            counts = defaultdict(int)
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] += 1
+            for token, tf in counts.items():
+                self.postings[token].append((index, tf))
+            lengths.append(len(tokens))
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        total = len(self.doc_ids)
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int, allowed=None):
+        # [(doc_id, score, matched_terms)] best first, plus the number of distinct query terms
+        terms = set(query_terms(query))
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, tf in self.postings[term]:
+                if allowed is not None and self.doc_ids[index] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[index] += 1
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(self.doc_ids[i], score, matched[i]) for i, score in best], len(terms)
+
+def wants_in_stock_listing(lower_q: str) -> bool:
+    if not IN_STOCK_RE.search(lower_q) or PRODUCT_ID_RE.search(lower_q) or YES_NO_RE.match(lower_q):
+        return False
+    return bool(LISTING_RE.search(lower_q))
+
+def parse_filters(question: str, catalog) -> Dict[str, Any]:
+    # Metadata filters stated in the question itself
+    lower_q = question.lower()
+    filters = {}
+    min_price, max_price = parse_price_range(lower_q)
+    if min_price is not None:
+        filters["min_price"] = min_price
+    if max_price is not None:
+        filters["max_price"] = max_price
+    if wants_in_stock_listing(lower_q):
+        filters["in_stock"] = True
+    for category in catalog.categories():
+        if re.search(r"\b" + re.escape(category) + r"s?\b", lower_q):
+            filters["category"] = category
+            break
+    return filters
+
+def allowed_product_ids(catalog, filters) -> Optional[set]:
+    if not filters:
+        return None
+    products = catalog.filter(
+        category=filters.get("category"),
+        min_price=filters.get("min_price"),
+        max_price=filters.get("max_price"),
+    )
+    if filters.get("in_stock"):
+        products = [p for p in products if str(p.get("stock_status", "")).lower() != "out of stock"]
+    return {str(p.get("product_id", "")).upper() for p in products}
+
+# BM25 + FAISS retrieval fused with reciprocal-rank fusion. Modes: dense
+# (FAISS only), lexical (BM25 only) and hybrid (question filters, BM25 and
+# FAISS fused; BM25 alone when confident). Pass the standalone question= to
+# invoke so earlier turns do not pollute matching
+class HybridRetriever(BaseRetriever):
+    faiss_index: Any
+    catalog: Any
+    bm25: Any
+    doc_ids: Dict[str, str]  # product ID -> docstore ID
+    positions: Dict[str, int]  # product ID -> FAISS position
+    product_ids: Dict[int, str]  # FAISS position -> product ID
+    mode: str = "hybrid"
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    lexical_margin: float = 2.0
+
+    @classmethod
+    def from_faiss(cls, faiss_index, catalog, **kwargs):
+        doc_ids = {}
+        positions = {}
+        product_ids = {}
+        texts = []
+        for position, doc_id in faiss_index.index_to_docstore_id.items():
+            doc = cls.load_document(faiss_index.docstore, doc_id, reviews=True)
+            if not isinstance(doc, Document):
+                continue
+            product_id = str(doc.metadata.get("product_id", doc_id)).upper()
+            if product_id not in doc_ids:
+                texts.append(doc.page_content)
+            doc_ids[product_id] = doc_id
+            positions[product_id] = position
+            product_ids[position] = product_id
+        # Documents are not kept: BM25 needs the text once, answers re-read hits
+        bm25 = BM25Index(doc_ids.keys(), texts)
+        return cls(
+            faiss_index=faiss_index,
+            catalog=catalog,
+            bm25=bm25,
+            doc_ids=doc_ids,
+            positions=positions,
+            product_ids=product_ids,
+            **kwargs,
+        )
+
+    @staticmethod
+    def load_document(docstore, doc_id: str, reviews: bool = False):
+        # The compact docstore can leave reviews out; pickled docstores always include them
+        if hasattr(docstore, "document"):
+            return docstore.document(doc_id, reviews=reviews)
+        return docstore.search(doc_id)
+
+    def documents_for(self, product_ids, question: str) -> List[Document]:
+        reviews = bool(REVIEW_RE.search(question.lower()))
+        docs = []
+        for pid in product_ids:
+            doc = self.load_document(self.faiss_index.docstore, self.doc_ids[pid], reviews=reviews)
+            if isinstance(doc, Document):
+                docs.append(doc)
+        return docs
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        question: Optional[str] = None,
+    ) -> List[Document]:
+        return self.retrieve(query, question)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None, question: Optional[str] = None):
+        return await asyncio.to_thread(self.retrieve, query, question)
+
+    def retrieve(self, query: str, question: Optional[str] = None) -> List[Document]:
+        question = question or query
+        if self.mode == "dense":
+            return self.documents_for(self.dense_search(query, self.k), question)
+
+        allowed = allowed_product_ids(self.catalog, parse_filters(question, self.catalog))
+        if allowed is not None and not allowed:
+            allowed = None  # filters ruled out everything; better to answer unfiltered
+
+        lexical, term_count = self.bm25.search(question, self.fetch_k, allowed)
+        if self.mode == "lexical" or self.lexical_is_confident(lexical, term_count):
+            return self.documents_for([pid for pid, _, _ in lexical[:self.k]], question)
+
+        dense = self.dense_search(query, self.fetch_k, allowed)
+        fused = defaultdict(float)
+        for rank, pid in enumerate(dense):
+            fused[pid] += 1.0 / (self.rrf_k + rank + 1)
+        for rank, (pid, _, _) in enumerate(lexical):
+            fused[pid] += 1.0 / (self.rrf_k + rank + 1)
+        ranked = sorted(fused.items(), key=lambda item: -item[1])[:self.k]
+        return self.documents_for([pid for pid, _ in ranked], question)
+
+    def lexical_is_confident(self, lexical, term_count: int) -> bool:
+        # Every query term hit the top document and it clearly beats the runner-up
+        if not lexical or term_count == 0:
+            return False
+        _, top_score, top_matched = lexical[0]
+        if top_matched < term_count:
+            return False
+        if len(lexical) == 1:
+            return True
+        return top_score >= self.lexical_margin * lexical[1][1]
+
+    def dense_search(self, query: str, k: int, allowed=None) -> List[str]:
+        vector = np.asarray([self.faiss_index.embedding_function.embed_query(query)], dtype=np.float32)
+        if getattr(self.faiss_index, "_normalize_L2", False):
+            faiss.normalize_L2(vector)
+        index = self.faiss_index.index
+        if allowed is None:
+            _, indices = index.search(vector, min(k, index.ntotal))
+        else:
+            selected = np.array(
+                sorted(self.positions[pid] for pid in allowed if pid in self.positions), dtype=np.int64
+            )
+            if selected.size == 0:
+                return []
+            try:
+                params = search_parameters(index, faiss.IDSelectorBatch(selected))
+                _, indices = index.search(vector, min(k, selected.size), params=params)
+            except (RuntimeError, TypeError):
+                # Index type without selector support: over-fetch and post-filter
+                _, indices = index.search(vector, min(index.ntotal, k * 10))
+        result = []
+        for position in indices[0]:
+            pid = self.product_ids.get(int(position))
+            if pid is not None and (allowed is None or pid in allowed):
+                result.append(pid)
+        return result[:k]
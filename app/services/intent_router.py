@@ -0,0 +1,161 @@
+# Single-pass intent classification: product IDs, pronouns, count questions,
+# count keywords (catalog categories and sub-categories) and greetings are
+# alternatives of one word-boundary regex, rebuilt with each catalog snapshot
+
+import json
+import re
+
+from app.db.catalog import keyword_variants, normalize, tokenize
+
+DEFAULT_GREETINGS = {
+    "hi": "Hello! 👋 How can I assist you with your grocery shopping today?",
+    "hello": "Hi there! 😊 Looking for something specific in our grocery shop?",
+    "hey": "Hey! 👋 I'm here to help you find grocery items.",
+    "are you available": "Yes, I'm always here to help with your grocery-related queries.",
+    "how are you": "I'm great, thank you! How can I assist with your grocery needs?",
+    "what is your name": "I'm your grocery assistant, here to help you with shopping!",
+}
+
+PRONOUNS = ("its", "their", "they", "them", "it")
+PRONOUN_RE = re.compile(r"\b(?:" + "|".join(PRONOUNS) + r")\b", re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+# Words between "how many" and "products" that still ask for the total
+COUNT_FILLER = {
+    "the", "of", "all", "your", "you", "in", "total", "different", "distinct", "unique",
+    "kind", "kinds", "type", "types", "grocery", "shop", "store",
+}
+
+def load_greetings(path: str = None) -> dict:
+    # Phrase -> reply; a JSON file replaces the built-in set
+    if not path:
+        return dict(DEFAULT_GREETINGS)
+    with open(path, "r", encoding="utf-8") as f:
+        return {normalize(phrase): reply for phrase, reply in json.load(f).items()}
+
+def _alternation(phrases) -> str:
+    # Phrases as a prefix trie ("baby (?:food|lotion|...)"), so the regex
+    # engine tests each shared prefix once instead of every phrase in turn;
+    # longer phrases are tried before their prefixes. Spaces match any run
+    # of whitespace.
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node) -> str:
+        branches = []
+        for char in sorted((c for c in node if c), key=lambda c: (c == " ", c)):
+            token = r"\s+" if char == " " else re.escape(char)
+            branches.append(token + render(node[char]))
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return render(trie)
+
+def resolve_pronouns(question: str, product_id: str) -> str:
+    return PRONOUN_RE.sub(f"the product {product_id}", question)
+
+# What one message asks for; all fields come from the same scan
+class Intent:
+    __slots__ = ("product_id", "has_pronoun", "is_count", "count_keyword", "greeting")
+
+    def __init__(self):
+        self.product_id = None  # first product ID mentioned, upper-cased
+        self.has_pronoun = False
+        self.is_count = False  # "how many" + "product(s)", with nothing uncountable in between
+        self.count_keyword = None  # catalog keyword to count by
+        self.greeting = None  # canned reply when the message is just a greeting
+
+    @property
+    def kind(self) -> str:
+        if self.product_id:
+            return "product_id"
+        if self.is_count:
+            return "count"
+        if self.greeting is not None:
+            return "greeting"
+        return "other"
+
+# One precompiled matcher for the intents answered without retrieval
+class IntentRouter:
+    def __init__(self, count_keywords, greetings=None, max_greeting_extra_words: int = 2):
+        # max_greeting_extra_words: other words a greeting may come with ("hi there")
+        self.greetings = {normalize(phrase): reply for phrase, reply in (greetings or DEFAULT_GREETINGS).items()}
+        self.max_greeting_extra_words = max_greeting_extra_words
+        # Every spelling the pattern can match -> the keyword it stands for
+        self.count_variants = {}
+        for keyword in count_keywords:
+            keyword = normalize(keyword)
+            if keyword:
+                for variant in keyword_variants(keyword):
+                    self.count_variants.setdefault(variant, keyword)
+        # One alternation behind a shared word boundary; the order settles
+        # matches starting at the same position
+        groups = [
+            r"(?P<product_id>p-\d{3,})",
+            r"(?P<how_many>how\s+many)",
+            # Count keywords ahead of "product" so "baby products" stays whole
+            r"(?P<count_keyword>" + _alternation(self.count_variants) + ")" if self.count_variants else None,
+            r"(?P<product_word>products?)",
+            r"(?P<greeting>" + _alternation(self.greetings) + ")" if self.greetings else None,
+            r"(?P<pronoun>" + "|".join(PRONOUNS) + ")",
+        ]
+        self.pattern = re.compile(r"\b(?:" + "|".join(group for group in groups if group) + r")\b")
+
+    @classmethod
+    def from_catalog(cls, catalog, extra_keywords=(), greetings=None, max_greeting_extra_words: int = 2):
+        categories = list(catalog.categories())
+        # Each word of a multi-word category too ("dairy" from "dairy & eggs"),
+        # last so a sub-category of the same name keeps its own entry
+        words = [
+            word for category in categories if " " in category
+            for word in tokenize(category) if word not in COUNT_FILLER and not word.startswith("product")
+        ]
+        keywords = categories + list(catalog.sub_categories()) + list(extra_keywords) + words
+        return cls(keywords, greetings, max_greeting_extra_words)
+
+    def classify(self, question: str) -> Intent:
+        intent = Intent()
+        lower_q = question.lower()
+        how_many = product_word = False
+        how_many_end = product_start = None
+        greeting = None
+        greeting_words = 0
+        for match in self.pattern.finditer(lower_q):
+            group = match.lastgroup
+            if group == "product_id":
+                if intent.product_id is None:
+                    intent.product_id = match.group().upper()
+            elif group == "pronoun":
+                intent.has_pronoun = True
+            elif group == "count_keyword":
+                keyword = self.count_variants[" ".join(match.group().split())]
+                if intent.count_keyword is None:
+                    intent.count_keyword = keyword
+                product_word = product_word or "product" in keyword
+            elif group == "greeting":
+                greeting_words += len(match.group().split())
+                if greeting is None:
+                    greeting = self.greetings[" ".join(match.group().split())]
+            elif group == "how_many":
+                how_many = True
+                how_many_end = match.end()
+            else:
+                product_word = True
+                if product_start is None:
+                    product_start = match.start()
+        intent.is_count = how_many and product_word
+        if intent.is_count and intent.count_keyword is None:
+            # "how many vegan products": a qualifier we can't count by, so the
+            # catalog total would be the wrong answer; leave it to the later steps
+            between = WORD_RE.findall(lower_q[how_many_end:product_start])
+            intent.is_count = all(word in COUNT_FILLER for word in between)
+        # Words are only counted for the rare messages with a greeting in them
+        if greeting is not None and len(WORD_RE.findall(lower_q)) - greeting_words <= self.max_greeting_extra_words:
+            intent.greeting = greeting
+        return intent
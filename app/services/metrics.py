@@ -0,0 +1,193 @@
+# Minimal in-process metrics registry rendered by GET /metrics in the
+# Prometheus text format (0.0.4); each uvicorn worker has its own registry
+
+import math
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_key(labelnames, labels: dict) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, values, extra=()) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = OrderedDict()  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        # HELP, TYPE and samples all use the one name, so it carries the suffix
+        if not name.endswith("_total"):
+            raise ValueError(f"counter {name} must end in _total")
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector):
+        # collector() runs at scrape time, e.g. to set gauges from live state
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                pass  # a broken collector must not take /metrics down
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline metrics shared across modules
+STAGE_SECONDS = REGISTRY.histogram(
+    "grocery_stage_seconds", "Time spent in each pipeline stage", ["stage"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "grocery_request_seconds", "End-to-end request time by entry point and route", ["kind", "route"]
+)
+ANSWERS = REGISTRY.counter("grocery_answers_total", "Answers by route", ["route"])
+ANSWERS_IN_PROGRESS = REGISTRY.gauge("grocery_answers_in_progress", "Answer pipelines running now")
+RESPONSE_CACHE_LOOKUPS = REGISTRY.counter(
+    "grocery_response_cache_lookups_total", "Semantic response cache lookups", ["result"]
+)
+FAST_PATH_ATTEMPTS = REGISTRY.counter("grocery_fast_path_attempts_total", "Fast-path attempts", ["result"])
+LLM_TOKENS = REGISTRY.counter("grocery_llm_tokens_total", "LLM tokens", ["model", "direction"])
+LLM_COST_USD = REGISTRY.counter("grocery_llm_cost_usd_total", "LLM spend in USD at list prices", ["model"])
+LLM_ERRORS = REGISTRY.counter("grocery_llm_errors_total", "Failed LLM calls", ["model", "error"])
+LLM_SECONDS = REGISTRY.histogram("grocery_llm_seconds", "LLM call time in the model cascade", ["model"])
+CASCADE_DECISIONS = REGISTRY.counter(
+    "grocery_cascade_decisions_total", "Model cascade outcomes: small, large, escalated or fallback_*", ["decision"]
+)
+GROQ_RETRIES = REGISTRY.counter("grocery_groq_retries_total", "Groq API requests retried", ["api"])
+GROQ_REQUESTS = REGISTRY.counter("grocery_groq_requests_total", "Groq API requests by outcome", ["api", "result"])
+GROQ_COALESCED = REGISTRY.counter(
+    "grocery_groq_coalesced_total", "Groq calls served by an identical request already in flight", ["api"]
+)
+GROQ_QUEUE_DEPTH = REGISTRY.gauge(
+    "grocery_groq_queue_depth", "Groq calls waiting for rate-limit budget", ["api", "priority"]
+)
+GROQ_QUEUE_WAIT = REGISTRY.histogram(
+    "grocery_groq_queue_wait_seconds", "Time Groq calls waited for rate-limit budget", ["api", "priority"]
+)
+TELEGRAM_UPDATES = REGISTRY.counter(
+    "grocery_telegram_updates_total", "Webhook updates: accepted, failed or shed (backlog_full, chat_backlog_full)", ["result"]
+)
+TELEGRAM_BACKLOG = REGISTRY.gauge("grocery_telegram_backlog", "Webhook updates queued or running")
+TRANSCRIPTIONS = REGISTRY.counter("grocery_transcriptions_total", "Transcription requests", ["result"])
+PROCESS_RSS = REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes")
+
+def _collect_process_memory():
+    from app.services.catalog_state import current_rss_mb
+    PROCESS_RSS.set(current_rss_mb() * 1024 * 1024)
+
+REGISTRY.add_collector(_collect_process_memory)
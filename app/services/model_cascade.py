@@ -0,0 +1,215 @@
+# Small-model-first cascade (LLM_CASCADE): short, simple, well-covered
+# questions go to the small model and escalate when its answer hedges; complex
+# ones go straight to the large model, which gets what is left of
+# LLM_LATENCY_BUDGET_SECONDS to start answering before the small model's
+# answer is used instead
+
+import asyncio
+import logging
+import re
+import threading
+import time
+
+from groq import RateLimitError
+
+from app.db.catalog import FUNCTION_WORDS, tokenize
+from app.services.fast_path import COMPLEX_RE
+from app.services.metrics import CASCADE_DECISIONS, LLM_SECONDS
+from app.services.tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+# USD per million input / output tokens (Groq on-demand pricing)
+MODEL_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+
+# Attribute lookups a small model answers reliably from one product's data
+SIMPLE_RE = re.compile(
+    r"\b(price|cost|how much|stock|available|brand|unit|size|weight|origin|made|discount|rating|category|tags?)\b",
+    re.IGNORECASE,
+)
+LOW_CONFIDENCE_RE = re.compile(
+    r"(i don't have|i do not have|i'm not sure|i am not sure|no information|not (?:mentioned|provided|specified) in|"
+    r"the context does not|cannot find|can't find|unable to (?:find|determine)|"
+    r"i'm here to help with questions about our grocery)",
+    re.IGNORECASE,
+)
+
+def llm_cost_usd(model: str, usage: dict) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (usage.get("input_tokens", 0) * input_price + usage.get("output_tokens", 0) * output_price) / 1_000_000
+
+def context_overlap(question: str, context: str) -> float:
+    # Share of the question's content words that appear in the context
+    words = {word for word in tokenize(question) if len(word) > 2 and word not in FUNCTION_WORDS}
+    if not words:
+        return 1.0
+    context_words = set(tokenize(context))
+    return sum(word in context_words for word in words) / len(words)
+
+def low_confidence(answer: str):
+    # Why the answer looks unreliable, or None
+    if len(answer.strip()) < 8:
+        return "empty_answer"
+    if LOW_CONFIDENCE_RE.search(answer):
+        return "hedged_answer"
+    return None
+
+def _message_usage(message) -> dict:
+    return dict(getattr(message, "usage_metadata", None) or {})
+
+# What one answer cost: the decision plus per-model latency and usage
+class CascadeRecord:
+    def __init__(self):
+        self.decision = None
+        self.reason = None
+        self.models = {}  # model name -> {"seconds", "input_tokens", "output_tokens"}
+
+    def add(self, model: str, seconds: float, usage: dict):
+        entry = self.models.setdefault(model, {"seconds": 0.0, "input_tokens": 0, "output_tokens": 0})
+        entry["seconds"] += seconds
+        entry["input_tokens"] += usage.get("input_tokens", 0)
+        entry["output_tokens"] += usage.get("output_tokens", 0)
+        LLM_SECONDS.observe(seconds, model=model)
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(llm_cost_usd(model, usage) for model, usage in self.models.items())
+
+    def summary(self) -> str:
+        models = " ".join(
+            f"{model}={usage['seconds'] * 1000:.0f}ms/{usage['input_tokens']}+{usage['output_tokens']}tok"
+            for model, usage in self.models.items()
+        )
+        return f"decision={self.decision} reason={self.reason} {models} cost=${self.cost_usd:.6f}"
+
+# small and large are (model name, runnable returning a message) pairs;
+# large_scheduler is checked so a rate-limited large model is skipped
+class ModelCascade:
+    def __init__(self, small, large, latency_budget: float = 4.0, min_context_overlap: float = 0.5,
+                 max_simple_words: int = 20, large_scheduler=None):
+        self.small_model, self.small = small
+        self.large_model, self.large = large
+        self.latency_budget = latency_budget
+        self.min_context_overlap = min_context_overlap
+        self.max_simple_words = max_simple_words
+        self.large_scheduler = large_scheduler
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def choose(self, question: str, context: str, single_product: bool):
+        # ("small" | "large", reason) for a question and its context
+        if COMPLEX_RE.search(question):
+            return "large", "complex_question"
+        if len(question.split()) > self.max_simple_words:
+            return "large", "long_question"
+        if single_product:
+            return "small", "product_lookup" if SIMPLE_RE.search(question) else "single_product"
+        if context_overlap(question, context) < self.min_context_overlap:
+            return "large", "weak_context"
+        return "small", "covered_by_context"
+
+    def _large_blocked(self, remaining: float) -> bool:
+        if self.large_scheduler is None:
+            return False
+        return self.large_scheduler.stats()["paused_for_seconds"] >= remaining
+
+    def _finish(self, record: CascadeRecord, decision: str, reason: str):
+        record.decision = decision
+        record.reason = reason
+        CASCADE_DECISIONS.inc(decision=decision)
+        logger.info("Cascade: %s", record.summary())
+
+    async def _asmall(self, inputs, record: CascadeRecord) -> str:
+        started = time.perf_counter()
+        message = await self.small.ainvoke(inputs)
+        seconds = time.perf_counter() - started
+        record_span("llm_small", seconds)
+        record.add(self.small_model, seconds, _message_usage(message))
+        return message.content
+
+    async def astream(self, inputs: dict, question: str, context: str, single_product: bool,
+                      record: CascadeRecord = None):
+        # Yield the answer's text chunks; record is filled in as it goes
+        record = record if record is not None else CascadeRecord()
+        started = time.perf_counter()
+        tier, reason = self.choose(question, context, single_product)
+        fallback = None
+        if tier == "small":
+            answer = await self._asmall(inputs, record)
+            doubt = low_confidence(answer)
+            if doubt is None:
+                self._finish(record, "small", reason)
+                yield answer
+                return
+            fallback, reason = answer, doubt
+
+        decision = "escalated" if fallback is not None else "large"
+        remaining = self.latency_budget - (time.perf_counter() - started)
+        failure = None
+        if remaining <= 0:
+            failure = "slow"
+        elif self._large_blocked(remaining):
+            failure = "rate_limited"
+        else:
+            large_started = time.perf_counter()
+            usage = {}
+            stream = self.large.astream(inputs).__aiter__()
+            try:
+                # The budget bounds the wait for the first token only
+                first = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+            except asyncio.TimeoutError:
+                failure = "slow"
+            except StopAsyncIteration:
+                failure = "error"
+            except RateLimitError:
+                failure = "rate_limited"
+            except Exception:
+                logger.exception("Large model failed, answering with %s", self.small_model)
+                failure = "error"
+            if failure is None:
+                record_span("llm_large_first_token", time.perf_counter() - large_started)
+                usage.update(_message_usage(first))
+                yield first.content
+                async for chunk in stream:
+                    usage.update(_message_usage(chunk))
+                    yield chunk.content
+                seconds = time.perf_counter() - large_started
+                record_span("llm_large", seconds)
+                record.add(self.large_model, seconds, usage)
+                self._finish(record, decision, reason)
+                return
+            await stream.aclose()
+            record.add(self.large_model, time.perf_counter() - large_started, {})
+
+        if fallback is None:
+            fallback = await self._asmall(inputs, record)
+        self._finish(record, f"fallback_{failure}", reason)
+        yield fallback
+
+    async def ainvoke(self, inputs: dict, question: str, context: str, single_product: bool,
+                      record: CascadeRecord = None) -> str:
+        chunks = []
+        async for chunk in self.astream(inputs, question, context, single_product, record):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    def _event_loop(self):
+        # The sync path's own loop, on a thread started on first use
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="cascade-loop", daemon=True).start()
+        return self._loop
+
+    def invoke(self, inputs: dict, question: str, context: str, single_product: bool,
+               record: CascadeRecord = None) -> str:
+        # Sync version for threaded callers: runs ainvoke on the cascade's own loop,
+        # so a large call over budget is cancelled rather than left running
+        # Scheduled from this thread, so spans land on this request's trace
+        future = asyncio.run_coroutine_threadsafe(
+            self.ainvoke(inputs, question, context, single_product, record), self._event_loop()
+        )
+        return future.result()
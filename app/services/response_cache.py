@@ -0,0 +1,199 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from app.services.fast_path import ATTRIBUTE_PATTERNS
+
+_PUNCT_RE = re.compile(r"[^\w\s-]+")
+_SPACE_RE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    # "Price of Basmati rice??" and "price of basmati rice" share one key
+    question = _PUNCT_RE.sub(" ", question.lower())
+    return _SPACE_RE.sub(" ", question).strip()
+
+def question_attributes(normalized: str) -> frozenset:
+    # "price of X" and "is X in stock" can be close enough in embedding space
+    # to match, so the asked-about attributes scope the similarity scan too
+    return frozenset(name for name, pattern in ATTRIBUTE_PATTERNS.items() if pattern.search(normalized))
+
+class CacheEntry:
+    __slots__ = ("products", "scope", "question", "embedding", "answer", "created_at", "size")
+
+    def __init__(self, products, question, embedding, answer):
+        self.products = products
+        self.scope = (products, question_attributes(question))
+        self.question = question
+        self.embedding = embedding
+        self.answer = answer
+        self.created_at = time.monotonic()
+        self.size = (
+            sys.getsizeof(answer)
+            + sys.getsizeof(question)
+            + (embedding.nbytes if embedding is not None else 0)
+            + 64 * len(products)
+        )
+
+# Answer cache in front of the prompt | llm chain, keyed on the grounding
+# product IDs plus the normalized question. Exact questions are dict hits,
+# others match at cosine >= similarity_threshold against questions cached for
+# the same products and attributes (price, stock, ...). Entries expire after
+# ttl_seconds; LRU eviction by count and bytes
+class SemanticResponseCache:
+    def __init__(
+        self,
+        embed_fn,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 10000,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()          # (products, question) -> CacheEntry, LRU order
+        self._by_scope = defaultdict(set)      # (products, attributes) -> keys, for similarity scans
+        self._by_product_id = defaultdict(set) # product ID -> keys, for invalidation
+        self._bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def products_key(product_ids) -> frozenset:
+        return frozenset(str(pid).upper() for pid in product_ids if pid)
+
+    def _embed(self, question: str):
+        vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, product_ids, question: str):
+        # (answer, embedding), answer None on a miss; hand the embedding back to
+        # store() so it is not computed twice
+        products = self.products_key(product_ids)
+        normalized = normalize_question(question)
+        if not products or not normalized:
+            return None, None
+
+        key = (products, normalized)
+        with self._lock:
+            entry = self._get_live(key)
+            if entry is not None:
+                self.hits += 1
+                return entry.answer, entry.embedding
+            scope = (products, question_attributes(normalized))
+            candidates = [self._entries[k] for k in self._by_scope.get(scope, ())]
+
+        embedding = self._embed(normalized)
+        candidates = [
+            entry for entry in candidates
+            if entry.embedding is not None and not self._expired(entry)
+        ]
+        if candidates:
+            matrix = np.stack([entry.embedding for entry in candidates])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                with self._lock:
+                    best_key = (products, candidates[best].question)
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                        self.hits += 1
+                        self.semantic_hits += 1
+                        return candidates[best].answer, embedding
+
+        with self._lock:
+            self.misses += 1
+        return None, embedding
+
+    def store(self, product_ids, question: str, answer: str, embedding=None):
+        products = self.products_key(product_ids)
+        normalized = normalize_question(question)
+        if not products or not normalized or not answer:
+            return
+        if embedding is None:
+            embedding = self._embed(normalized)
+
+        entry = CacheEntry(products, normalized, embedding, answer)
+        key = (products, normalized)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._by_scope[entry.scope].add(key)
+            for product_id in products:
+                self._by_product_id[product_id].add(key)
+            self._bytes += entry.size
+            self._evict()
+
+    def invalidate_product(self, product_id: str) -> int:
+        # Drop every answer grounded on this product, e.g. after a price change
+        with self._lock:
+            keys = list(self._by_product_id.get(str(product_id).upper(), ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._by_product_id.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _expired(self, entry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _get_live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        bucket = self._by_scope.get(entry.scope)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._by_scope[entry.scope]
+        for product_id in entry.products:
+            keys = self._by_product_id.get(product_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_product_id[product_id]
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
@@ -0,0 +1,281 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English/Banglish
+    return len(text) // 4 + 1 if text else 0
+
+class Session:
+    __slots__ = ("session_id", "messages", "summary", "last_product_id", "updated_at")
+
+    def __init__(self, session_id, messages=None, summary="", last_product_id=None, updated_at=None):
+        self.session_id = session_id
+        self.messages = messages or []  # [role, content] pairs, role is "human" or "ai"
+        self.summary = summary
+        self.last_product_id = last_product_id
+        self.updated_at = updated_at or time.time()
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "messages": self.messages,
+            "summary": self.summary,
+            "last_product_id": self.last_product_id,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id, data, updated_at=None):
+        data = json.loads(data)
+        return cls(
+            session_id,
+            messages=data.get("messages", []),
+            summary=data.get("summary", ""),
+            last_product_id=data.get("last_product_id"),
+            updated_at=updated_at,
+        )
+
+    def size(self) -> int:
+        return sum(len(content) for _, content in self.messages) + len(self.summary) + 200
+
+# Per-process sessions with idle-TTL and LRU eviction under a memory cap
+class InMemorySessionBackend:
+    def __init__(self, max_sessions=10000, max_bytes=64 * 1024 * 1024, ttl_seconds=86400):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            return self._load(session_id)
+
+    def save(self, session):
+        with self._lock:
+            self._save(session)
+
+    def update(self, session_id, mutate):
+        # Load, mutate and save as one step under the lock
+        with self._lock:
+            session = self._load(session_id) or Session(session_id)
+            mutate(session)
+            session.updated_at = time.time()
+            self._save(session)
+
+    def _load(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_seconds:
+            self._drop(session_id)
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _save(self, session):
+        self._drop(session.session_id)
+        size = session.size()
+        self._sessions[session.session_id] = session
+        self._sizes[session.session_id] = size
+        self._bytes += size
+        self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _drop(self, session_id):
+        if self._sessions.pop(session_id, None) is not None:
+            self._bytes -= self._sizes.pop(session_id)
+
+    def _evict(self):
+        now = time.time()
+        # Oldest first: stop at the first live session once under the caps
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            expired = now - session.updated_at > self.ttl_seconds
+            over_cap = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not (expired or over_cap):
+                break
+            self._drop(session_id)
+
+# Sessions in a SQLite file, surviving restarts and shared by every worker
+class SQLiteSessionBackend:
+    EVICT_EVERY = 100
+
+    def __init__(self, path="app/db/sessions.sqlite3", max_sessions=100000, ttl_seconds=86400):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions(updated_at)")
+
+    def load(self, session_id):
+        with self._lock:
+            return self._load(session_id)
+
+    def save(self, session):
+        with self._lock:
+            self._save(session)
+
+    def update(self, session_id, mutate):
+        # BEGIN IMMEDIATE takes the write lock before reading, so another
+        # worker's turn for the same session can't land in between
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                session = self._load(session_id) or Session(session_id)
+                mutate(session)
+                session.updated_at = time.time()
+                self._save(session)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _load(self, session_id):
+        row = self._conn.execute(
+            "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return Session.from_json(session_id, row[0], updated_at=row[1])
+
+    def _save(self, session):
+        self._conn.execute(
+            "INSERT INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (session.session_id, session.to_json(), session.updated_at),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+# Per-session conversation state over a pluggable backend: recent turns within
+# history_token_budget verbatim, older ones folded into a capped summary
+class SessionStore:
+    def __init__(self, backend, history_token_budget=600, summary_token_budget=150):
+        self.backend = backend
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+
+    def get(self, session_id: str) -> Session:
+        session = self.backend.load(session_id)
+        if session is None:
+            session = Session(session_id)
+        return session
+
+    def append_turn(self, session_id: str, question: str, answer: str):
+        def add_turn(session):
+            session.messages.append(["human", question])
+            session.messages.append(["ai", answer])
+            self._compact(session)
+        # One atomic read-modify-write: workers share the SQLite backend
+        self.backend.update(session_id, add_turn)
+
+    def save_last_product_id(self, session_id: str, product_id: str):
+        def set_product(session):
+            session.last_product_id = product_id
+        self.backend.update(session_id, set_product)
+
+    def get_last_product_id(self, session_id: str):
+        return self.get(session_id).last_product_id
+
+    def recent_messages(self, session_id: str, limit: int) -> list:
+        return self.get(session_id).messages[-limit:]
+
+    def history_text(self, session_id: str) -> str:
+        session = self.get(session_id)
+        lines = []
+        if session.summary:
+            lines.append(f"Summary of earlier conversation: {session.summary}")
+        lines.append(format_messages(session.messages))
+        return "\n".join(line for line in lines if line)
+
+    def clear(self, session_id: str):
+        self.backend.delete(session_id)
+
+    def _compact(self, session):
+        # Roll the oldest turns into the summary until the window fits
+        messages = session.messages
+        while len(messages) > 2 and estimate_tokens(format_messages(messages)) > self.history_token_budget:
+            role, content = messages.pop(0)
+            if role == "human":
+                session.summary = self._summarize(session.summary, content)
+                # Drop the matching answer with its question
+                if messages and messages[0][0] == "ai":
+                    messages.pop(0)
+
+    def _summarize(self, summary: str, question: str) -> str:
+        # Extractive summary: the user's earlier questions, newest kept when over budget
+        question = " ".join(question.split())
+        if len(question) > 120:
+            question = question[:117] + "..."
+        topics = [t for t in summary.removeprefix("User asked about: ").split(" | ") if t]
+        topics.append(question)
+        while len(topics) > 1 and estimate_tokens(" | ".join(topics)) > self.summary_token_budget:
+            topics.pop(0)
+        return "User asked about: " + " | ".join(topics)
+
+def format_messages(messages) -> str:
+    formatted = []
+    for role, content in messages:
+        if role == "human":
+            formatted.append(f"User: {content}")
+        elif role == "ai":
+            formatted.append(f"Assistant: {content}")
+    return "\n".join(formatted)
+
+def create_session_store(
+    backend="memory",
+    sqlite_path="app/db/sessions.sqlite3",
+    max_sessions=10000,
+    max_mb=64,
+    ttl_seconds=86400,
+    history_token_budget=600,
+    summary_token_budget=150,
+):
+    if backend == "sqlite":
+        session_backend = SQLiteSessionBackend(sqlite_path, max_sessions=max_sessions, ttl_seconds=ttl_seconds)
+    elif backend == "memory":
+        session_backend = InMemorySessionBackend(
+            max_sessions=max_sessions, max_bytes=max_mb * 1024 * 1024, ttl_seconds=ttl_seconds
+        )
+    else:
+        raise ValueError(f"Unknown session backend: {backend!r}")
+    return SessionStore(session_backend, history_token_budget, summary_token_budget)
@@ -0,0 +1,147 @@
+# Per-request tracing: spans inside trace(kind), including code run through
+# asyncio.to_thread, are recorded on the trace and in grocery_stage_seconds,
+# and one log line summarises each request. SLOW_REQUEST_SECONDS logs slow
+# requests; PROFILE_SAMPLE_RATE samples stacks for that fraction of requests
+
+import contextvars
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from app.core.config import PROFILE_SAMPLE_INTERVAL_MS, PROFILE_SAMPLE_RATE, SLOW_REQUEST_SECONDS
+from app.services.metrics import ANSWERS, REQUEST_SECONDS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_slow_request_hooks = []
+
+# Samples one thread's stack every interval seconds until stopped
+class SamplingProfiler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 40:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{frame.f_lineno}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+            self.total += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def report(self, top: int = 10) -> str:
+        lines = [f"{self.total} samples every {self.interval * 1000:.0f}ms"]
+        for stack, count in self.samples.most_common(top):
+            lines.append(f"{count / self.total:6.1%}  " + " <- ".join(reversed(stack[-6:])))
+        return "\n".join(lines)
+
+class Trace:
+    def __init__(self, kind: str, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attrs = dict(attrs)
+        self.route = "unknown"
+        self.spans = []
+        self.started = time.perf_counter()
+        self.duration = None
+        self.profiler = None
+
+    def set_route(self, route: str):
+        self.route = route
+
+    def add_span(self, stage: str, seconds: float):
+        self.spans.append((stage, seconds))
+
+    def summary(self) -> str:
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans)
+        return f"trace={self.id} kind={self.kind} route={self.route} total={self.duration:.3f}s {stages}"
+
+def current_trace():
+    return _current_trace.get()
+
+def add_slow_request_hook(hook):
+    # hook(trace, profile_report_or_None) for requests over SLOW_REQUEST_SECONDS
+    _slow_request_hooks.append(hook)
+
+def record_span(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+@contextmanager
+def trace(kind: str, **attrs):
+    # Nested calls join the outer trace, so an entry point (a Telegram
+    # handler, the audio route) can cover transcription, answer and send
+    outer = _current_trace.get()
+    if outer is not None:
+        outer.attrs.update(attrs)
+        yield outer
+        return
+    current = Trace(kind, **attrs)
+    token = _current_trace.set(current)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        current.profiler = SamplingProfiler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        current.profiler.start()
+    try:
+        yield current
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Finished in another context, e.g. an async generator closed elsewhere
+            _current_trace.set(None)
+        _finish(current)
+
+def _finish(current: Trace):
+    current.duration = time.perf_counter() - current.started
+    if current.profiler is not None:
+        current.profiler.stop()
+    REQUEST_SECONDS.observe(current.duration, kind=current.kind, route=current.route)
+    ANSWERS.inc(route=current.route)
+
+    slow = SLOW_REQUEST_SECONDS > 0 and current.duration >= SLOW_REQUEST_SECONDS
+    if not slow:
+        logger.info(current.summary())
+        return
+    report = current.profiler.report() if current.profiler is not None else None
+    for hook in _slow_request_hooks:
+        try:
+            hook(current, report)
+        except Exception:
+            logger.exception("Slow request hook failed")
+
+def _log_slow_request(current: Trace, report):
+    message = f"Slow request: {current.summary()}"
+    if report:
+        message += "\n" + report
+    logger.warning(message)
+
+add_slow_request_hook(_log_slow_request)
@@ -0,0 +1,93 @@
+# Per-chat FIFO queues with at most one worker each, so a chat's updates run
+# in order while chats run concurrently (up to max_concurrency); submit refuses
+# updates past max_backlog, or past max_per_chat for one chat
+
+import asyncio
+import logging
+from collections import deque
+
+from app.services.metrics import TELEGRAM_BACKLOG, TELEGRAM_UPDATES
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED, BACKLOG_FULL, CHAT_BACKLOG_FULL = "accepted", "backlog_full", "chat_backlog_full"
+
+class PerChatDispatcher:
+    def __init__(self, process, max_backlog: int = 1000, max_per_chat: int = 20, max_concurrency: int = 64):
+        # process(item) is awaited for every submitted item
+        self.process = process
+        self.max_backlog = max_backlog
+        self.max_per_chat = max_per_chat
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues = {}  # chat id -> deque of items not yet started
+        self._workers = {}  # chat id -> worker task
+        self.pending = 0  # queued plus running
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+
+    def submit(self, chat_id, item) -> str:
+        if self.pending >= self.max_backlog:
+            return self._shed(BACKLOG_FULL)
+        queue = self._queues.get(chat_id)
+        if queue is not None and len(queue) >= self.max_per_chat:
+            return self._shed(CHAT_BACKLOG_FULL)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(item)
+        self._set_pending(1)
+        TELEGRAM_UPDATES.inc(result=ACCEPTED)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain(chat_id))
+        return ACCEPTED
+
+    def _shed(self, reason: str) -> str:
+        self.shed += 1
+        TELEGRAM_UPDATES.inc(result=reason)
+        return reason
+
+    def _set_pending(self, delta: int):
+        self.pending += delta
+        TELEGRAM_BACKLOG.set(self.pending)
+
+    async def _drain(self, chat_id):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                item = queue.popleft()
+                try:
+                    async with self._semaphore:
+                        await self.process(item)
+                    self.processed += 1
+                except Exception:
+                    self.failed += 1
+                    TELEGRAM_UPDATES.inc(result="failed")
+                    logger.exception("Update for chat %s failed", chat_id)
+                finally:
+                    self._set_pending(-1)
+        finally:
+            # Nothing awaits between the last empty check and here, so no
+            # item can be appended to a queue without a worker
+            self._queues.pop(chat_id, None)
+            self._workers.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "active_chats": len(self._workers),
+            "processed": self.processed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "max_backlog": self.max_backlog,
+        }
+
+    async def shutdown(self, timeout: float = 10.0):
+        # Let in-flight updates finish; whatever is left after timeout is cancelled
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, not_done = await asyncio.wait(workers, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning("Cancelled %d chat workers with %d updates pending at shutdown", len(not_done), self.pending)
@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+
+from app.core.config import LLM_CASCADE, get_hf_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Readiness as reported by /readyz
+state = {
+    "ready": False,
+    "warming_up": False,
+    "error": None,
+    "report": None,
+}
+_warmup_lock = threading.Lock()
+
+def warmup(started_at: float = None) -> dict:
+    # Loads the embedding model (plus a dummy embed), the catalog snapshot and the
+    # Groq clients up front, timing each step; started_at (perf_counter at process
+    # start) adds import-to-ready time
+    with _warmup_lock:
+        if state["ready"]:
+            return state["report"]
+        state["warming_up"] = True
+        state["error"] = None
+        steps = {}
+        began = time.perf_counter()
+        try:
+            step = time.perf_counter()
+            embeddings = get_hf_embeddings()
+            steps["embedding_model"] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            embeddings.embed_query("warmup: price of basmati rice")
+            steps["dummy_embed"] = time.perf_counter() - step
+
+            from app.services.catalog_state import current_snapshot
+            step = time.perf_counter()
+            current_snapshot()
+            steps["catalog_and_index"] = time.perf_counter() - step
+
+            from app.services.chat_services import get_cascade, get_chain
+            step = time.perf_counter()
+            get_chain()
+            if LLM_CASCADE:
+                get_cascade()
+            steps["llm_client"] = time.perf_counter() - step
+        except Exception as e:
+            state["error"] = f"{type(e).__name__}: {e}"
+            state["warming_up"] = False
+            raise
+
+        finished = time.perf_counter()
+        report = {
+            "steps_seconds": {name: round(seconds, 3) for name, seconds in steps.items()},
+            "warmup_seconds": round(finished - began, 3),
+        }
+        if started_at is not None:
+            report["import_to_ready_seconds"] = round(finished - started_at, 3)
+        state.update(ready=True, warming_up=False, report=report)
+
+    logger.info(
+        "Warmup finished in "
+        f"{report['warmup_seconds']:.2f} seconds ({', '.join(f'{k}={v:.2f}s' for k, v in report['steps_seconds'].items())})"
+        + (f"; import-to-ready {report['import_to_ready_seconds']:.2f} seconds" if "import_to_ready_seconds" in report else "")
+    )
+    return report
@@ -0,0 +1,104 @@
+"""Recall/QPS/memory of the FAISS index types on synthetic catalogs.
+
+Vectors are drawn from a Gaussian mixture (embeddings of a real catalog are
+clustered by category, uniform noise would flatter IVF), queries are noisy
+copies of catalog vectors. Recall@k is measured against the exact flat
+index; QPS is single-query, as in serving; memory is the serialized index
+size. 1M x 768-dim needs ~3 GB for the raw vectors alone.
+
+    python -m benchmarks.bench_ann [--sizes 10000,100000,1000000] [--dim 768] [--types flat,ivf,hnsw,pq,ivfpq]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from app.db.ann_index import INDEX_TYPES, build_faiss_index, index_config
+
+
+def synthetic_vectors(n, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    step = 100_000
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        labels = rng.integers(0, clusters, size=stop - start)
+        vectors[start:stop] = centers[labels] + 0.5 * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return vectors
+
+
+def make_queries(vectors, count, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=count, replace=False)
+    noise = 0.2 * rng.standard_normal((count, vectors.shape[1]), dtype=np.float32)
+    return vectors[rows] + noise
+
+
+def index_bytes(index) -> int:
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        return os.path.getsize(f.name)
+
+
+def run(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(found[0]) & set(expected))
+    return {
+        "recall": hits / (len(queries) * k),
+        "qps": len(latencies) / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int)
+    parser.add_argument("--ef-search", type=int)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    for size in (int(s) for s in args.sizes.split(",")):
+        vectors = synthetic_vectors(size, args.dim)
+        queries = make_queries(vectors, min(args.queries, size))
+        exact = faiss.IndexFlatL2(args.dim)
+        exact.add(vectors)
+        _, truth = exact.search(queries, args.k)
+        del exact
+
+        print(f"\n{size:,} products, {args.dim}-dim, recall@{args.k} vs flat")
+        print(f"{'type':<7} {'factory':<16} {'recall':>7} {'qps':>9} {'p50 ms':>8} {'MB':>9} {'build s':>8}")
+        for index_type in types:
+            config = index_config(
+                index_type, args.dim, size, {"nprobe": args.nprobe, "ef_search": args.ef_search}
+            )
+            started = time.perf_counter()
+            index = build_faiss_index(config, vectors)
+            index.add(vectors)
+            build_seconds = time.perf_counter() - started
+            result = run(index, queries, truth, args.k)
+            print(
+                f"{index_type:<7} {config['factory']:<16} {result['recall']:>7.3f} {result['qps']:>9.0f} "
+                f"{result['p50_ms']:>8.3f} {index_bytes(index) / 2**20:>9.1f} {build_seconds:>8.1f}"
+            )
+            del index
+
+
+if __name__ == "__main__":
+    main()
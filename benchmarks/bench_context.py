@@ -0,0 +1,128 @@
+"""Prompt-token reduction from compact, intent-aware contexts.
+
+For every question in benchmarks/data/cascade_questions.jsonl, builds the
+prompt twice with the same retrieved products and the same chat history:
+once the old way (every product field and review, full history) and once
+with ContextBuilder snippets, CONTEXT_TOKEN_BUDGET and history trimmed to
+PROMPT_TOKEN_BUDGET. History comes from a session store fed the preceding
+``--history-turns`` questions with answers of typical length.
+
+Tokens are the app's ~4 characters/token estimate. "grounded" is the share
+of questions whose expected answer strings (``expect_all``) are still in
+the context, a cheap check that compaction keeps what the answer needs.
+The prompt columns include the fixed system message, so they shrink less
+than the context.
+
+    python -m benchmarks.bench_context [--history-turns 3] [--context-budget 500] [--prompt-budget 1000]
+"""
+import argparse
+import statistics
+import time
+from collections import defaultdict
+
+from app.core.config import CONTEXT_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET
+from app.services.context_builder import fit_history, question_intents
+from app.services.session_store import InMemorySessionBackend, SessionStore, estimate_tokens
+from benchmarks.eval_cascade import PRODUCT_ID_RE, QUESTIONS_PATH, load_questions
+
+ANSWER = (
+    "Sure! Here is what I found in our shop. The product is in stock and the price is listed in taka, "
+    "customers generally rate it well for quality and value. Let me know if you need anything else."
+)
+
+
+def grounded(context: str, item: dict) -> bool:
+    text = context.lower()
+    return all(expected.lower() in text for expected in item["expect_all"])
+
+
+def measure(snapshot, questions, args) -> list:
+    from app.services.chat_services import build_docs_context, build_product_context, prompt
+
+    builder = snapshot.context_builder
+    store = SessionStore(InMemorySessionBackend())
+    rows = []
+    for position, item in enumerate(questions):
+        question = item["question"]
+        session_id = f"bench-{position}"
+        for previous in questions[max(0, position - args.history_turns):position]:
+            store.append_turn(session_id, previous["question"], ANSWER)
+        history = store.history_text(session_id)
+
+        match = PRODUCT_ID_RE.search(question)
+        product = snapshot.catalog.get(match.group().upper()) if match else None
+        if product is not None:
+            full_context = build_product_context(product)
+            product_ids = [match.group().upper()]
+        else:
+            docs = snapshot.retriever.invoke(f"User: {question}", question=question)
+            full_context = build_docs_context(docs)
+            product_ids = [str(doc.metadata.get("product_id", "")).upper() for doc in docs]
+
+        started = time.perf_counter()
+        context = builder.build(product_ids, question, args.context_budget)
+        chat_history = fit_history(history, max(0, args.prompt_budget - estimate_tokens(context)))
+        build_us = (time.perf_counter() - started) * 1e6
+
+        full_prompt = prompt.format(context=full_context, question=question, chat_history=history)
+        compact_prompt = prompt.format(context=context, question=question, chat_history=chat_history)
+        rows.append({
+            "kind": item["kind"],
+            "intents": question_intents(question) or ("general",),
+            "full_context": estimate_tokens(full_context),
+            "compact_context": estimate_tokens(context),
+            "full_prompt": estimate_tokens(full_prompt),
+            "compact_prompt": estimate_tokens(compact_prompt),
+            "full_grounded": grounded(full_context, item),
+            "compact_grounded": grounded(context, item),
+            "build_us": build_us,
+        })
+    return rows
+
+
+def report(label: str, rows: list):
+    full = statistics.fmean(row["full_prompt"] for row in rows)
+    compact = statistics.fmean(row["compact_prompt"] for row in rows)
+    full_context = statistics.fmean(row["full_context"] for row in rows)
+    compact_context = statistics.fmean(row["compact_context"] for row in rows)
+    print(
+        f"{label:<24} {len(rows):>4} {full_context:>8.0f} {compact_context:>8.0f} {1 - compact_context / full_context:>8.1%} "
+        f"{full:>8.0f} {compact:>8.0f} {1 - compact / full:>8.1%} "
+        f"{sum(row['full_grounded'] for row in rows) / len(rows):>6.2f} "
+        f"{sum(row['compact_grounded'] for row in rows) / len(rows):>6.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--history-turns", type=int, default=3, help="earlier turns in each question's session")
+    parser.add_argument("--context-budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--prompt-budget", type=int, default=PROMPT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    from app.services.catalog_state import current_snapshot
+
+    snapshot = current_snapshot()
+    rows = measure(snapshot, load_questions(args.questions), args)
+
+    print("\ncontext / prompt tokens: full, compact, saved; grounded: full, compact")
+    print(f"{'':<24} {'n':>4} {'ctx':>8} {'ctx':>8} {'saved':>8} {'prompt':>8} {'prompt':>8} {'saved':>8} "
+          f"{'grnd':>6} {'grnd':>6}")
+    report("all", rows)
+    by_kind = defaultdict(list)
+    by_intent = defaultdict(list)
+    for row in rows:
+        by_kind[row["kind"]].append(row)
+        for intent in row["intents"]:
+            by_intent[intent].append(row)
+    for kind, kind_rows in sorted(by_kind.items()):
+        report(f"kind={kind}", kind_rows)
+    for intent, intent_rows in sorted(by_intent.items()):
+        report(f"intent={intent}", intent_rows)
+    build = sorted(row["build_us"] for row in rows)
+    print(f"\ncompact context + history build: p50 {statistics.median(build):.0f} us, max {build[-1]:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
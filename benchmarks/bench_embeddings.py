@@ -0,0 +1,71 @@
+"""Query embedding throughput and latency: one call per query vs micro-batched.
+
+Simulates ``--users`` concurrent users, each embedding ``--queries``
+distinct history-enhanced retriever queries, first with the bare
+HuggingFace model and then behind ``BatchingEmbeddings``.
+
+    python -m benchmarks.bench_embeddings [--users 50] [--queries 10] [--window-ms 5]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.core.config import encode_kwargs, model_kwargs, model_name
+from app.services.embedding_batcher import BatchingEmbeddings
+
+
+def run(embeddings, users, queries):
+    latencies = []
+    lock = threading.Lock()
+
+    def user(index):
+        for turn in range(queries):
+            text = f"User: do you have rice under {100 + index} taka\nAI: yes\nUser: question {turn} from user {index}"
+            started = time.perf_counter()
+            embeddings.embed_query(text)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "qps": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=10, help="queries per user")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
+    model.embed_query("warmup")
+
+    batched = BatchingEmbeddings(
+        model, batch_window=args.window_ms / 1000, max_batch_size=args.max_batch, cache_size=0
+    )
+    print(f"{args.users} users x {args.queries} distinct queries\n")
+    print(f"{'mode':<10} {'qps':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, embeddings in (("single", model), ("batched", batched)):
+        result = run(embeddings, args.users, args.queries)
+        print(f"{label:<10} {result['qps']:>8.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+    stats = batched.stats()
+    print(f"\nmean batch size {stats['mean_batch_size']:.1f}, largest {stats['max_batch_size']}")
+
+
+if __name__ == "__main__":
+    main()
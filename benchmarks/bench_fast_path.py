@@ -0,0 +1,71 @@
+"""Hit rate and accuracy of the templated fast path on a labelled question set.
+
+Every question in benchmarks/data/fast_path_questions.jsonl says whether the
+fast path should answer it and which strings the answer must contain. A
+question is right when the engine answers exactly the ones it should, with
+every expected string (case-insensitive), and falls back on the rest. The
+set mixes plain and contracted phrasings ("what is" / "what's" / "what’s").
+Only the catalog JSON is loaded; no index or model is needed.
+
+    python -m benchmarks.bench_fast_path [--repeat 200] [--verbose]
+"""
+import argparse
+import json
+import os
+import time
+
+from app.core.config import PRODUCTS_PATH
+from app.db.catalog import CatalogIndex, load_products
+from app.services.fast_path import FastPathEngine
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "fast_path_questions.jsonl")
+
+
+def load_questions(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_correct(answer, item: dict) -> bool:
+    if (answer is not None) != item["answered"]:
+        return False
+    return answer is None or all(expected.lower() in answer.lower() for expected in item["expect"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--repeat", type=int, default=200, help="timed passes over the question set")
+    parser.add_argument("--verbose", action="store_true", help="print wrong answers and fallbacks")
+    args = parser.parse_args()
+
+    catalog = CatalogIndex(load_products(PRODUCTS_PATH))
+    items = load_questions(args.questions)
+    engine = FastPathEngine()
+
+    correct = 0
+    for item in items:
+        answer = engine.answer(catalog, item["question"])
+        ok = is_correct(answer, item)
+        correct += ok
+        if args.verbose and not ok:
+            print(f"{item['question']!r}: got {answer!r}, want answered={item['answered']} {item['expect']}")
+    stats = engine.stats()
+    should_answer = sum(item["answered"] for item in items)
+
+    timer = FastPathEngine()
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for item in items:
+            timer.answer(catalog, item["question"])
+    micros = (time.perf_counter() - started) / (args.repeat * len(items)) * 1e6
+
+    print(f"{len(items)} questions, {should_answer} answerable from the catalog")
+    print(f"correct     {correct / len(items):.2f}")
+    print(f"hit rate    {stats['hits']}/{should_answer} answerable")
+    print(f"fallbacks   {stats['fallbacks_by_reason']}")
+    print(f"us/question {micros:.1f}")
+
+
+if __name__ == "__main__":
+    main()
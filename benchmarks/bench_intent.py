@@ -0,0 +1,134 @@
+"""Accuracy and speed of the single-pass intent router vs the old checks.
+
+Every message in benchmarks/data/intent_questions.jsonl is labelled with
+its intent (greeting, product_id, count or other), whether it contains a
+pronoun to resolve and, for count questions, the keyword to count by. Both
+classifiers run over the set:
+
+  legacy  the substring checks route_question used to run: product-ID
+          regex, ``any()`` over the pronouns plus five ``re.sub`` calls,
+          "how many" + keyword loop, greeting dict scanned by substring
+  router  IntentRouter built from the catalog (app.services.intent_router)
+
+A count answer is right when the keyword counts the same products as the
+expected one. Timings include the pronoun rewrite when there is a pronoun.
+Only the catalog JSON is loaded; no index or model is needed.
+
+    python -m benchmarks.bench_intent [--repeat 2000] [--verbose]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from app.core.config import COUNT_KEYWORDS, GREETING_MAX_EXTRA_WORDS, INTENT_GREETINGS_PATH, PRODUCTS_PATH
+from app.db.catalog import CatalogIndex, load_products
+from app.services.intent_router import IntentRouter, load_greetings, resolve_pronouns
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_questions.jsonl")
+LAST_PRODUCT_ID = "P-001"
+
+LEGACY_KEYWORDS = ["snacks", "baby", "rice", "biscuits", "popcorn", "vegetables", "fruits"]
+
+
+def legacy_classify(question: str, greetings: dict):
+    """(intent, has_pronoun, count keyword) the way route_question used to decide."""
+    lower_q = question.lower()
+    has_pronoun = any(p in lower_q for p in ["its", "their", "they", "them", "it"])
+    if re.search(r'\bP-\d{3}\b', question, re.IGNORECASE):
+        return "product_id", has_pronoun, None
+    if has_pronoun:
+        question = re.sub(r'\bits\b', f'the product {LAST_PRODUCT_ID}', question, flags=re.IGNORECASE)
+        question = re.sub(r'\btheir\b', f'the product {LAST_PRODUCT_ID}', question, flags=re.IGNORECASE)
+        question = re.sub(r'\bthey\b', f'the product {LAST_PRODUCT_ID}', question, flags=re.IGNORECASE)
+        question = re.sub(r'\bthem\b', f'the product {LAST_PRODUCT_ID}', question, flags=re.IGNORECASE)
+        question = re.sub(r'\bit\b', f'the product {LAST_PRODUCT_ID}', question, flags=re.IGNORECASE)
+        lower_q = question.lower()
+    if "how many" in lower_q and "product" in lower_q:
+        for keyword in LEGACY_KEYWORDS:
+            if keyword in lower_q:
+                return "count", has_pronoun, keyword
+        return "count", has_pronoun, None
+    for key in greetings:
+        if key in lower_q:
+            return "greeting", has_pronoun, None
+    return "other", has_pronoun, None
+
+
+def router_classify(router: IntentRouter, question: str):
+    intent = router.classify(question)
+    if intent.has_pronoun and not intent.product_id:
+        question = resolve_pronouns(question, LAST_PRODUCT_ID)
+    return intent.kind, intent.has_pronoun, intent.count_keyword
+
+
+def load_questions(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(classify, items, catalog, verbose: bool, label: str) -> dict:
+    def count_of(keyword):
+        return len(catalog) if keyword is None else catalog.count_matching(keyword)
+
+    intent_hits = pronoun_hits = keyword_hits = keyword_total = 0
+    for item in items:
+        intent, has_pronoun, keyword = classify(item["text"])
+        intent_ok = intent == item["intent"]
+        keyword_ok = True
+        if item["intent"] == "count":
+            keyword_total += 1
+            keyword_ok = intent_ok and count_of(keyword) == count_of(item.get("keyword"))
+            keyword_hits += keyword_ok
+        intent_hits += intent_ok
+        pronoun_hits += has_pronoun == item["pronoun"]
+        if verbose and not (intent_ok and keyword_ok and has_pronoun == item["pronoun"]):
+            print(f"[{label}] {item['text']!r}: got {intent}/{has_pronoun}/{keyword}, "
+                  f"want {item['intent']}/{item['pronoun']}/{item.get('keyword')}")
+    return {
+        "intent": intent_hits / len(items),
+        "pronoun": pronoun_hits / len(items),
+        "count_keyword": keyword_hits / keyword_total if keyword_total else 1.0,
+    }
+
+
+def time_per_message(classify, texts, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            classify(text)
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--repeat", type=int, default=2000, help="timed passes over the question set")
+    parser.add_argument("--verbose", action="store_true", help="print misclassified messages")
+    args = parser.parse_args()
+
+    catalog = CatalogIndex(load_products(PRODUCTS_PATH))
+    greetings = load_greetings(INTENT_GREETINGS_PATH)
+    started = time.perf_counter()
+    router = IntentRouter.from_catalog(catalog, COUNT_KEYWORDS, greetings, GREETING_MAX_EXTRA_WORDS)
+    compile_ms = (time.perf_counter() - started) * 1000
+    items = load_questions(args.questions)
+    texts = [item["text"] for item in items]
+
+    classifiers = {
+        "legacy": lambda text: legacy_classify(text, greetings),
+        "router": lambda text: router_classify(router, text),
+    }
+    print(f"{len(items)} messages, {len(router.count_variants)} count keyword spellings, "
+          f"router compiled in {compile_ms:.1f} ms\n")
+    print(f"{'':<8} {'intent':>7} {'pronoun':>8} {'count kw':>9} {'us/msg':>8}")
+    for label, classify in classifiers.items():
+        accuracy = evaluate(classify, items, catalog, args.verbose, label)
+        micros = time_per_message(classify, texts, args.repeat)
+        print(f"{label:<8} {accuracy['intent']:>7.2f} {accuracy['pronoun']:>8.2f} "
+              f"{accuracy['count_keyword']:>9.2f} {micros:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Recall/latency comparison of the dense, lexical and hybrid retrievers.
+
+Queries are generated from the catalog so every query has a known target
+product: its ID, brand + name, name + sub-category, a Banglish name where we
+have one, and a description phrase. Recall@k counts a hit when the target is
+among the returned documents.
+
+    python -m benchmarks.bench_retrieval [--k 3] [--repeat 3]
+"""
+import argparse
+import statistics
+import time
+
+from app.services.catalog_state import current_snapshot
+from app.services.hybrid_retriever import BANGLA_SYNONYMS, HybridRetriever
+
+# English word -> one Banglish spelling, to generate transliterated queries
+BANGLISH = {}
+for banglish, words in BANGLA_SYNONYMS.items():
+    for word in words:
+        BANGLISH.setdefault(word, banglish)
+
+
+def build_queries(catalog):
+    queries = []
+    for product in catalog.products.values():
+        pid = product["product_id"]
+        name = product["product_name"]
+        queries.append(("product_id", f"tell me about {pid}", pid))
+        queries.append(("brand_name", f"{product['brand']} {name}", pid))
+        queries.append(("name_sub_category", f"{name} {product['sub_category']}", pid))
+        for word in name.lower().split():
+            if word in BANGLISH:
+                queries.append(("banglish", f"{BANGLISH[word]} {product['brand']}", pid))
+                break
+        queries.append(("description", product.get("description", ""), pid))
+    return queries
+
+
+def run(retriever, queries, repeat):
+    hits = {}
+    totals = {}
+    latencies = []
+    for kind, query, target in queries:
+        found = False
+        for _ in range(repeat):
+            started = time.perf_counter()
+            docs = retriever.invoke(f"User: {query}", question=query)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = any(str(doc.metadata.get("product_id", "")).upper() == target for doc in docs)
+        totals[kind] = totals.get(kind, 0) + 1
+        hits[kind] = hits.get(kind, 0) + int(found)
+    latencies.sort()
+    return {
+        "recall": sum(hits.values()) / len(queries),
+        "recall_by_kind": {kind: hits[kind] / totals[kind] for kind in totals},
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query")
+    args = parser.parse_args()
+
+    snapshot = current_snapshot()
+    queries = build_queries(snapshot.catalog)
+    print(f"{len(queries)} queries over {len(snapshot.catalog)} products, recall@{args.k}\n")
+
+    kinds = sorted({kind for kind, _, _ in queries})
+    print(f"{'mode':<8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}  " + "  ".join(f"{k:>17}" for k in kinds))
+    for mode in ("dense", "lexical", "hybrid"):
+        retriever = HybridRetriever.from_faiss(snapshot.faiss_index, snapshot.catalog, mode=mode, k=args.k)
+        result = run(retriever, queries, args.repeat)
+        print(
+            f"{mode:<8} {result['recall']:>7.3f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}  "
+            + "  ".join(f"{result['recall_by_kind'][k]:>17.3f}" for k in kinds)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Quality/latency/cost trade-off of the model cascade on a fixed question set.
+
+Every question in benchmarks/data/cascade_questions.jsonl is answered with
+the context the pipeline would build (a product-ID question gets that
+product, the rest go through the retriever) by three strategies: the large
+model only, the small model only, and the cascade. An answer is correct when
+it contains every ``expect_all`` string and, if given, one of the
+``expect_any`` strings (case-insensitive).
+
+Runs against the Groq API (GROQ_API_KEY) at bulk priority, one question at
+a time. ``--fake`` uses the local stand-ins instead, to check the harness
+and the routing offline; accuracy is meaningless then.
+
+    python -m benchmarks.eval_cascade [--modes large,small,cascade] [--budget 4] [--fake] [--verbose]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+from collections import Counter, defaultdict
+
+from app.services.model_cascade import CascadeRecord
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "cascade_questions.jsonl")
+MODES = ("large", "small", "cascade")
+PRODUCT_ID_RE = re.compile(r"\bP-\d{3}\b", re.IGNORECASE)
+
+
+def load_questions(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_inputs(snapshot, question: str):
+    # Same context as the answer pipeline, without history
+    from app.services.chat_services import build_context
+
+    match = PRODUCT_ID_RE.search(question)
+    product = snapshot.catalog.get(match.group().upper()) if match else None
+    if product is not None:
+        context = build_context(snapshot, question, product=product)
+    else:
+        docs = snapshot.retriever.invoke(f"User: {question}", question=question)
+        context = build_context(snapshot, question, docs=docs)
+    return {"context": context, "question": question, "chat_history": ""}, context, product is not None
+
+
+def is_correct(answer: str, item: dict) -> bool:
+    text = answer.lower()
+    if not all(expected.lower() in text for expected in item["expect_all"]):
+        return False
+    return not item["expect_any"] or any(expected.lower() in text for expected in item["expect_any"])
+
+
+async def answer(mode: str, cascade, inputs: dict, question: str, context: str, single_product: bool):
+    record = CascadeRecord()
+    if mode == "cascade":
+        text = await cascade.ainvoke(inputs, question, context, single_product, record)
+        return text, record
+    model, chain = (cascade.small_model, cascade.small) if mode == "small" else (cascade.large_model, cascade.large)
+    started = time.perf_counter()
+    message = await chain.ainvoke(inputs)
+    record.add(model, time.perf_counter() - started, dict(message.usage_metadata or {}))
+    record.decision = mode
+    return message.content, record
+
+
+async def run(args) -> dict:
+    from app.services.catalog_state import current_snapshot
+    from app.services.chat_services import get_cascade
+    from app.services.groq_scheduler import BULK, request_priority
+
+    questions = load_questions(args.questions)
+    snapshot = await asyncio.to_thread(current_snapshot)
+    cascade = get_cascade()
+    cascade.latency_budget = args.budget
+    prepared = [await asyncio.to_thread(build_inputs, snapshot, item["question"]) for item in questions]
+
+    results = {}
+    for mode in args.modes:
+        rows = []
+        with request_priority(BULK):
+            for item, (inputs, context, single_product) in zip(questions, prepared):
+                started = time.perf_counter()
+                try:
+                    text, record = await answer(mode, cascade, inputs, item["question"], context, single_product)
+                    error = None
+                except Exception as e:
+                    text, record, error = "", CascadeRecord(), f"{type(e).__name__}: {e}"
+                rows.append({
+                    "id": item["id"],
+                    "kind": item["kind"],
+                    "seconds": time.perf_counter() - started,
+                    "correct": error is None and is_correct(text, item),
+                    "decision": record.decision,
+                    "reason": record.reason,
+                    "cost_usd": record.cost_usd,
+                    "models": record.models,
+                    "answer": text,
+                    "error": error,
+                })
+                if args.verbose and not rows[-1]["correct"]:
+                    print(f"[{mode}] {item['id']} {item['question']!r} -> {(error or text)[:200]!r}")
+        results[mode] = rows
+    return results
+
+
+def summarize(rows: list) -> dict:
+    latencies = sorted(row["seconds"] for row in rows)
+    by_kind = defaultdict(list)
+    for row in rows:
+        by_kind[row["kind"]].append(row["correct"])
+    return {
+        "accuracy": sum(row["correct"] for row in rows) / len(rows),
+        "accuracy_by_kind": {kind: sum(hits) / len(hits) for kind, hits in sorted(by_kind.items())},
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, round(len(latencies) * 0.95) - 1)] * 1000,
+        "cost_per_1k_usd": sum(row["cost_usd"] for row in rows) / len(rows) * 1000,
+        "decisions": dict(Counter(row["decision"] for row in rows)),
+        "errors": sum(row["error"] is not None for row in rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--budget", type=float, default=4.0, help="cascade latency budget in seconds")
+    parser.add_argument("--fake", action="store_true", help="use the local Groq stand-ins")
+    parser.add_argument("--verbose", action="store_true", help="print wrong answers")
+    parser.add_argument("--json", help="also write every answer to this file")
+    args = parser.parse_args()
+    args.modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+
+    if args.fake:
+        from benchmarks.fake_groq import FakeChatGroq, install
+        from app.services.groq_scheduler import chat_scheduler, small_chat_scheduler
+
+        install(
+            FakeChatGroq(ttft_ms=400, tokens_per_second=250, seed=0),
+            small_llm=FakeChatGroq(ttft_ms=100, tokens_per_second=750, seed=1),
+        )
+        chat_scheduler.set_limits(0)
+        small_chat_scheduler.set_limits(0)
+
+    results = asyncio.run(run(args))
+    summaries = {mode: summarize(rows) for mode, rows in results.items()}
+    kinds = sorted({kind for summary in summaries.values() for kind in summary["accuracy_by_kind"]})
+    print(f"\n{'mode':<8} {'acc':>6} {'p50 ms':>8} {'p95 ms':>8} {'$/1k q':>8} {'err':>4}  " + " ".join(f"{k:>17}" for k in kinds))
+    for mode, summary in summaries.items():
+        print(
+            f"{mode:<8} {summary['accuracy']:>6.2f} {summary['p50_ms']:>8.0f} {summary['p95_ms']:>8.0f} "
+            f"{summary['cost_per_1k_usd']:>8.3f} {summary['errors']:>4}  "
+            + " ".join(f"{summary['accuracy_by_kind'].get(k, 0):>17.2f}" for k in kinds)
+        )
+    if "cascade" in summaries:
+        print("cascade decisions: " + ", ".join(f"{k}={v}" for k, v in sorted(summaries["cascade"]["decisions"].items())))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summaries, "answers": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Local stand-ins for the Groq chat and transcription APIs.
+
+``FakeChatGroq`` is a LangChain chat model that can replace ``ChatGroq``
+(``chat_services.set_llm``). It sleeps for a time-to-first-token drawn from
+a log-normal distribution, then emits tokens at ``tokens_per_second``, and
+reports usage metadata like Groq does. ``FakeAsyncGroq`` covers the
+``audio.transcriptions.create`` call used by ``TranscriptionService``; it
+"transcribes" audio made by ``fake_audio``, which carries its transcript.
+
+Both raise ``groq.RateLimitError`` (HTTP 429 with a ``retry-after`` header)
+for a ``rate_limit`` fraction of calls, so retry and backoff paths get
+exercised without a network or an API key.
+"""
+import asyncio
+import math
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Iterator, List, Optional
+
+import httpx
+from groq import RateLimitError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+AUDIO_MAGIC = b"FAKE-AUDIO\n"
+
+FILLER = (
+    "Based on the product details available, this item is a popular choice in our shop. "
+    "It is currently in stock, the price is shown in taka, and customers rate it well for "
+    "quality and value. Let me know if you would like similar products or anything else."
+).split()
+
+
+def lognormal_seconds(rng: random.Random, median_ms: float, sigma: float) -> float:
+    # Log-normal around the median: a long right tail like real API latencies
+    if median_ms <= 0:
+        return 0.0
+    return median_ms / 1000 * math.exp(sigma * rng.gauss(0.0, 1.0))
+
+
+def rate_limit_error(path: str, retry_after: float) -> RateLimitError:
+    request = httpx.Request("POST", f"{GROQ_BASE_URL}{path}")
+    response = httpx.Response(
+        429,
+        headers={"retry-after": f"{retry_after:g}"},
+        json={"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+        request=request,
+    )
+    return RateLimitError("Error code: 429 - Rate limit reached", response=response, body=response.json())
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatGroq(BaseChatModel):
+    """Drop-in chat model with configurable latency, token rate and 429s."""
+
+    ttft_ms: float = 300.0
+    ttft_sigma: float = 0.5
+    tokens_per_second: float = 250.0
+    answer_tokens: int = 60
+    rate_limit: float = 0.0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def _plan(self, messages):
+        # Decided up front so the sync and streaming paths behave the same
+        if self.rate_limit and self._rng.random() < self.rate_limit:
+            raise rate_limit_error("/chat/completions", self.retry_after)
+        prompt_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        words = [FILLER[i % len(FILLER)] for i in range(self.answer_tokens)]
+        return prompt_tokens, lognormal_seconds(self._rng, self.ttft_ms, self.ttft_sigma), words
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _usage(self, prompt_tokens: int, words: list) -> dict:
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt_tokens, ttft, words = self._plan(messages)
+        time.sleep(ttft + len(words) * self._token_delay())
+        message = AIMessage(content=" ".join(words), usage_metadata=self._usage(prompt_tokens, words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt_tokens, ttft, words = self._plan(messages)
+        await asyncio.sleep(ttft + len(words) * self._token_delay())
+        message = AIMessage(content=" ".join(words), usage_metadata=self._usage(prompt_tokens, words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, prompt_tokens: int, words: list):
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if i == 0 else " " + word,
+                usage_metadata=self._usage(prompt_tokens, words) if last else None,
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        prompt_tokens, ttft, words = self._plan(messages)
+        time.sleep(ttft)
+        for chunk in self._chunks(prompt_tokens, words):
+            time.sleep(self._token_delay())
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt_tokens, ttft, words = self._plan(messages)
+        await asyncio.sleep(ttft)
+        for chunk in self._chunks(prompt_tokens, words):
+            await asyncio.sleep(self._token_delay())
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_audio(transcript: str, size: int = 16_000, seed: int = 0) -> bytes:
+    # Roughly the size of a short voice note; the padding makes every clip
+    # distinct so the transcription cache only hits on real repeats
+    header = AUDIO_MAGIC + transcript.encode("utf-8") + b"\n"
+    padding = random.Random(f"{seed}:{transcript}").randbytes(max(0, size - len(header)))
+    return header + padding
+
+
+class _FakeTranscriptions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def create(self, file, model: str, response_format: str = "json", **kwargs):
+        owner = self._owner
+        if owner.rate_limit and owner._rng.random() < owner.rate_limit:
+            raise rate_limit_error("/audio/transcriptions", owner.retry_after)
+        _, audio = file
+        await asyncio.sleep(lognormal_seconds(owner._rng, owner.latency_ms, owner.sigma))
+        if not audio.startswith(AUDIO_MAGIC):
+            return SimpleNamespace(text="", language="english", duration=0.0)
+        transcript = audio[len(AUDIO_MAGIC):].split(b"\n", 1)[0].decode("utf-8")
+        return SimpleNamespace(text=transcript, language="english", duration=len(audio) / 4000)
+
+
+class FakeAsyncGroq:
+    """Stand-in for ``groq.AsyncGroq`` covering ``audio.transcriptions.create``."""
+
+    def __init__(self, latency_ms: float = 400.0, sigma: float = 0.4, rate_limit: float = 0.0,
+                 retry_after: float = 1.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self.audio = SimpleNamespace(transcriptions=_FakeTranscriptions(self))
+
+
+def install(llm: FakeChatGroq = None, transcription_client: FakeAsyncGroq = None,
+            small_llm: FakeChatGroq = None) -> List[str]:
+    """Point the app's chat chain and transcription service at the stand-ins.
+
+    The fake chat models go behind the same schedulers as ChatGroq, so their
+    429s exercise the real pacing and retry paths. ``small_llm`` stands in
+    for the cascade's small model.
+    """
+    installed = []
+    if llm is not None:
+        from app.core.config import GROQ_EXPECTED_OUTPUT_TOKENS, LARGE_CHAT_MODEL, SMALL_CHAT_MODEL
+        from app.services.chat_services import LLMMetricsCallback, set_llm
+        from app.services.groq_scheduler import ScheduledChatModel, chat_scheduler, small_chat_scheduler
+
+        def scheduled(model, scheduler, name):
+            return ScheduledChatModel(
+                llm=model,
+                scheduler=scheduler,
+                expected_output_tokens=GROQ_EXPECTED_OUTPUT_TOKENS,
+                callbacks=[LLMMetricsCallback(name)],
+            )
+
+        set_llm(
+            scheduled(llm, chat_scheduler, LARGE_CHAT_MODEL),
+            scheduled(small_llm, small_chat_scheduler, SMALL_CHAT_MODEL) if small_llm is not None else None,
+        )
+        installed.append("chat" if small_llm is None else "chat+small")
+    if transcription_client is not None:
+        from app.services.audio_services import transcription_service
+
+        transcription_service._client = transcription_client
+        installed.append("transcription")
+    return installed
@@ -0,0 +1,369 @@
+"""Offline load test: replayed conversations through the API and Telegram handlers.
+
+Groq is replaced by the stand-ins in ``benchmarks.fake_groq`` (no network,
+no API key); everything else (routing, retrieval, embeddings, sessions,
+caches) is the real pipeline. Conversations come from
+``benchmarks.replay``. The ``api`` driver posts to ``/chat/audio`` through
+an in-process ASGI transport; the ``telegram`` driver calls
+``handle_message``/``handle_voice`` with fake updates whose sends and edits
+take ``--telegram-ms``. ``both`` alternates sessions between the two.
+
+Reports throughput, p50/p95/p99 per driver and path, and resident memory
+over the run; use ``--duration`` for long runs, which keep replaying fresh
+sessions until the time is up.
+
+    python -m benchmarks.load_test [--driver both] [--sessions 50] [--turns 6] [--concurrency 20]
+        [--duration 0] [--ttft-ms 300] [--tokens-per-second 250] [--rate-limit 0.0]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import zlib
+from collections import defaultdict
+from types import SimpleNamespace
+
+from benchmarks.fake_groq import FakeAsyncGroq, FakeChatGroq, fake_audio, install
+from benchmarks.replay import ReplayGenerator, load_sessions, parse_mix
+
+DRIVERS = ("api", "telegram", "both")
+
+
+def percentile(sorted_values, q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # (driver, path) -> seconds
+        self.errors = defaultdict(int)
+        self.error_kinds = defaultdict(int)
+        self.completed = 0
+
+    def record(self, driver: str, path: str, seconds: float, error: str = None):
+        self.completed += 1
+        if error:
+            self.errors[(driver, path)] += 1
+            self.error_kinds[error] += 1
+        else:
+            self.latencies[(driver, path)].append(seconds)
+
+    def rows(self):
+        keys = sorted(set(self.latencies) | set(self.errors))
+        for key in keys:
+            values = sorted(self.latencies[key])
+            yield key, {
+                "ok": len(values),
+                "errors": self.errors[key],
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+            }
+
+
+class MemorySampler:
+    """Samples RSS against the number of completed turns."""
+
+    def __init__(self, recorder: Recorder, interval: float):
+        self.recorder = recorder
+        self.interval = interval
+        self.samples = []  # (seconds, completed, rss_mb)
+        self._started = time.perf_counter()
+
+    def sample(self):
+        from app.services.catalog_state import current_rss_mb
+
+        self.samples.append((time.perf_counter() - self._started, self.recorder.completed, current_rss_mb()))
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def growth_per_1k(self) -> float:
+        # Least-squares slope of RSS over completed turns, skipping the first
+        # 10% where caches and allocator pools are still filling
+        total = self.samples[-1][1] if self.samples else 0
+        points = [(done, rss) for _, done, rss in self.samples if done >= total * 0.1]
+        if len(points) < 2 or points[-1][0] == points[0][0]:
+            return 0.0
+        mean_x = statistics.fmean(x for x, _ in points)
+        mean_y = statistics.fmean(y for _, y in points)
+        covariance = sum((x - mean_x) * (y - mean_y) for x, y in points)
+        variance = sum((x - mean_x) ** 2 for x, _ in points)
+        return covariance / variance * 1000 if variance else 0.0
+
+
+class ApiDriver:
+    name = "api"
+
+    def __init__(self, app):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=120
+        )
+
+    async def turn(self, session_id: str, turn, audio: bytes = None):
+        if turn.voice:
+            response = await self.client.post(
+                "/chat/audio",
+                data={"session_id": session_id},
+                files={"audio": ("voice.ogg", audio, "audio/ogg")},
+            )
+        else:
+            response = await self.client.post("/chat/audio", data={"session_id": session_id, "text": turn.text})
+        if response.status_code != 200:
+            return f"http_{response.status_code}"
+        return None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class FakeTelegramMessage:
+    """Just enough of ``telegram.Message`` for the bot's handlers."""
+
+    def __init__(self, driver, user_id: str, text: str = None, voice=None):
+        self.driver = driver
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.voice = voice
+        self.replies = []
+
+    async def reply_text(self, text: str, **kwargs):
+        await self.driver.network()
+        reply = FakeTelegramMessage(self.driver, "bot", text=text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text: str, **kwargs):
+        await self.driver.network()
+        self.text = text
+        return self
+
+
+class FakeVoice:
+    def __init__(self, driver, audio: bytes):
+        self.driver = driver
+        self.audio = audio
+
+    async def get_file(self):
+        await self.driver.network()
+        return self
+
+    async def download_as_bytearray(self):
+        await self.driver.network()
+        return bytearray(self.audio)
+
+
+class TelegramDriver:
+    name = "telegram"
+
+    def __init__(self, latency_ms: float):
+        import telegram_bot
+
+        self.bot = telegram_bot
+        self.latency = latency_ms / 1000
+
+    async def network(self):
+        # One Bot API round trip
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def turn(self, session_id: str, turn, audio: bytes = None):
+        user_id = f"tg-{session_id}"
+        if turn.voice:
+            message = FakeTelegramMessage(self, user_id, voice=FakeVoice(self, audio))
+            await self.bot.handle_voice(SimpleNamespace(message=message), None)
+        else:
+            message = FakeTelegramMessage(self, user_id, text=turn.text)
+            await self.bot.handle_message(SimpleNamespace(message=message), None)
+        if not message.replies:
+            return "no_reply"
+        # handle_voice reports failures to the user instead of raising
+        if message.replies[-1].text.startswith("⚠️"):
+            return "voice_failed"
+        return None
+
+    async def close(self):
+        pass
+
+
+async def run_session(driver, session, recorder: Recorder, think: float):
+    for turn in session.turns:
+        audio = fake_audio(turn.text, seed=zlib.crc32(session.session_id.encode())) if turn.voice else None
+        started = time.perf_counter()
+        try:
+            error = await driver.turn(session.session_id, turn, audio)
+        except Exception as e:
+            error = type(e).__name__
+        recorder.record(driver.name, turn.path, time.perf_counter() - started, error)
+        if think > 0:
+            await asyncio.sleep(think)
+
+
+async def run(args) -> dict:
+    from app.db.catalog import load_products
+    from app.core.config import PRODUCTS_PATH
+    from app.services.warmup import warmup
+
+    install(
+        FakeChatGroq(
+            ttft_ms=args.ttft_ms,
+            ttft_sigma=args.ttft_sigma,
+            tokens_per_second=args.tokens_per_second,
+            answer_tokens=args.answer_tokens,
+            rate_limit=args.rate_limit,
+            seed=args.seed,
+        ),
+        FakeAsyncGroq(latency_ms=args.stt_ms, rate_limit=args.rate_limit, seed=args.seed),
+        # Only used with LLM_CASCADE=true
+        small_llm=FakeChatGroq(
+            ttft_ms=args.small_ttft_ms,
+            ttft_sigma=args.ttft_sigma,
+            tokens_per_second=args.small_tokens_per_second,
+            answer_tokens=args.answer_tokens,
+            rate_limit=args.rate_limit,
+            seed=args.seed,
+        ),
+    )
+    # Groq's limits would dominate an offline run; off unless asked for
+    from app.services.groq_scheduler import chat_scheduler, small_chat_scheduler, transcription_scheduler
+    chat_scheduler.set_limits(args.groq_rpm, args.groq_tpm)
+    small_chat_scheduler.set_limits(args.groq_rpm, args.groq_tpm)
+    transcription_scheduler.set_limits(args.groq_rpm)
+    await asyncio.to_thread(warmup)
+
+    drivers = []
+    if args.driver in ("api", "both"):
+        from main import app
+        drivers.append(ApiDriver(app))
+    if args.driver in ("telegram", "both"):
+        drivers.append(TelegramDriver(args.telegram_ms))
+
+    generator = ReplayGenerator(load_products(PRODUCTS_PATH), parse_mix(args.mix), args.seed)
+    recorder = Recorder()
+    sampler = MemorySampler(recorder, args.memory_interval)
+    sampler_task = asyncio.create_task(sampler.run())
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(driver, session):
+        async with semaphore:
+            await run_session(driver, session, recorder, args.think_ms / 1000)
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    rounds = 0
+    while True:
+        if args.replay:
+            sessions = load_sessions(args.replay)
+        else:
+            sessions = generator.sessions(args.sessions, args.turns, prefix=f"bench-r{rounds}")
+        await asyncio.gather(*(
+            limited(drivers[i % len(drivers)], session) for i, session in enumerate(sessions)
+        ))
+        rounds += 1
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - started
+
+    sampler_task.cancel()
+    sampler.sample()
+    for driver in drivers:
+        await driver.close()
+
+    rss = [mb for _, _, mb in sampler.samples]
+    return {
+        "seconds": elapsed,
+        "rounds": rounds,
+        "turns": recorder.completed,
+        "throughput": recorder.completed / elapsed if elapsed else 0.0,
+        "paths": {f"{driver}/{path}": row for (driver, path), row in recorder.rows()},
+        "errors": dict(recorder.error_kinds),
+        "groq": {
+            "chat": chat_scheduler.stats(),
+            "chat_small": small_chat_scheduler.stats(),
+            "transcription": transcription_scheduler.stats(),
+        },
+        "memory": {
+            "start_mb": rss[0],
+            "peak_mb": max(rss),
+            "end_mb": rss[-1],
+            "growth_mb_per_1k_turns": sampler.growth_per_1k(),
+            "samples": sampler.samples,
+        },
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"\n{result['turns']} turns in {result['seconds']:.1f}s over {result['rounds']} round(s): "
+        f"{result['throughput']:.1f} turns/s"
+    )
+    print(f"{'driver/path':<22} {'ok':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, row in result["paths"].items():
+        print(
+            f"{name:<22} {row['ok']:>6} {row['errors']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+            f"{row['p99_ms']:>8.1f} {row['mean_ms']:>8.1f}"
+        )
+    if result["errors"]:
+        print("errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(result["errors"].items())))
+    for api, stats in result["groq"].items():
+        print(
+            f"groq {api}: {stats['granted']} granted, {stats['coalesced']} coalesced, "
+            f"{stats['rate_limited']} rate limited, {stats['retries']} retries"
+        )
+    memory = result["memory"]
+    print(
+        f"RSS {memory['start_mb']:.0f} MB -> {memory['end_mb']:.0f} MB (peak {memory['peak_mb']:.0f} MB), "
+        f"{memory['growth_mb_per_1k_turns']:+.2f} MB per 1k turns after warm-up"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--driver", choices=DRIVERS, default="both")
+    parser.add_argument("--sessions", type=int, default=50, help="sessions per round")
+    parser.add_argument("--turns", type=int, default=6, help="turns per session")
+    parser.add_argument("--concurrency", type=int, default=20, help="sessions running at once")
+    parser.add_argument("--duration", type=float, default=0, help="keep replaying rounds for this many seconds")
+    parser.add_argument("--mix", default="", help='path weights, e.g. "rag=0.5,voice=0.2"')
+    parser.add_argument("--replay", help="sessions file from benchmarks.replay instead of generating")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a session's turns")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="median LLM time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="log-normal spread of the TTFT")
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--small-ttft-ms", type=float, default=100, help="cascade small model TTFT (LLM_CASCADE=true)")
+    parser.add_argument("--small-tokens-per-second", type=float, default=750)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--stt-ms", type=float, default=400, help="median transcription latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of Groq calls answered with 429")
+    parser.add_argument("--groq-rpm", type=float, default=0, help="scheduler requests/minute (0 = unlimited)")
+    parser.add_argument("--groq-tpm", type=float, default=0, help="scheduler tokens/minute (0 = unlimited)")
+    parser.add_argument("--telegram-ms", type=float, default=40, help="latency of each Bot API call")
+    parser.add_argument("--memory-interval", type=float, default=1.0, help="seconds between RSS samples")
+    parser.add_argument("--json", help="also write the full result to this file")
+    parser.add_argument("--log-level", default="WARNING", help="app log level; INFO logs every trace")
+    args = parser.parse_args()
+
+    # Before the app is imported, whose own configure_logging call is then a no-op
+    from app.core.config import configure_logging
+    configure_logging(args.log_level)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
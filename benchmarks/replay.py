@@ -0,0 +1,148 @@
+"""Multi-turn conversation replays generated from the catalog.
+
+Each session is a short conversation mixing the request paths the bot
+handles: product-ID lookups, product counts, greetings, RAG questions
+(including pronoun follow-ups on the last product) and voice notes. Turns
+are tagged with the path they are meant to exercise, so the load driver can
+report latencies per path. Generation is seeded and reproducible.
+
+    python -m benchmarks.replay [--sessions 20] [--turns 6] [--seed 0] > sessions.jsonl
+"""
+import argparse
+import json
+import random
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+PATHS = ("product_id", "count", "greeting", "rag", "voice")
+DEFAULT_MIX = {"product_id": 0.25, "count": 0.1, "greeting": 0.1, "rag": 0.4, "voice": 0.15}
+
+COUNT_KEYWORDS = ("snacks", "baby", "rice", "biscuits", "popcorn", "vegetables", "fruits")
+GREETINGS = ("hi", "hello", "hey there", "how are you", "are you available", "what is your name")
+
+# Kept clear of the greeting keywords, which the router matches as substrings
+PRODUCT_ID_TEMPLATES = (
+    "what is the price of {product_id}?",
+    "is {product_id} in stock?",
+    "tell me about {product_id}",
+    "what brand is {product_id}?",
+)
+RAG_TEMPLATES = (
+    "do you sell {product_name}?",
+    "can you recommend a good {sub_category}?",
+    "what do customers say about {product_name}?",
+    "i am looking for {brand} {sub_category}",
+    "any {category} you would suggest for a family dinner?",
+)
+FOLLOW_UP_TEMPLATES = (
+    "what do customers say about its quality?",
+    "is it good for kids?",
+    "where is it made?",
+)
+VOICE_TEMPLATES = (
+    "price of {product_name} please",
+    "do you have {brand} {sub_category}",
+    "how many {keyword} products do you have",
+)
+
+
+@dataclass
+class Turn:
+    path: str
+    text: str
+    voice: bool = False
+
+
+@dataclass
+class Session:
+    session_id: str
+    turns: List[Turn] = field(default_factory=list)
+
+
+def parse_mix(spec: str) -> dict:
+    # "rag=0.5,voice=0.2" -> weights for those paths, the rest keep their defaults
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        path, _, weight = part.partition("=")
+        if path not in PATHS:
+            raise ValueError(f"Unknown path {path!r}, expected one of {', '.join(PATHS)}")
+        mix[path] = float(weight)
+    return mix
+
+
+class ReplayGenerator:
+    def __init__(self, products: List[dict], mix: dict = None, seed: int = 0):
+        if not products:
+            raise ValueError("Need at least one product to generate conversations")
+        self.products = products
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+
+    def _fields(self, product: dict) -> dict:
+        return {
+            "product_id": product.get("product_id", ""),
+            "product_name": str(product.get("product_name", "")).lower(),
+            "brand": product.get("brand", ""),
+            "category": str(product.get("category", "")).lower(),
+            "sub_category": str(product.get("sub_category", "")).lower(),
+            "keyword": self.rng.choice(COUNT_KEYWORDS),
+        }
+
+    def turn(self, path: str, last_product) -> tuple:
+        product = self.rng.choice(self.products)
+        fields = self._fields(product)
+        if path == "product_id":
+            return Turn(path, self.rng.choice(PRODUCT_ID_TEMPLATES).format(**fields)), product
+        if path == "count":
+            return Turn(path, f"how many {fields['keyword']} products do you have?"), last_product
+        if path == "greeting":
+            return Turn(path, self.rng.choice(GREETINGS)), last_product
+        if path == "voice":
+            return Turn(path, self.rng.choice(VOICE_TEMPLATES).format(**fields), voice=True), product
+        # RAG: half the time a follow-up on the product the user just asked about
+        if last_product is not None and self.rng.random() < 0.5:
+            return Turn(path, self.rng.choice(FOLLOW_UP_TEMPLATES)), last_product
+        return Turn(path, self.rng.choice(RAG_TEMPLATES).format(**fields)), product
+
+    def session(self, session_id: str, turns: int) -> Session:
+        paths, weights = zip(*self.mix.items())
+        session = Session(session_id)
+        last_product = None
+        for _ in range(turns):
+            turn, last_product = self.turn(self.rng.choices(paths, weights)[0], last_product)
+            session.turns.append(turn)
+        return session
+
+    def sessions(self, count: int, turns: int, prefix: str = "bench") -> List[Session]:
+        return [self.session(f"{prefix}-{i}", turns) for i in range(count)]
+
+
+def load_sessions(path: str) -> List[Session]:
+    sessions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                sessions.append(Session(data["session_id"], [Turn(**turn) for turn in data["turns"]]))
+    return sessions
+
+
+def main():
+    from app.core.config import PRODUCTS_PATH
+    from app.db.catalog import load_products
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--mix", default="", help='path weights, e.g. "rag=0.5,voice=0.2"')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = ReplayGenerator(load_products(PRODUCTS_PATH), parse_mix(args.mix), args.seed)
+    for session in generator.sessions(args.sessions, args.turns):
+        sys.stdout.write(json.dumps(asdict(session), ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
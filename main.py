@@ -1,6 +1,62 @@
+import time
+
+# Taken before the app imports so /readyz can report import-to-ready time
+PROCESS_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from app.api.chat import router as chat_router
+from app.api.admin import router as admin_router
+from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
+from app.api import telegram as telegram_api
+from app.core.config import (
+    CATALOG_WATCH,
+    CATALOG_WATCH_INTERVAL,
+    TELEGRAM_WEBHOOK_URL,
+    configure_logging,
+)
+from app.services.catalog_state import CatalogWatcher
+from app.services.warmup import warmup
+
+configure_logging()
+logger = logging.getLogger("main")
+logger.info("App imported in %.2f seconds", time.perf_counter() - PROCESS_STARTED)
+
+async def run_warmup():
+    try:
+        await asyncio.to_thread(warmup, PROCESS_STARTED)
+    except Exception:
+        # /readyz keeps reporting the error; requests still load lazily
+        logger.exception("Warmup failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: /healthz answers at once, /readyz flips to
+    # 200 once the model, index and clients are loaded
+    warmup_task = asyncio.create_task(run_warmup())
+    watcher = None
+    if CATALOG_WATCH:
+        # Reload the catalog when the JSON or FAISS index files change
+        watcher = CatalogWatcher(interval=CATALOG_WATCH_INTERVAL)
+        watcher.start()
+    if TELEGRAM_WEBHOOK_URL:
+        # Serve the Telegram bot from this process (instead of telegram_bot.py)
+        await telegram_api.start_webhook()
+    yield
+    await telegram_api.stop_webhook()
+    if watcher:
+        watcher.stop()
+    if not warmup_task.done():
+        warmup_task.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
+app.include_router(health_router)
+app.include_router(metrics_router)
 app.include_router(chat_router)
+app.include_router(admin_router)
+app.include_router(telegram_api.router)
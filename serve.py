@@ -0,0 +1,43 @@
+# Runs the API with several uvicorn workers sharing one host's resources:
+#   python serve.py --workers 4 --port 8000
+# Starts the shared embedding process with a random EMBEDDING_SERVER_AUTHKEY,
+# then the workers with EMBEDDING_SERVER_ADDRESS, FAISS_MMAP=true and
+# SESSION_BACKEND=sqlite unless already set. POST /admin/reload only reaches
+# one worker; set CATALOG_WATCH=true so every worker picks up catalog changes
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+
+import uvicorn
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker API server.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--embedding-address", default=os.getenv("EMBEDDING_SERVER_ADDRESS", "/tmp/grocery-embeddings.sock"))
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_SERVER_ADDRESS"] = args.embedding_address
+    os.environ.setdefault("EMBEDDING_SERVER_AUTHKEY", secrets.token_hex(32))
+    os.environ.setdefault("FAISS_MMAP", "true")
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+    from app.core.config import EMBEDDING_SERVER_AUTHKEY
+    from app.services.embedding_server import wait_for_server
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.services.embedding_server", "--address", args.embedding_address]
+    )
+    try:
+        wait_for_server(args.embedding_address, EMBEDDING_SERVER_AUTHKEY)
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,126 @@
 import os
+import time
+import asyncio
+import logging
 import requests
 from dotenv import load_dotenv
 from telegram import Update, Bot
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
 )
-from groq import Groq
-from app.services.chat_services import get_answer_for_session
+from app.services.chat_services import aget_answer_for_session, astream_answer_for_session
+from app.services.catalog_state import CatalogWatcher
+from app.services.audio_services import StageTimings, transcription_service
+from app.services.tracing import span, trace
+from app.services.warmup import warmup
+from app.core.config import (
+    CATALOG_WATCH,
+    CATALOG_WATCH_INTERVAL,
+    TELEGRAM_STREAMING,
+    TELEGRAM_EDIT_INTERVAL,
+    configure_logging,
+)
 
 # Load environment variables
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
+logger = logging.getLogger("telegram_bot")
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+STREAM_PLACEHOLDER = "…"
+
+async def edit_message(message, text: str, wait: bool = False) -> bool:
+    try:
+        with span("telegram_send"):
+            await message.edit_text(text)
+        return True
+    except RetryAfter as e:
+        # Over Telegram's edit rate limit: skip intermediate updates, the next
+        # one catches up; the final edit waits and retries
+        if not wait:
+            return False
+        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+        await asyncio.sleep(retry_after)
+        return await edit_message(message, text, wait=True)
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return True
+        raise
+
+STREAM_END = object()
+
+async def pump_chunks(chunks, queue: asyncio.Queue):
+    # Drains the answer stream apart from the Telegram sends, so the session
+    # lock and answer semaphore it holds are never held through a slow edit
+    try:
+        async for chunk in chunks:
+            queue.put_nowait(chunk)
+    except Exception as e:
+        queue.put_nowait(e)
+    finally:
+        queue.put_nowait(STREAM_END)
+
+async def next_text(queue: asyncio.Queue):
+    # Next non-empty chunk, or None once the stream has ended
+    while True:
+        item = await queue.get()
+        if item is STREAM_END:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        if item:
+            return item
+
+async def reply_long(message, text: str):
+    # Anything past Telegram's message limit goes out as follow-up messages
+    for start in range(0, len(text), TELEGRAM_MAX_MESSAGE_LENGTH):
+        with span("telegram_send"):
+            await message.reply_text(text[start:start + TELEGRAM_MAX_MESSAGE_LENGTH])
+
+# Reply once the answer has started and edit the reply as chunks arrive, at
+# most once per TELEGRAM_EDIT_INTERVAL seconds (Telegram throttles frequent
+# edits per chat). Answers that come as one chunk (fast paths, cache hits)
+# go out as a single message with no edits.
+async def reply_streaming(message, chunks):
+    queue = asyncio.Queue()
+    producer = asyncio.create_task(pump_chunks(chunks, queue))
+    try:
+        text = await next_text(queue) or ""
+        more = await next_text(queue) if text else None
+        if more is None:
+            await reply_long(message, text or STREAM_PLACEHOLDER)
+            return text
+        text += more
+        shown = text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+        with span("telegram_send"):
+            sent = await message.reply_text(shown)
+        last_edit = time.monotonic()
+        while True:
+            chunk = await next_text(queue)
+            if chunk is None:
+                break
+            text += chunk
+            visible = text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+            if visible != shown and time.monotonic() - last_edit >= TELEGRAM_EDIT_INTERVAL:
+                if await edit_message(sent, visible):
+                    shown = visible
+                last_edit = time.monotonic()
+
+        final = text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+        if final != shown:
+            await edit_message(sent, final, wait=True)
+        await reply_long(message, text[TELEGRAM_MAX_MESSAGE_LENGTH:])
+        return text
+    finally:
+        producer.cancel()  # no-op once the stream is done
+
+async def reply_with_answer(message, user_id: str, question: str):
+    if TELEGRAM_STREAMING:
+        await reply_streaming(message, astream_answer_for_session(session_id=user_id, question=question))
+    else:
+        answer = await aget_answer_for_session(session_id=user_id, question=question)
+        await reply_long(message, answer)
 
 # /start command handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -25,64 +133,76 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
     question = update.message.text
 
-    answer = get_answer_for_session(session_id=user_id, question=question)
-    await update.message.reply_text(answer)
+    # One trace per update: answer plus every Telegram send/edit
+    with trace("telegram_text", session_id=user_id):
+        await reply_with_answer(update.message, user_id, question)
 
 # VOICE message handler
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.message.from_user.id)
 
+    timings = StageTimings()
     try:
-        voice_file = await update.message.voice.get_file()
-
-        # Create temp folder if not exists (fixes Windows no /tmp folder)
-        temp_dir = "temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        local_path = os.path.join(temp_dir, f"{user_id}_voice.ogg")
-
-        # Download voice file to local_path
-        await voice_file.download_to_drive(custom_path=local_path)
+        with trace("telegram_voice", session_id=user_id):
+            # Download into memory; no temp files to race on or clean up
+            with timings.stage("download"):
+                voice_file = await update.message.voice.get_file()
+                audio = bytes(await voice_file.download_as_bytearray())
 
-        # Transcribe audio file
-        with open(local_path, "rb") as f:
-            transcription = client.audio.transcriptions.create(
-                file=(local_path, f.read()),
-                model="whisper-large-v3-turbo",
-                response_format="verbose_json",
-                # NO language param means auto-detect mixed languages
-                # language=None
-            )
-        question = transcription.text  # This contains the original transcribed text, mixed languages
+            # Transcribe audio (auto language detection for mixed Bangla/English)
+            with timings.stage("transcription"):
+                question = await transcription_service.transcribe(audio, f"{user_id}_voice.ogg")
 
-        print(f"[DEBUG] Original transcription (auto language detection): {question}")
+            logger.debug("Original transcription (auto language detection): %s", question)
 
-        # Get answer from your chatbot
-        answer = get_answer_for_session(session_id=user_id, question=question)
-        await update.message.reply_text(answer)
+            # Get answer from your chatbot
+            with timings.stage("answer"):
+                await reply_with_answer(update.message, user_id, question)
+        logger.debug("Voice message timings: %s", timings)
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Voice message failed")
         await update.message.reply_text("⚠️ Sorry, I couldn't process your voice message.")
 
-# Run the Telegram bot, clearing webhook before polling to avoid conflicts
-def run_telegram_bot():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-
-    # Register handlers
+def add_handlers(app):
     app.add_handler(CommandHandler("start", start))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
 
+def build_application(webhook: bool = False):
+    builder = ApplicationBuilder().token(TELEGRAM_TOKEN)
+    if webhook:
+        # Updates arrive on main.py's webhook route (app.api.telegram), which
+        # does its own per-chat queueing; no getUpdates loop
+        builder = builder.updater(None)
+    else:
+        # Updates are processed concurrently; per-user ordering is kept by
+        # aget_answer_for_session's session lock
+        builder = builder.concurrent_updates(True)
+    app = builder.build()
+    add_handlers(app)
+    return app
+
+# Run the Telegram bot, clearing webhook before polling to avoid conflicts
+def run_telegram_bot():
+    configure_logging()
+    app = build_application()
+
     # Delete webhook before polling (fixes Conflict error)
     async def on_startup(app_instance):
         bot = Bot(token=TELEGRAM_TOKEN)
         await bot.delete_webhook(drop_pending_updates=True)
-        print("✅ Webhook cleared before polling.")
+        logger.info("Webhook cleared before polling.")
 
     app.post_init = on_startup
 
-    print("🤖 Telegram bot running...")
+    # Load the embedding model, index and LLM client before taking updates
+    warmup()
+
+    if CATALOG_WATCH:
+        CatalogWatcher(interval=CATALOG_WATCH_INTERVAL).start()
+
+    logger.info("Telegram bot running...")
     app.run_polling()
 
 if __name__ == "__main__":